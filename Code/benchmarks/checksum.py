@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Compares ip_utils.ip_checksum against the word by word version it
+replaced on packets from 20 to 1500 bytes.
+Run from the Code directory with: python -m benchmarks.checksum
+"""
+import os
+from array import array
+from modules.ip_utils import ip_checksum
+from sys import byteorder
+from timeit import Timer
+
+SIZES = (20, 28, 40, 60, 64, 128, 256, 576, 1024, 1280, 1500)
+
+
+def word_checksum(packet: bytes) -> int:
+    """
+    The original ip_checksum, which sums the packet two bytes at a time.
+    """
+    if len(packet) % 2 == 1:
+        packet += b"\0"
+    total = 0
+    for first, second in (
+            packet[i:i+2]
+            for i in range(0, len(packet), 2)
+    ):
+        total += (first << 8) + second
+    carried = (total - (total & 0xFFFF)) >> 16
+    total &= 0xFFFF
+    total += carried
+    if total > 0xFFFF:
+        total &= 0xFFFF
+        total += 1
+    return (~total & 0xFFFF)
+
+
+def array_checksum(packet: bytes) -> int:
+    """
+    Sums the packet as an array of 16 bit words, for comparison.
+    """
+    if len(packet) % 2 == 1:
+        packet += b"\0"
+    words = array("H", packet)
+    if byteorder == "little":
+        words.byteswap()
+    total = sum(words)
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return (~total & 0xFFFF)
+
+
+def main() -> None:
+    functions = {
+        "word by word": word_checksum,
+        "array('H')": array_checksum,
+        "ip_checksum": ip_checksum,
+    }
+    print(
+        f"{'bytes':>6s}" +
+        "".join(f"{name:>16s}" for name in functions) +
+        f"{'speedup':>10s}"
+    )
+    for size in SIZES:
+        packet = os.urandom(size)
+        # every version must agree before their speeds mean anything
+        for odd in (packet, packet[:-1], bytes(size), b"\xff" * size):
+            results = {function(odd) for function in functions.values()}
+            assert len(results) == 1, f"checksums differ on {odd!r}"
+        times = dict()
+        for name, function in functions.items():
+            timer = Timer(lambda: function(packet))
+            number, _ = timer.autorange()
+            times[name] = min(timer.repeat(5, number)) / number
+        print(
+            f"{size:>6d}" +
+            "".join(f"{times[name]*1e6:>13.2f} us" for name in functions) +
+            f"{times['word by word'] / times['ip_checksum']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
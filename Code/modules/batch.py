@@ -0,0 +1,102 @@
+from modules import ip_utils
+from typing import Dict, List, Optional, Sequence
+
+# NumPy is optional, without it the packets are built one at a time
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore
+
+# the size of the SYNs make_tcp_packet makes, 20 bytes of
+# header and 4 bytes of maximum segment size option
+SYN_SIZE = 24
+# how many SYNs the scans build at once
+BATCH_SIZE = 1024
+
+
+def syn_packets(
+        src_port: int,
+        sources: Sequence[int],
+        addresses: Sequence[int],
+        ports: Sequence[int],
+        sequences: Optional[Sequence[int]] = None
+) -> bytes:
+    """
+    Builds a SYN for every long form IPv4 address in addresses and the
+    port at the same position in ports, sent from src_port on the long
+    form address at the same position in sources, and returns them back
+    to back in one buffer of SYN_SIZE byte packets, with the sequence
+    number at the same position in sequences if it is given or 0.
+    Packet i is the same as make_tcp_packet(src_port, ports[i],
+    sources[i], addresses[i], 2, seq=sequences[i]).
+    With NumPy every packet is filled in and checksummed at once,
+    otherwise they are made one at a time from an ip_utils.SynTemplate
+    for each source.
+    """
+    if sequences is None:
+        sequences = [0] * len(ports)
+    if not len(sources) == len(addresses) == len(ports) == len(sequences):
+        raise ValueError(
+            "Every SYN needs a source, an address, a port "
+            "and a sequence number: "
+            f"[{len(sources)}, {len(addresses)}, {len(ports)}, "
+            f"{len(sequences)}]"
+        )
+    if numpy is None:
+        # the templates don't check what they are given
+        for name, values, end in (
+                ("source IP address", sources, 0x100000000),
+                ("destination IP address", addresses, 0x100000000),
+                ("destination port", ports, 0x10000),
+                ("sequence number", sequences, 0x100000000),
+        ):
+            if not all(0 <= value < end for value in values):
+                raise ValueError(f"Invalid {name} in batch")
+        templates: Dict[int, ip_utils.SynTemplate] = dict()
+        syns: List[bytes] = []
+        for source, address, port, seq in zip(
+                sources,
+                addresses,
+                ports,
+                sequences
+        ):
+            if source not in templates:
+                templates[source] = ip_utils.SynTemplate(src_port, source)
+            syns.append(templates[source].packet(address, port, seq))
+        return b"".join(syns)
+    count = len(ports)
+    source_array = numpy.fromiter(sources, numpy.int64, count)
+    address_array = numpy.fromiter(addresses, numpy.int64, count)
+    port_array = numpy.fromiter(ports, numpy.int64, count)
+    sequence_array = numpy.fromiter(sequences, numpy.int64, count)
+    for name, array, end in (
+            ("source IP address", source_array, 0x100000000),
+            ("destination IP address", address_array, 0x100000000),
+            ("destination port", port_array, 0x10000),
+            ("sequence number", sequence_array, 0x100000000),
+    ):
+        if count and (array.min() < 0 or array.max() >= end):
+            raise ValueError(f"Invalid {name} in batch")
+    # every SYN starts off as a copy of one with the checksum zeroed
+    template = bytearray(ip_utils.make_tcp_packet(src_port, 0, 0, 0, 2))
+    template[16:18] = bytes(2)
+    packets = numpy.tile(
+        numpy.frombuffer(bytes(template), numpy.uint8),
+        (count, 1)
+    )
+    # each row of words is one packet, word 1 is the destination
+    # port, words 2 and 3 the sequence number and word 8 the checksum
+    words = packets.view(">u2")
+    words[:, 1] = port_array
+    words[:, 2] = sequence_array >> 16
+    words[:, 3] = sequence_array & 0xFFFF
+    total = words.sum(axis=1, dtype=numpy.int64)
+    # add on the psuedo header, both addresses, the protocol and length
+    for pseudo_address in (source_array, address_array):
+        total += (pseudo_address >> 16) + (pseudo_address & 0xFFFF)
+    total += 6 + SYN_SIZE
+    # fold the carries back in, twice is enough for 16 words
+    for _ in range(2):
+        total = (total & 0xFFFF) + (total >> 16)
+    words[:, 8] = ~total & 0xFFFF
+    return packets.tobytes()
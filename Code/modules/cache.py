@@ -0,0 +1,137 @@
+import sqlite3
+import time
+from modules import targets
+from typing import Container, Dict, Iterable, NamedTuple, Optional
+
+
+class Liveness(NamedTuple):
+    """
+    What the cache remembers about a host from the last time it was seen up.
+    """
+    rtt: float
+    ttl: Optional[int]
+    seen: float
+
+
+class LivenessCache:
+    """
+    An on disk cache of the hosts that were found to be up by host
+    discovery, so that rescanning the same range soon afterwards can
+    treat them as up without probing them again.
+    Hosts are stored in an SQLite database keyed by the long form of
+    their address, which makes looking up a whole range one query.
+    Entries older than max_age seconds are ignored and evicted, and
+    once there are more than max_size entries the oldest are evicted.
+    The hosts recorded are saved to disk every commit_every records so
+    a scan that dies part way through only loses the last few.
+    """
+    def __init__(
+            self,
+            path: str,
+            max_age: float,
+            max_size: int,
+            commit_every: int = 1000
+    ):
+        if max_age < 0:
+            raise ValueError(f"Invalid cache age: [{max_age}]")
+        if max_size < 0:
+            raise ValueError(f"Invalid cache size: [{max_size}]")
+        if commit_every < 1:
+            raise ValueError(f"Invalid commit interval: [{commit_every}]")
+        self.max_age: float = max_age
+        self.max_size: int = max_size
+        self.commit_every: int = commit_every
+        # the records made since the last commit
+        self.uncommitted: int = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS hosts ("
+            "address INTEGER PRIMARY KEY, "
+            "rtt REAL NOT NULL, "
+            "ttl INTEGER, "
+            "seen REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS hosts_seen ON hosts (seen)"
+        )
+
+    def __repr__(self) -> str:
+        return ", ".join((
+            f"LivenessCache(max_age={self.max_age}",
+            f"max_size={self.max_size})"
+        ))
+
+    def lookup(self, addresses: Iterable[int]) -> Dict[int, Liveness]:
+        """
+        Returns what is known about each of the long form addresses
+        which was seen up within the last max_age seconds.
+        Rather than querying each address on its own every fresh entry
+        between the lowest and highest address is fetched at once.
+        """
+        wanted: Container[int]
+        if isinstance(addresses, targets.SPEC_TYPES):
+            # specs are sorted and can check membership without expanding
+            if len(addresses) == 0:
+                return dict()
+            wanted = addresses
+            lowest, highest = addresses[0], addresses[-1]
+        else:
+            wanted = set(addresses)
+            if not wanted:
+                return dict()
+            lowest, highest = min(wanted), max(wanted)
+        rows = self.db.execute(
+            "SELECT address, rtt, ttl, seen FROM hosts "
+            "WHERE address BETWEEN ? AND ? AND seen >= ?",
+            (lowest, highest, time.time() - self.max_age)
+        )
+        return {
+            address: Liveness(rtt, ttl, seen)
+            for address, rtt, ttl, seen in rows
+            if address in wanted
+        }
+
+    def record(self, address: int, rtt: float, ttl: Optional[int]) -> None:
+        """
+        Remembers that the long form address was just seen up
+        with the given round trip time and IP time to live.
+        """
+        self.db.execute(
+            "INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?)",
+            (address, rtt, ttl, time.time())
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def evict(self) -> None:
+        """
+        Removes every entry older than max_age and then the oldest
+        entries until there are at most max_size left.
+        """
+        self.db.execute(
+            "DELETE FROM hosts WHERE seen < ?",
+            (time.time() - self.max_age,)
+        )
+        (size,) = self.db.execute("SELECT COUNT(*) FROM hosts").fetchone()
+        if size > self.max_size:
+            self.db.execute(
+                "DELETE FROM hosts WHERE address IN ("
+                "SELECT address FROM hosts ORDER BY seen LIMIT ?)",
+                (size - self.max_size,)
+            )
+
+    def close(self) -> None:
+        """
+        Evicts old entries, saves the cache to disk and closes it.
+        """
+        self.evict()
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self) -> "LivenessCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
@@ -260,11 +260,14 @@ class Target:
     of the basic methods a class for storing data
     has, such as __repr__ for printing information
     in the object etc.
+    The address is kept in long form and is IPv6
+    if family is socket.AF_INET6.
     """
-    address: str
+    address: int
     open_ports: DefaultDict[str, Set[int]]
     open_filtered_ports: DefaultDict[str, Set[int]]
     services: Dict[int, Match] = field(default_factory=dict)
+    family: int = socket.AF_INET
 
     def __repr__(self) -> str:
         def collapse(port_dict: DefaultDict) -> str:
@@ -312,7 +315,8 @@ class Target:
         open_ports = collapse(self.open_ports)
         open_filtered_ports = collapse(self.open_filtered_ports)
         return ", ".join((
-            f"Target(address=[{self.address}]",
+            "Target(address="
+            f"[{ip_utils.long_to_ip(self.address, self.family)}]",
             f"open_ports=[{open_ports}]",
             f"open_filtered_ports=[{open_filtered_ports}]",
             f"services={self.services})"
@@ -408,17 +412,20 @@ class Probe:
         if self.ports[self.protocol] != set():
             ports_to_scan &= self.ports[self.protocol]
         for port in ports_to_scan:
-            # open a self closing IPV4 socket
-            # for the correct protocol for this probe.
+            # open a self closing socket of the target's
+            # family for the correct protocol for this probe.
             with closing(
                     socket.socket(
-                        socket.AF_INET,
+                        target.family,
                         self.proto_to_socket_type[self.protocol]
                     )
             ) as sock:
                 # setup the connection to the target
                 try:
-                    sock.connect((target.address, port))
+                    sock.connect((
+                        ip_utils.long_to_ip(target.address, target.family),
+                        port
+                    ))
                     # if the connection fails then continue scanning
                     # the next ports, this shouldn't really happen.
                 except ConnectionError:
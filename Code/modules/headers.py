@@ -1,5 +1,6 @@
 import struct
 import socket
+from modules import ip_utils
 from typing import Dict
 
 
@@ -39,8 +40,6 @@ class ip:
         ip_off = int(flgs_off[3:], 2)
         # splits flgs_off into ip_flgs and ip_off which represent the ip header
         # flags and the data offset
-        src_addr = socket.inet_ntoa(struct.pack('!I', ip_src))
-        dst_addr = socket.inet_ntoa(struct.pack('!I', ip_dst))
         self.version: int = ip_v
         self.header_length: int = ip_hl
         self.dscp: int = ip_dscp
@@ -52,8 +51,9 @@ class ip:
         self.time_to_live: int = ip_ttl
         self.protocol: int = ip_p
         self.checksum: int = ip_sum
-        self.source: str = src_addr
-        self.destination: str = dst_addr
+        # the addresses are kept in long form
+        self.source: int = ip_src
+        self.destination: int = ip_dst
 
     def __repr__(self) -> str:
         return "\n\t".join((
@@ -69,8 +69,47 @@ class ip:
             f"Time To Live: [{self.time_to_live}]",
             f"Protocol: [{self.protocol}]",
             f"Header Checksum: [{self.checksum:04x}]",
-            f"Source Address: [{self.source}]",
-            f"Destination Address: [{self.destination}]"
+            f"Source Address: [{ip_utils.long_to_dot(self.source)}]",
+            f"Destination Address: [{ip_utils.long_to_dot(self.destination)}]"
+        ))
+
+
+class ip6:
+    """
+    A class for parsing, storing and displaying
+    data from an IPv6 header.
+    """
+    def __init__(self, header: bytes):
+        (
+            version_class_flow,
+            payload_length,
+            next_header,
+            hop_limit,
+            source,
+            destination
+        ) = struct.unpack("!IHBB16s16s", header)
+        self.version: int = version_class_flow >> 28
+        self.traffic_class: int = (version_class_flow >> 20) & 0xFF
+        self.flow_label: int = version_class_flow & 0xFFFFF
+        self.payload_length: int = payload_length
+        self.next_header: int = next_header
+        self.hop_limit: int = hop_limit
+        # the addresses are kept in long form
+        self.source: int = int.from_bytes(source, "big")
+        self.destination: int = int.from_bytes(destination, "big")
+
+    def __repr__(self) -> str:
+        return "\n\t".join((
+            "IPv6 header:",
+            f"Version: [{self.version}]",
+            f"Traffic Class: [{self.traffic_class}]",
+            f"Flow Label: [{self.flow_label:05x}]",
+            f"Payload Length: [{self.payload_length}]",
+            f"Next Header: [{self.next_header}]",
+            f"Hop Limit: [{self.hop_limit}]",
+            f"Source Address: [{ip_utils.long_to_ipv6(self.source)}]",
+            "Destination Address: "
+            f"[{ip_utils.long_to_ipv6(self.destination)}]"
         ))
 
 
@@ -148,6 +187,8 @@ class icmp:
             0: "Address mask reply."
         }
     }
+    # the types of message which carry an id and sequence number
+    id_types = {0, 8, 13, 14}
 
     def __init__(self, header: bytes):
         (
@@ -155,7 +196,7 @@ class icmp:
             code,
             csum,
             remainder
-        ) = struct.unpack('!bbHI', header)
+        ) = struct.unpack('!BBHI', header)
 
         self.type: int = ICMP_type
         self.code: int = code
@@ -163,15 +204,18 @@ class icmp:
 
         self.message: str
         try:
-            self.message = icmp.messages[self.type][self.code]
+            self.message = self.messages[self.type][self.code]
         except KeyError:
             # if we can't assign a message then just set a description
             # as to what caused the failure.
-            self.message = f"Failed to assign message: ({self.type/self.code})"
+            self.message = (
+                f"Failed to assign message: ({self.type}/{self.code})"
+            )
 
         self.id: int
         self.sequence: int
-        if self.type in {0, 8}:
+        # echo and timestamp messages carry an id and sequence number
+        if self.type in self.id_types:
             self.id = socket.htons(remainder >> 16)
             self.sequence = socket.htons(remainder & 0xFFFF)
         else:
@@ -190,6 +234,38 @@ class icmp:
         ))
 
 
+class icmp6(icmp):
+    """
+    A class for parsing, storing and displaying
+    data from an ICMPv6 header, which is laid out like an ICMP one.
+    """
+    messages: Dict[int, Dict[int, str]] = {
+        1: {
+            0: "No route to destination.",
+            1: "Communication administratively prohibited.",
+            2: "Beyond scope of source address.",
+            3: "Address unreachable.",
+            4: "Port unreachable.",
+            5: "Source address failed policy.",
+            6: "Reject route to destination."
+        },
+        2: {
+            0: "Packet too big."
+        },
+        3: {
+            0: "Hop limit exceeded in transit.",
+            1: "Fragment reassembly time exceeded."
+        },
+        128: {
+            0: "Echo request."
+        },
+        129: {
+            0: "Echo reply."
+        }
+    }
+    id_types = {128, 129}
+
+
 class tcp:
     def __init__(self, header: bytes):
         (
@@ -252,3 +328,70 @@ class udp:
             f"Length: {self.length}",
             f"Checksum: {self.checksum:04x}"
         ))
+
+
+class ethernet:
+    """
+    A class for parsing, storing and displaying
+    data from an ethernet frame header.
+    """
+    def __init__(self, header: bytes):
+        (
+            dst_mac,
+            src_mac,
+            ethertype
+        ) = struct.unpack("!6s6sH", header)
+
+        self.destination: str = ":".join(f"{b:02x}" for b in dst_mac)
+        self.source: str = ":".join(f"{b:02x}" for b in src_mac)
+        self.ethertype: int = ethertype
+
+    def __repr__(self) -> str:
+        return "\n\t".join((
+            "Ethernet header:",
+            f"Destination MAC: [{self.destination}]",
+            f"Source MAC: [{self.source}]",
+            f"EtherType: [{self.ethertype:04x}]"
+        ))
+
+
+class arp:
+    """
+    A class for parsing, storing and displaying
+    data from an ARP packet for IPv4 over ethernet.
+    """
+    def __init__(self, header: bytes):
+        (
+            hardware_type,
+            protocol_type,
+            hardware_len,
+            protocol_len,
+            operation,
+            sender_mac,
+            sender_ip,
+            target_mac,
+            target_ip
+        ) = struct.unpack("!HHBBH6sI6sI", header)
+
+        self.hardware_type: int = hardware_type
+        self.protocol_type: int = protocol_type
+        self.hardware_len: int = hardware_len
+        self.protocol_len: int = protocol_len
+        # 1 -> request, 2 -> reply
+        self.operation: int = operation
+        self.sender_mac: str = ":".join(f"{b:02x}" for b in sender_mac)
+        self.sender_ip: int = sender_ip
+        self.target_mac: str = ":".join(f"{b:02x}" for b in target_mac)
+        self.target_ip: int = target_ip
+
+    def __repr__(self) -> str:
+        return "\n\t".join((
+            "ARP header:",
+            f"Hardware type: [{self.hardware_type}]",
+            f"Protocol type: [{self.protocol_type:04x}]",
+            f"Operation: [{self.operation}]",
+            f"Sender MAC: [{self.sender_mac}]",
+            f"Sender IP: [{ip_utils.long_to_dot(self.sender_ip)}]",
+            f"Target MAC: [{self.target_mac}]",
+            f"Target IP: [{ip_utils.long_to_dot(self.target_ip)}]"
+        ))
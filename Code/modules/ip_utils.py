@@ -1,14 +1,27 @@
 import array
+import hashlib
+import heapq
 import socket
 import struct
 import select
 import time
 
+from bisect import bisect_right
 from contextlib import closing
 from functools import singledispatch
 from itertools import islice, cycle
 from sys import stderr
-from typing import Set, Union
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    overload,
+)
 
 
 def eprint(*args: str, **kwargs: str) -> None:
@@ -30,15 +43,9 @@ def long_to_dot(long: int) -> str:
     if not 0 <= long <= 0xFFFFFFFF:
         raise ValueError(f"Invalid long form IP address: [{long:08x}]")
     else:
-        # shift the long form IP along 0, 8, 16, 24 bits
-        # take only the first 8 bits of the newly shifted number
-        # cast them to a string and join them with '.'s
-        return ".".join(
-            str(
-                (long >> (8*(3-i))) & 0xFF
-            )
-            for i in range(4)
-        )
+        # pack the long form IP into its 4 bytes in network order
+        # and let the socket module write them out in dot form
+        return socket.inet_ntoa(struct.pack("!I", long))
 
 
 def dot_to_long(ip: str) -> int:
@@ -74,6 +81,54 @@ def dot_to_long(ip: str) -> int:
         )
 
 
+def ipv6_to_long(ip: str) -> int:
+    """
+    Take an IPv6 address in colon notation and return the 128 bit int version
+    i.e. ipv6_to_long("::1") = 1
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except (OSError, UnicodeError):
+        raise ValueError(f"Invalid IPv6 address: [{ip}]")
+
+
+def long_to_ipv6(long: int) -> str:
+    """
+    Take in an IPv6 address in 128 bit int form
+    and return that address in colon notation.
+    i.e. long_to_ipv6(1) = ::1
+    """
+    if not 0 <= long < 2**128:
+        raise ValueError(f"Invalid long form IPv6 address: [{long:032x}]")
+    return socket.inet_ntop(socket.AF_INET6, long.to_bytes(16, "big"))
+
+
+def ip_family(ip: str) -> int:
+    """
+    Returns the address family of the text form address ip,
+    socket.AF_INET6 if it is in colon notation otherwise socket.AF_INET.
+    """
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+
+def ip_to_long(ip: str) -> int:
+    """
+    Returns the long form of the dot form IPv4 or colon form IPv6 address ip.
+    """
+    if ip_family(ip) == socket.AF_INET6:
+        return ipv6_to_long(ip)
+    return dot_to_long(ip)
+
+
+def long_to_ip(long: int, family: int = socket.AF_INET) -> str:
+    """
+    Returns the text form of the long form address of the given family.
+    """
+    if family == socket.AF_INET6:
+        return long_to_ipv6(long)
+    return long_to_dot(long)
+
+
 @singledispatch
 def is_valid_ip(ip: Union[str, int]) -> bool:
     """
@@ -102,10 +157,10 @@ def _(ip: str):
     # this is the string overload variant
     # of the is_valid_ip function.
     try:
-        # try to turn the dot form ip address
+        # try to turn the dot or colon form ip address
         # to a long form one, if it fails,
         # then return False, else return True
-        dot_to_long(ip)
+        ip_to_long(ip)
         return True
     except ValueError:
         return False
@@ -122,16 +177,270 @@ def is_valid_port_number(port_num: int) -> bool:
         return False
 
 
-def ip_range(ip: str, network_bits: int) -> Set[str]:
+class IPRange:
     """
-    Takes a Classless Inter Domain Routing(CIDR) address subnet
-    specification and returns the list of addresses specified
-    by the IP/network bits format.
-    If the number of network bits is not between 0 and 32 it raises an error.
+    A lazy, ordered range of long form IPv4 or IPv6 addresses.
+    It behaves like the built in range, so it supports len, in,
+    indexing, slicing and iteration, but the addresses are only
+    generated as they are needed, so even a /8 takes no more memory
+    than a /32. `in` also accepts text form addresses.
+    Like range, len fails for IPv6 ranges of more than 2**63 addresses
+    but they can still be iterated over and indexed.
+    """
+    def __init__(
+            self,
+            start: int,
+            stop: int,
+            step: int = 1,
+            family: int = socket.AF_INET
+    ):
+        end = 2**128 if family == socket.AF_INET6 else 0x100000000
+        if not 0 <= start <= end or not 0 <= stop <= end:
+            raise ValueError(f"Invalid IP address range: [{start}, {stop})")
+        self.addresses: range = range(start, stop, step)
+        self.family: int = family
+
+    def __repr__(self) -> str:
+        if not self.addresses:
+            return "IPRange()"
+        return (
+            f"IPRange({long_to_ip(self.addresses[0], self.family)}"
+            f"-{long_to_ip(self.addresses[-1], self.family)})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def __bool__(self) -> bool:
+        # unlike len this works for ranges of any size
+        return bool(self.addresses)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.addresses)
+
+    def __contains__(self, ip: object) -> bool:
+        if isinstance(ip, str):
+            if ip_family(ip) != self.family:
+                return False
+            try:
+                ip = ip_to_long(ip)
+            except ValueError:
+                return False
+        return ip in self.addresses
+
+    def index(self, ip: int) -> int:
+        """
+        Returns the position of the long form address ip in the range.
+        """
+        return self.addresses.index(ip)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, IPRange):
+            return (
+                self.family == other.family
+                and self.addresses == other.addresses
+            )
+        return NotImplemented
+
+    @overload
+    def __getitem__(self, index: int) -> int: ...
+
+    @overload  # noqa: F811
+    def __getitem__(self, index: slice) -> "IPRange": ...
+
+    def __getitem__(  # noqa: F811
+            self,
+            index: Union[int, slice]
+    ) -> Union[int, "IPRange"]:
+        if isinstance(index, slice):
+            sliced = self.addresses[index]
+            result = IPRange(0, 0, family=self.family)
+            result.addresses = sliced
+            return result
+        return self.addresses[index]
+
+
+class IPSet:
+    """
+    A set of long form IPv4 or IPv6 addresses stored as a sorted list of
+    disjoint [start, stop) intervals, so sets like a /8 minus tens of
+    thousands of excluded prefixes take memory proportional to the
+    number of intervals rather than the number of addresses.
+    Union (|), intersection (&) and difference (-) with another IPSet
+    merge the two interval lists in time proportional to their lengths.
+    Like IPRange it supports len, in, indexing and ordered iteration,
+    and `in` also accepts text form addresses.
+    """
+    def __init__(
+            self,
+            intervals: Iterable[Tuple[int, int]] = (),
+            family: int = socket.AF_INET
+    ):
+        self.family: int = family
+        end = 2**128 if family == socket.AF_INET6 else 0x100000000
+        merged: List[Tuple[int, int]] = []
+        for start, stop in sorted(intervals):
+            if not 0 <= start <= stop <= end:
+                raise ValueError(
+                    f"Invalid IP address range: [{start}, {stop})"
+                )
+            if merged and start <= merged[-1][1]:
+                # overlapping or touching intervals become one
+                if stop > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], stop)
+            elif start < stop:
+                merged.append((start, stop))
+        self._set_intervals(merged)
+
+    def _from_sorted(
+            self,
+            other: "IPSet",
+            intervals: List[Tuple[int, int]]
+    ) -> "IPSet":
+        """
+        Makes an IPSet of the same family as self and other from
+        intervals which are already sorted, disjoint and not touching,
+        without checking them.
+        """
+        if other.family != self.family:
+            raise ValueError("Can't combine IPv4 and IPv6 sets")
+        result = IPSet(family=self.family)
+        result._set_intervals(intervals)
+        return result
+
+    def _set_intervals(self, intervals: List[Tuple[int, int]]) -> None:
+        self.intervals: List[Tuple[int, int]] = intervals
+        # the start of every interval, for finding addresses with bisect
+        self.starts: List[int] = [start for start, _ in intervals]
+        # the index of the first address of every interval
+        self.offsets: List[int] = [0]
+        for start, stop in intervals:
+            self.offsets.append(self.offsets[-1] + stop - start)
+
+    def __repr__(self) -> str:
+        return "IPSet(" + ", ".join(
+            f"{long_to_ip(start, self.family)}"
+            f"-{long_to_ip(stop - 1, self.family)}"
+            for start, stop in self.intervals
+        ) + ")"
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, stop in self.intervals:
+            yield from range(start, stop)
+
+    def __contains__(self, ip: object) -> bool:
+        if isinstance(ip, str):
+            if ip_family(ip) != self.family:
+                return False
+            try:
+                ip = ip_to_long(ip)
+            except ValueError:
+                return False
+        if not isinstance(ip, int):
+            return False
+        index = bisect_right(self.starts, ip) - 1
+        return index >= 0 and ip < self.intervals[index][1]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, IPSet):
+            return (
+                self.family == other.family
+                and self.intervals == other.intervals
+            )
+        return NotImplemented
+
+    def index(self, ip: int) -> int:
+        """
+        Returns the position of the long form address ip in the set.
+        """
+        if ip not in self:
+            raise ValueError(f"{ip} is not in IPSet")
+        interval = bisect_right(self.starts, ip) - 1
+        return self.offsets[interval] + ip - self.starts[interval]
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.offsets[-1]
+        if not 0 <= index < self.offsets[-1]:
+            raise IndexError("IPSet index out of range")
+        interval = bisect_right(self.offsets, index) - 1
+        return self.intervals[interval][0] + index - self.offsets[interval]
+
+    def overlaps(self, start: int, stop: int) -> bool:
+        """
+        Returns whether any of the addresses in [start, stop) are in the set.
+        """
+        index = max(0, bisect_right(self.starts, start) - 1)
+        if index < len(self.intervals) and self.intervals[index][1] <= start:
+            index += 1
+        return index < len(self.intervals) and self.intervals[index][0] < stop
+
+    def __or__(self, other: "IPSet") -> "IPSet":
+        merged: List[Tuple[int, int]] = []
+        # both lists are sorted so merging them keeps them sorted
+        for start, stop in heapq.merge(self.intervals, other.intervals):
+            if merged and start <= merged[-1][1]:
+                if stop > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], stop)
+            else:
+                merged.append((start, stop))
+        return self._from_sorted(other, merged)
+
+    def __and__(self, other: "IPSet") -> "IPSet":
+        result: List[Tuple[int, int]] = []
+        i = j = 0
+        while i < len(self.intervals) and j < len(other.intervals):
+            start = max(self.intervals[i][0], other.intervals[j][0])
+            stop = min(self.intervals[i][1], other.intervals[j][1])
+            if start < stop:
+                result.append((start, stop))
+            # move past whichever interval finishes first
+            if self.intervals[i][1] < other.intervals[j][1]:
+                i += 1
+            else:
+                j += 1
+        return self._from_sorted(other, result)
+
+    def __sub__(self, other: "IPSet") -> "IPSet":
+        result: List[Tuple[int, int]] = []
+        for start, stop in self.intervals:
+            # find the first removed interval which ends after this starts
+            j = max(0, bisect_right(other.starts, start) - 1)
+            if j < len(other.intervals) and other.intervals[j][1] <= start:
+                j += 1
+            k = j
+            # cut out every removed interval which overlaps this one
+            while k < len(other.intervals) and other.intervals[k][0] < stop:
+                cut_start, cut_stop = other.intervals[k]
+                if cut_start > start:
+                    result.append((start, cut_start))
+                start = max(start, cut_stop)
+                k += 1
+            if start < stop:
+                result.append((start, stop))
+        return self._from_sorted(other, result)
+
+
+def ip_network(ip: str, network_bits: int) -> IPRange:
+    """
+    Returns the range of every long form address in the subnet
+    specified by the IP/network bits format, including the
+    network and broadcast addresses. ip can be IPv4 or IPv6,
+    the range is lazy so even an IPv6 /64 can be iterated over.
+    If the number of network bits is not between 0 and 32
+    (128 for IPv6) it raises an error.
     If the IP address is invalid according to is_valid_ip it raises an error.
     """
+    family = ip_family(ip)
+    address_bits = 128 if family == socket.AF_INET6 else 32
 
-    if not 0 <= network_bits <= 32:
+    if not 0 <= network_bits <= address_bits:
         raise ValueError(f"Invalid number of network bits: [{network_bits}]")
 
     if not is_valid_ip(ip):
@@ -139,53 +448,271 @@ def ip_range(ip: str, network_bits: int) -> Set[str]:
     # get the ip as long form which is useful
     # later on for using bitwise operators
     # to isolate only the constant(network) bits
-    ip_long = dot_to_long(ip)
+    ip_long = ip_to_long(ip)
 
     # generate the bit mask which specifies
     # which bits to keep and which to discard
-    mask = int(
-        f"{'1'*network_bits:0<32s}",
-        base=2
-    )
+    all_bits = (1 << address_bits) - 1
+    mask = all_bits ^ (all_bits >> network_bits)
     lower_bound = ip_long & mask
-    upper_bound = ip_long | (mask ^ 0xFFFFFFFF)
-
-    # turn all the long form IP addresses between
-    # the lower and upper bound into dot form
-    if network_bits <= 30:
-        return set(
-            long_to_dot(long_ip)
-            for long_ip in
-            range(lower_bound+1, upper_bound)
-        )
-    else:
-        return set(
-            long_to_dot(long_ip)
-            for long_ip in
-            range(lower_bound, upper_bound+1)
-        )
+    upper_bound = ip_long | (mask ^ all_bits)
+    return IPRange(lower_bound, upper_bound+1, family=family)
+
+
+def ip_range(ip: str, network_bits: int) -> IPRange:
+    """
+    Takes a Classless Inter Domain Routing(CIDR) address subnet
+    specification and returns the range of long form addresses
+    specified by the IP/network bits format, the network and
+    broadcast addresses are left out of IPv4 subnets bigger than a /31,
+    IPv6 doesn't have broadcast addresses so they are left as they are.
+    If the number of network bits is not valid it raises an error.
+    If the IP address is invalid according to is_valid_ip it raises an error.
+    """
 
+    network = ip_network(ip, network_bits)
+    if network.family == socket.AF_INET and network_bits <= 30:
+        # leave out the network and broadcast addresses
+        return network[1:-1]
+    else:
+        return network
 
 
-def get_local_ip() -> str:
+def get_local_ip(
+        remote: str = "google.com",
+        family: int = socket.AF_INET
+) -> str:
     """
-    Connects to the google.com with UDP and gets
+    Connects to remote (google.com by default) with UDP and gets
     the IP address used to connect(the local address).
+    Connecting a UDP socket sends nothing so this is a cheap
+    way to find the address packets to remote will come from.
+    family says whether remote is reached over IPv4 or IPv6.
     """
     with closing(
             socket.socket(
-                socket.AF_INET,
+                family,
                 socket.SOCK_DGRAM
             )
     ) as s:
         try:
-            s.connect(("google.com", 80))
-            ip, _ = s.getsockname()
+            s.connect((remote, 80))
+            ip, *_ = s.getsockname()
         except:
-            ip = "127.0.0.1"
+            ip = "::1" if family == socket.AF_INET6 else "127.0.0.1"
     return ip
 
 
+def is_ethernet(interface: str) -> bool:
+    """
+    Returns True if interface is an ethernet link, which neighbours
+    can be found on with ARP, as opposed to e.g. a tun, wireguard or
+    ppp link where nothing answers ARP.
+    """
+    # 1 is ARPHRD_ETHER
+    try:
+        with open(f"/sys/class/net/{interface}/type") as link_type:
+            return link_type.read().strip() == "1"
+    except (OSError, ValueError):
+        return False
+
+
+def get_routes(
+        family: int = socket.AF_INET
+) -> List[Tuple[str, int, int, int]]:
+    """
+    Reads the kernel's routing table for family and returns the
+    interface, long form destination, mask and gateway of every route
+    which is up, most specific first, or an empty list if the table
+    can't be read.
+    """
+
+    def to_long(field: str) -> int:
+        """
+        /proc/net/route prints addresses as the hex of the
+        network order bytes read as a host order integer.
+        """
+        return struct.unpack("!I", struct.pack("=I", int(field, 16)))[0]
+
+    routes: List[Tuple[str, int, int, int]] = []
+    try:
+        if family == socket.AF_INET6:
+            with open("/proc/net/ipv6_route") as route_table:
+                for line in route_table:
+                    fields = line.split()
+                    # 0x1 is the RTF_UP flag
+                    if not int(fields[8], 16) & 0x1:
+                        continue
+                    prefix = int(fields[1], 16)
+                    routes.append((
+                        fields[9],
+                        int(fields[0], 16),
+                        (2**128 - 1) ^ (2**(128 - prefix) - 1),
+                        int(fields[4], 16)
+                    ))
+        else:
+            with open("/proc/net/route") as route_table:
+                # skip the column headings
+                next(route_table)
+                for line in route_table:
+                    fields = line.split()
+                    interface, destination, gateway, flags = fields[:4]
+                    if int(flags, 16) & 0x1:
+                        routes.append((
+                            interface,
+                            to_long(destination),
+                            to_long(fields[7]),
+                            to_long(gateway)
+                        ))
+    except (OSError, StopIteration, ValueError, IndexError):
+        return []
+    # masks are all ones then all zeros so the longer is the larger
+    routes.sort(key=lambda route: route[2], reverse=True)
+    return routes
+
+
+def get_range_interface(start: int, stop: int) -> Optional[str]:
+    """
+    Reads the kernel's routing table and returns the name of the
+    interface which every long form address from start to stop is
+    directly attached to, or None if reaching any of them needs a
+    gateway or another interface, or the interface isn't an ethernet
+    link, see is_ethernet.
+    Every route for a part of the range is looked at, not just the
+    routes for its ends.
+    """
+    routes = get_routes()
+    # the kernel uses the most specific route for the whole range,
+    # which has to cover both of its ends
+    covering = [
+        route for route in routes
+        if start & route[2] == route[1] and stop & route[2] == route[1]
+    ]
+    if not covering:
+        return None
+    interface, _, mask, gateway = covering[0]
+    if gateway != 0:
+        return None
+    # any more specific route for part of the range
+    # must be for the same link
+    for other_interface, destination, other_mask, other_gateway in routes:
+        end = destination | (~other_mask & 0xFFFFFFFF)
+        if (
+                other_mask > mask
+                and destination <= stop
+                and end >= start
+                and (other_gateway != 0 or other_interface != interface)
+        ):
+            return None
+    if not is_ethernet(interface):
+        return None
+    return interface
+
+
+def get_local_addresses() -> Set[int]:
+    """
+    Returns the set of long form IPv4 addresses of this machine's own
+    interfaces, read from the kernel's local routing table in
+    /proc/net/fib_trie, or an empty set if it can't be read.
+    """
+    local: Set[int] = set()
+    try:
+        with open("/proc/net/fib_trie") as fib_trie:
+            address = None
+            for line in fib_trie:
+                fields = line.split()
+                # each address is followed by the routes it has
+                if fields[:1] == ["|--"]:
+                    address = fields[1]
+                elif fields[-2:] == ["host", "LOCAL"] and fields[0] == "/32":
+                    if address is not None:
+                        local.add(dot_to_long(address))
+    except (OSError, ValueError):
+        pass
+    return local
+
+
+def get_neighbours() -> Set[int]:
+    """
+    Returns the set of long form IPv4 addresses which the kernel's neighbour
+    table says are REACHABLE i.e. hosts which have recently been
+    confirmed to be up, without sending any packets.
+    The table is dumped over netlink, if that isn't possible then the
+    set is empty, /proc/net/arp marks stale entries complete too so it
+    can't tell which hosts are still up.
+    """
+    RTM_NEWNEIGH = 28
+    RTM_GETNEIGH = 30
+    NLM_F_REQUEST = 0x1
+    NLM_F_DUMP = 0x300
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NDA_DST = 1
+    NUD_REACHABLE = 0x02
+    neighbours: Set[int] = set()
+    try:
+        with closing(
+                socket.socket(
+                    socket.AF_NETLINK,
+                    socket.SOCK_RAW,
+                    socket.NETLINK_ROUTE
+                )
+        ) as s:
+            # a netlink header followed by an ndmsg asking
+            # for every IPv4 entry in the neighbour table
+            ndmsg = struct.pack("=BBHiHBB", socket.AF_INET, 0, 0, 0, 0, 0, 0)
+            s.send(struct.pack(
+                "=IHHII",
+                16 + len(ndmsg),
+                RTM_GETNEIGH,
+                NLM_F_REQUEST | NLM_F_DUMP,
+                1,
+                0
+            ) + ndmsg)
+            done = False
+            while not done:
+                data = s.recv(65536)
+                offset = 0
+                while offset < len(data):
+                    length, msg_type = struct.unpack_from("=IH", data, offset)
+                    if msg_type in {NLMSG_DONE, NLMSG_ERROR} or length == 0:
+                        done = True
+                        break
+                    if msg_type == RTM_NEWNEIGH:
+                        family, _, _, _, state, _, _ = struct.unpack_from(
+                            "=BBHiHBB",
+                            data,
+                            offset + 16
+                        )
+                        # walk the attributes looking for the address
+                        attr = offset + 28
+                        while attr < offset + length:
+                            attr_len, attr_type = struct.unpack_from(
+                                "=HH",
+                                data,
+                                attr
+                            )
+                            if attr_len < 4:
+                                break
+                            if (
+                                    attr_type == NDA_DST
+                                    and family == socket.AF_INET
+                                    and state & NUD_REACHABLE
+                            ):
+                                neighbours.add(struct.unpack_from(
+                                    "!I",
+                                    data,
+                                    attr + 4
+                                )[0])
+                            # attributes are aligned to 4 bytes
+                            attr += (attr_len + 3) & ~3
+                    offset += (length + 3) & ~3
+    except (OSError, AttributeError):
+        # no netlink (or not linux) so every host goes through discovery
+        return set()
+    return neighbours
+
+
 def get_free_port() -> int:
     """
     Attempts to bind to port 0 which assigns a free port number to the socket,
@@ -207,53 +734,80 @@ def ip_checksum(packet: bytes) -> int:
     """
     ip_checksum function takes in a packet
     and returns the checksum.
+    The packet is read as one big number rather than word by word,
+    2**16 is 1 more than 0xFFFF so the sum of the 16 bit words with
+    the carries added back on is that number modulo 0xFFFF.
     """
+    total = int.from_bytes(packet, "big")
     if len(packet) % 2 == 1:
-        # if the length of the packet is odd, add a NULL byte
-        # to the end as padding
-        packet += b"\0"
-
-    total = 0
-    for first, second in (
-            packet[i:i+2]
-            for i in range(0, len(packet), 2)
-    ):
-        total += (first << 8) + second
+        # if the length of the packet is odd, pad it with a NULL byte
+        total <<= 8
+    # the end around carry sum is only 0 when every word is,
+    # otherwise it is between 1 and 0xFFFF
+    total = total % 0xFFFF or (0xFFFF if total else 0)
+    # invert the checksum and take the last 16 bits.
+    return (~total & 0xFFFF)
+
+
+def checksum_update(checksum: int, old: int, new: int) -> int:
+    """
+    Takes in a checksum made by ip_checksum, the sum of the 16 bit
+    words of the packet that have changed and the sum of what they
+    have changed to, and returns the checksum of the changed packet
+    without having to sum the whole packet again.
+    This is equation 3 from RFC 1624: HC' = ~(~HC + ~m + m')
+    """
+    # fold the sum of the new words down to 16 bits first so that
+    # the ones' complement of old and new are taken over the same width
+    while new > 0xFFFF:
+        new = (new & 0xFFFF) + (new >> 16)
+    while old > 0xFFFF:
+        old = (old & 0xFFFF) + (old >> 16)
+    total = (~checksum & 0xFFFF) + (~old & 0xFFFF) + new
+    # add the carries back on, twice covers a carry from the first fold
+    total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
 
-    # calculate the number of times a
-    # carry bit was added and add it back on
-    carried = (total - (total & 0xFFFF)) >> 16
-    total &= 0xFFFF
-    total += carried
 
-    if total > 0xFFFF:
-        # adding the carries generated a carry
-        total &= 0xFFFF
-        total += 1
+# a writable buffer the templates can pack their packets into
+BUFFER = Union[bytearray, memoryview]
 
-    # invert the checksum and take the last 16 bits.
-    return (~total & 0xFFFF)
+# the ICMPv6 types of ECHO REQUEST and ECHO REPLY
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
 
 
-def make_icmp_packet(ID: int) -> bytes:
+def make_icmp_packet(
+        ID: int,
+        sequence: int = 1,
+        timestamp: Optional[float] = None,
+        family: int = socket.AF_INET
+) -> bytes:
     """
-    Takes an argument of the process ID of the calling process.
-    Returns an ICMP ECHO REQUEST packet created with this ID
+    Takes an argument of the process ID of the calling process
+    and optionally the sequence number of the echo and the time to
+    put in it, which defaults to now.
+    Returns an ICMP ECHO REQUEST packet created with this ID and sequence,
+    or an ICMPv6 one if family is socket.AF_INET6. The kernel fills in
+    the checksum of ICMPv6 packets as it covers the IPv6 addresses.
     """
+    if timestamp is None:
+        timestamp = time.time()
 
-    ICMP_ECHO_REQUEST = 8
+    ICMP_ECHO_REQUEST = ICMP6_ECHO_REQUEST if family == socket.AF_INET6 else 8
     # pack the information for the dummy header needed
     # for the IP checksum
     dummy_header = struct.pack(
-        "bbHHh",
+        "BBHHH",
         ICMP_ECHO_REQUEST,
         0,
         0,
         ID,
-        1
+        sequence
     )
     # pack the current time into a double
-    time_bytes = struct.pack("d", time.time())
+    time_bytes = struct.pack("d", timestamp)
     # define the bytes to repeat in the data section of the packet
     # this makes the packets easily identifiable in packet captures.
     bytes_to_repeat_in_data = map(ord, " y33t ")
@@ -270,41 +824,201 @@ def make_icmp_packet(ID: int) -> bytes:
     checksum = socket.htons(ip_checksum(dummy_header + data))
     # pack the header with the correct checksum and information
     header = struct.pack(
-        "bbHHh",
+        "BBHHH",
         ICMP_ECHO_REQUEST,
         0,
         checksum,
         ID,
-        1
+        sequence
     )
     # concatonate the header bytes and the data bytes
     return header + data
 
 
+class EchoTemplate:
+    """
+    A reusable ICMP ECHO REQUEST for a fixed ID, identical to the
+    packets make_icmp_packet creates. Only the sequence number and
+    the timestamp change between packets so the rest of the packet
+    and its checksum are worked out once, and each packet's checksum
+    is updated from that with the RFC 1624 arithmetic instead of
+    summing the whole packet again.
+    """
+    # the sequence number and timestamp sit next to each other
+    # from byte 6 to byte 16 of the packet, native byte order
+    # is used for both of them as in make_icmp_packet.
+    FIELDS = struct.Struct("=Hd")
+    FIELD_WORDS = struct.Struct("!5H")
+    OFFSET = 6
+    # the type and code, checksum and ID before the fields
+    HEAD = struct.Struct("!2sH2s")
+
+    def __init__(self, ID: int, family: int = socket.AF_INET):
+        self.ID: int = ID
+        # the template has the sequence and timestamp zeroed
+        template = make_icmp_packet(ID, 0, 0, family)
+        # the checksum of the template is stored in network byte order
+        (self.checksum,) = struct.unpack_from("!H", template, 2)
+        self.head: bytes = template[:2]
+        self.id_bytes: bytes = template[4:self.OFFSET]
+        self.tail: bytes = template[self.OFFSET + self.FIELDS.size:]
+        self.size: int = len(template)
+
+    def __repr__(self) -> str:
+        return f"EchoTemplate(ID={self.ID}, checksum={self.checksum:04x})"
+
+    def packet(self, sequence: int, timestamp: float) -> bytes:
+        """
+        Returns the ECHO REQUEST with the given sequence number and time.
+        """
+        fields = self.FIELDS.pack(sequence, timestamp)
+        # the template had zeros where the new words go
+        checksum = checksum_update(
+            self.checksum,
+            0,
+            sum(self.FIELD_WORDS.unpack(fields))
+        )
+        return b"".join((
+            self.head,
+            struct.pack("!H", checksum),
+            self.id_bytes,
+            fields,
+            self.tail
+        ))
+
+    def pack_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            sequence: int,
+            timestamp: float
+    ) -> int:
+        """
+        Writes the ECHO REQUEST with the given sequence number and time
+        into buffer at offset and returns its size, without making any
+        new bytes objects along the way.
+        """
+        fields_offset = offset + self.OFFSET
+        self.FIELDS.pack_into(buffer, fields_offset, sequence, timestamp)
+        checksum = checksum_update(
+            self.checksum,
+            0,
+            sum(self.FIELD_WORDS.unpack_from(buffer, fields_offset))
+        )
+        self.HEAD.pack_into(
+            buffer,
+            offset,
+            self.head,
+            checksum,
+            self.id_bytes
+        )
+        tail_offset = fields_offset + self.FIELDS.size
+        buffer[tail_offset:offset + self.size] = self.tail
+        return self.size
+
+
+def make_icmp_timestamp_packet(
+        ID: int,
+        sequence: int = 1,
+        timestamp: Optional[float] = None
+) -> bytes:
+    """
+    Takes an argument of the process ID of the calling process
+    and optionally the sequence number of the request.
+    Returns an ICMP TIMESTAMP REQUEST packet created with this ID and sequence.
+    timestamp is the time.time() it is sent at, by default now.
+    """
+    ICMP_TIMESTAMP_REQUEST = 13
+    if timestamp is None:
+        timestamp = time.time()
+    # the originate timestamp is milliseconds since midnight UTC
+    originate = int(timestamp * 1000) % (24*60*60*1000)
+    # the ID and sequence are packed in the same
+    # byte order as in make_icmp_packet
+    dummy_header = struct.pack(
+        "bbHHH",
+        ICMP_TIMESTAMP_REQUEST,
+        0,
+        0,
+        ID,
+        sequence
+    )
+    # originate, recieve and transmit timestamps
+    timestamps = struct.pack("!III", originate, 0, 0)
+    checksum = socket.htons(ip_checksum(dummy_header + timestamps))
+    header = struct.pack(
+        "bbHHH",
+        ICMP_TIMESTAMP_REQUEST,
+        0,
+        checksum,
+        ID,
+        sequence
+    )
+    return header + timestamps
+
+
+def make_arp_packet(src_mac: bytes, src_ip: int, dst_ip: int) -> bytes:
+    """
+    Takes in the local MAC and long form IP addresses and the IP to look up.
+    Returns an ethernet frame holding an ARP REQUEST broadcast
+    asking who has dst_ip.
+    """
+    ETH_P_ARP = 0x0806
+    ARP_REQUEST = 1
+    broadcast = b"\xff" * 6
+    ethernet_header = struct.pack(
+        "!6s6sH",
+        broadcast,
+        src_mac,
+        ETH_P_ARP
+    )
+    # hardware type 1 is ethernet and the protocol is IPv4
+    arp = struct.pack(
+        "!HHBBH6sI6sI",
+        1,
+        0x0800,
+        6,
+        4,
+        ARP_REQUEST,
+        src_mac,
+        src_ip,
+        b"\0" * 6,
+        dst_ip
+    )
+    return ethernet_header + arp
+
+
 def make_tcp_packet(
         src: int,
         dst: int,
-        from_address: str,
-        to_address: str,
-        flags: int) -> bytes:
+        from_address: int,
+        to_address: int,
+        flags: int,
+        family: int = socket.AF_INET,
+        seq: int = 0) -> bytes:
     """
-    Takes in the source and destination port/ip address
-    returns a tcp packet.
+    Takes in the source and destination port/long form ip address
+    returns a tcp packet, the addresses are IPv6 if family is
+    socket.AF_INET6 which changes the pseudo header for the checksum.
+    seq is the sequence number, see syn_cookie.
     flags:
     2 => SYN
     18 => SYN:ACK
     4 => RST
+    16 => ACK
     """
     # validate that the information passed in is valid
-    if flags not in {2, 18, 4}:
+    if flags not in {2, 18, 4, 16}:
         raise ValueError(
-            f"Flags must be one of 2:SYN, 18:SYN,ACK, 4:RST. not: [{flags}]"
+            "Flags must be one of 2:SYN, 18:SYN,ACK, 4:RST, 16:ACK. "
+            f"not: [{flags}]"
         )
-    if not is_valid_ip(from_address):
+    end = 2**128 if family == socket.AF_INET6 else 0x100000000
+    if not 0 <= from_address < end:
         raise ValueError(
             f"Invalid source IP address: [{from_address}]"
         )
-    if not is_valid_ip(to_address):
+    if not 0 <= to_address < end:
         raise ValueError(
             f"Invalid destination IP address: [{to_address}]"
         )
@@ -316,11 +1030,11 @@ def make_tcp_packet(
         raise ValueError(
             f"Invalid destination port: [{dst}]"
         )
-    # turn the ip addresses into long form
-    src_addr = dot_to_long(from_address)
-    dst_addr = dot_to_long(to_address)
-
-    seq = ack = urg = 0
+    if not 0 <= seq <= 0xFFFFFFFF:
+        raise ValueError(
+            f"Invalid sequence number: [{seq}]"
+        )
+    ack = urg = 0
     data_offset = 6 << 4
     window_size = 1024
     max_segment_size = (2, 4, 1460)
@@ -340,14 +1054,21 @@ def make_tcp_packet(
     )
     # pack the psuedo header that is also needed for the checksum
     # just because TCP and why not
-    psuedo_header = struct.pack(
-        "!IIBBH",
-        src_addr,
-        dst_addr,
-        0,
-        6,
-        len(dummy_header)
-    )
+    if family == socket.AF_INET6:
+        psuedo_header = (
+            from_address.to_bytes(16, "big")
+            + to_address.to_bytes(16, "big")
+            + struct.pack("!I3xB", len(dummy_header), 6)
+        )
+    else:
+        psuedo_header = struct.pack(
+            "!IIBBH",
+            from_address,
+            to_address,
+            0,
+            6,
+            len(dummy_header)
+        )
 
     checksum = ip_checksum(psuedo_header + dummy_header)
     # pack the final TCP packet with the relevant data and checksum
@@ -366,6 +1087,133 @@ def make_tcp_packet(
     )
 
 
+# what the SYN cookies are hashed from, the destination address is
+# padded to 16 bytes so IPv4 and IPv6 addresses are hashed alike
+COOKIE_FIELDS = struct.Struct("!16sHH")
+
+
+def syn_cookie(
+        secret: bytes,
+        dst_ip: int,
+        dst_port: int,
+        src_port: int
+) -> int:
+    """
+    Returns the sequence number for a SYN from src_port to dst_port on
+    the long form address dst_ip, a hash of them keyed with secret,
+    which can be at most 64 bytes.
+    The SYN/ACK or RST answering the SYN acknowledges it plus 1, so a
+    reply can be checked just by hashing it again, without remembering
+    which SYNs were sent.
+    """
+    return int.from_bytes(
+        hashlib.blake2b(
+            COOKIE_FIELDS.pack(dst_ip.to_bytes(16, "big"), dst_port, src_port),
+            digest_size=4,
+            key=secret
+        ).digest(),
+        "big"
+    )
+
+
+class SynTemplate:
+    """
+    A reusable TCP SYN from src_port on the long form address
+    from_address, identical to the SYNs make_tcp_packet creates,
+    or the same packet with other flags, such as 16 for an ACK.
+    Only the destination port, the sequence number and the destination
+    address in the psuedo header change between SYNs so the packet is
+    packed and summed once, and each SYN's checksum is updated from
+    that with the RFC 1624 arithmetic, where the words being replaced
+    are all zero.
+    The values passed to packet aren't checked so they must be valid.
+    """
+    # source port, destination port, sequence number, acknowledgement
+    # to urgent pointer, checksum and the urgent pointer and options
+    FIELDS = struct.Struct("!2sHI8sH6s")
+
+    def __init__(
+            self,
+            src_port: int,
+            from_address: int,
+            family: int = socket.AF_INET,
+            flags: int = 2
+    ):
+        self.src_port: int = src_port
+        self.from_address: int = from_address
+        self.family: int = family
+        self.flags: int = flags
+        # the template has the destination port and address zeroed
+        template = make_tcp_packet(
+            src_port,
+            0,
+            from_address,
+            0,
+            flags,
+            family
+        )
+        (checksum,) = struct.unpack_from("!H", template, 16)
+        # the ones' complement sum of the template and its psuedo header
+        self.total: int = ~checksum & 0xFFFF
+        self.head: bytes = template[:2]
+        self.middle: bytes = template[8:16]
+        self.tail: bytes = template[18:]
+
+    def __repr__(self) -> str:
+        return (
+            f"SynTemplate(src_port={self.src_port}, "
+            f"from_address={long_to_ip(self.from_address, self.family)}, "
+            f"flags={self.flags})"
+        )
+
+    def packet(self, to_address: int, dst_port: int, seq: int = 0) -> bytes:
+        """
+        Returns the SYN to dst_port on the long form address to_address
+        with the sequence number seq.
+        """
+        # the sum only has to be right modulo 0xFFFF, which the whole
+        # address and sequence number are to the sum of their words,
+        # and the template's sum is never 0 so neither is the new one
+        total = (
+            self.total + dst_port + seq + to_address
+        ) % 0xFFFF or 0xFFFF
+        return self.FIELDS.pack(
+            self.head,
+            dst_port,
+            seq,
+            self.middle,
+            ~total & 0xFFFF,
+            self.tail
+        )
+
+    def pack_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            to_address: int,
+            dst_port: int,
+            seq: int = 0
+    ) -> int:
+        """
+        Writes the SYN packet returns into buffer at offset
+        and returns its size.
+        """
+        total = (
+            self.total + dst_port + seq + to_address
+        ) % 0xFFFF or 0xFFFF
+        self.FIELDS.pack_into(
+            buffer,
+            offset,
+            self.head,
+            dst_port,
+            seq,
+            self.middle,
+            ~total & 0xFFFF,
+            self.tail
+        )
+        return self.FIELDS.size
+
+
 def make_udp_packet(
         src: int,
         dst: int
@@ -397,6 +1245,320 @@ def make_udp_packet(
     ) + data
 
 
+# an IPv4 header without options, for sockets with IP_HDRINCL set
+IP_HEADER = struct.Struct("!BBHHHBBHII")
+# the time to live of the IP headers the scans write themselves
+DEFAULT_TTL = 64
+
+
+class PacketFactory:
+    """
+    Builds the probes for one scan session sent from src_port on the
+    long form address from_address, which is IPv6 if family is
+    socket.AF_INET6. Everything is validated once when the factory is
+    made, so unlike make_tcp_packet and make_udp_packet the builders
+    do no checks and are only passed what changes between probes,
+    which must be valid. Their packets are identical to those of
+    make_tcp_packet, make_udp_packet, make_icmp_packet and
+    make_icmp_timestamp_packet.
+    Each builder has an _into version which writes the packet into a
+    buffer that is reused between probes instead of returning it.
+    ip_into writes the IPv4 header in front of them for raw sockets
+    which have IP_HDRINCL set.
+    If secret is given the SYNs carry a syn_cookie keyed with it as
+    their sequence number, otherwise their sequence number is 0.
+    """
+    def __init__(
+            self,
+            from_address: int,
+            src_port: int,
+            family: int = socket.AF_INET,
+            ID: int = 0,
+            secret: Optional[bytes] = None
+    ):
+        if family not in {socket.AF_INET, socket.AF_INET6}:
+            raise ValueError(f"Invalid address family: [{family}]")
+        end = 2**128 if family == socket.AF_INET6 else 0x100000000
+        if not 0 <= from_address < end:
+            raise ValueError(
+                f"Invalid source IP address: [{from_address}]"
+            )
+        if not is_valid_port_number(src_port):
+            raise ValueError(
+                f"Invalid source port: [{src_port}]"
+            )
+        if not 0 <= ID <= 0xFFFF:
+            raise ValueError(f"Invalid ICMP id: [{ID}]")
+        if secret is not None and len(secret) > 64:
+            raise ValueError(
+                f"Invalid SYN cookie secret length: [{len(secret)}]"
+            )
+        self.from_address: int = from_address
+        self.src_port: int = src_port
+        self.family: int = family
+        self.ID: int = ID
+        self.secret: Optional[bytes] = secret
+        self.syn_template = SynTemplate(src_port, from_address, family)
+        self.ack_template = SynTemplate(
+            src_port,
+            from_address,
+            family,
+            flags=16
+        )
+        self.echo_template = EchoTemplate(ID, family)
+        # the UDP packets only differ by their destination port
+        udp_packet = make_udp_packet(src_port, 0)
+        self.udp_head: bytes = udp_packet[:2]
+        self.udp_tail: bytes = udp_packet[4:]
+        self.udp_fields = struct.Struct(f"!2sH{len(self.udp_tail)}s")
+        # the ones' complement sum of the fixed words of an IP header:
+        # the version and header length, time to live and the source
+        self.ip_total: int = (
+            0x4500 + (DEFAULT_TTL << 8) + from_address % 0xFFFF
+        )
+
+    def __repr__(self) -> str:
+        return (
+            "PacketFactory("
+            f"from_address={long_to_ip(self.from_address, self.family)}, "
+            f"src_port={self.src_port}, ID={self.ID})"
+        )
+
+    def cookie(self, dst_ip: int, dst_port: int) -> int:
+        """
+        Returns the sequence number of the SYN to dst_port
+        on the long form address dst_ip.
+        """
+        if self.secret is None:
+            return 0
+        return syn_cookie(self.secret, dst_ip, dst_port, self.src_port)
+
+    def syn(self, dst_ip: int, dst_port: int) -> bytes:
+        """
+        Returns a TCP SYN to dst_port on the long form address dst_ip.
+        """
+        return self.syn_template.packet(
+            dst_ip,
+            dst_port,
+            self.cookie(dst_ip, dst_port)
+        )
+
+    def ack(self, dst_ip: int, dst_port: int) -> bytes:
+        """
+        Returns a TCP ACK to dst_port on the long form address dst_ip.
+        """
+        return self.ack_template.packet(dst_ip, dst_port)
+
+    def udp(self, dst_port: int) -> bytes:
+        """
+        Returns a UDP packet to dst_port, its checksum is left
+        to the kernel over IPv6 and left out over IPv4.
+        """
+        return self.udp_fields.pack(self.udp_head, dst_port, self.udp_tail)
+
+    def echo(self, sequence: int, timestamp: float) -> bytes:
+        """
+        Returns an ICMP ECHO REQUEST with the given sequence and time.
+        """
+        return self.echo_template.packet(sequence, timestamp)
+
+    def timestamp(self, sequence: int, timestamp: float) -> bytes:
+        """
+        Returns an ICMP TIMESTAMP REQUEST with the given sequence and
+        time, these are IPv4 only.
+        """
+        return make_icmp_timestamp_packet(self.ID, sequence, timestamp)
+
+    def syn_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            dst_ip: int,
+            dst_port: int
+    ) -> int:
+        """
+        Writes the SYN syn returns into buffer at offset
+        and returns its size.
+        """
+        return self.syn_template.pack_into(
+            buffer,
+            offset,
+            dst_ip,
+            dst_port,
+            self.cookie(dst_ip, dst_port)
+        )
+
+    def ack_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            dst_ip: int,
+            dst_port: int
+    ) -> int:
+        """
+        Writes the ACK ack returns into buffer at offset
+        and returns its size.
+        """
+        return self.ack_template.pack_into(buffer, offset, dst_ip, dst_port)
+
+    def udp_into(self, buffer: BUFFER, offset: int, dst_port: int) -> int:
+        """
+        Writes the UDP packet udp returns into buffer at offset
+        and returns its size.
+        """
+        self.udp_fields.pack_into(
+            buffer,
+            offset,
+            self.udp_head,
+            dst_port,
+            self.udp_tail
+        )
+        return self.udp_fields.size
+
+    def echo_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            sequence: int,
+            timestamp: float
+    ) -> int:
+        """
+        Writes the ECHO REQUEST echo returns into buffer at offset
+        and returns its size.
+        """
+        return self.echo_template.pack_into(
+            buffer,
+            offset,
+            sequence,
+            timestamp
+        )
+
+    def timestamp_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            sequence: int,
+            timestamp: float
+    ) -> int:
+        """
+        Writes the TIMESTAMP REQUEST timestamp returns into buffer at
+        offset and returns its size.
+        """
+        packet = self.timestamp(sequence, timestamp)
+        buffer[offset:offset + len(packet)] = packet
+        return len(packet)
+
+    def ip_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            dst_ip: int,
+            protocol: int,
+            ID: int,
+            payload_size: int
+    ) -> int:
+        """
+        Writes an IPv4 header from from_address to the long form
+        address dst_ip with the given protocol and identification into
+        buffer at offset, in front of the payload_size bytes after it,
+        and returns the size of the whole packet.
+        The header has no options and is only for IPv4.
+        """
+        size = IP_HEADER.size + payload_size
+        # as with the SYNs each address only matters modulo 0xFFFF
+        total = (
+            self.ip_total + size + ID + protocol + dst_ip
+        ) % 0xFFFF or 0xFFFF
+        IP_HEADER.pack_into(
+            buffer,
+            offset,
+            0x45,
+            0,
+            size,
+            ID,
+            0,
+            DEFAULT_TTL,
+            protocol,
+            ~total & 0xFFFF,
+            self.from_address,
+            dst_ip
+        )
+        return size
+
+    def udp_ip_into(
+            self,
+            buffer: BUFFER,
+            offset: int,
+            dst_ip: int,
+            dst_port: int,
+            ID: int
+    ) -> int:
+        """
+        Writes the UDP packet udp returns behind an IPv4 header to the
+        long form address dst_ip with the identification ID, see
+        ip_into, into buffer at offset and returns the size of both.
+        """
+        udp_size = self.udp_into(buffer, offset + IP_HEADER.size, dst_port)
+        return self.ip_into(
+            buffer,
+            offset,
+            dst_ip,
+            socket.IPPROTO_UDP,
+            ID,
+            udp_size
+        )
+
+
+# the socket module doesn't export SO_TIMESTAMPNS, 35 is its value on linux
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+
+
+def enable_timestamps(sock: socket.socket) -> bool:
+    """
+    Asks the kernel to timestamp each packet sock recieves as it arrives.
+    Returns whether or not the kernel agreed to.
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        return True
+    except OSError:
+        return False
+
+
+def recv_timestamped(
+        sock: socket.socket,
+        bufsize: int
+) -> Tuple[bytes, Any, float]:
+    """
+    Recieves a packet from sock and returns it along with the address
+    it came from and the time.time() time it arrived at.
+    The arrival time comes from the kernel's timestamp if enable_timestamps
+    was called on sock, which leaves out however long it took the
+    program to get round to reading it, otherwise it is the time now.
+    The wall clock can be stepped at any time so it is best turned into
+    time.monotonic() time with an offset taken once per scan rather
+    than reading both clocks for every packet, see wall_clock_offset.
+    """
+    timespec = struct.calcsize("ll")
+    data, ancdata, _, address = sock.recvmsg(
+        bufsize,
+        socket.CMSG_SPACE(timespec)
+    )
+    for level, kind, cdata in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = struct.unpack("ll", cdata[:timespec])
+            return data, address, seconds + nanoseconds / 1e9
+    return data, address, time.time()
+
+
+def wall_clock_offset() -> float:
+    """
+    Returns how far time.time() is ahead of time.monotonic(), taking
+    it away from a time from recv_timestamped gives the monotonic time.
+    """
+    return time.time() - time.monotonic()
+
+
 def wait_for_socket(sock: socket.socket, wait_time: float) -> float:
     """
     Wait for wait_time seconds or until the socket is readable.
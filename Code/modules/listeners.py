@@ -2,175 +2,268 @@ from modules import headers
 from modules import ip_utils
 import socket
 import struct
-import time
-from collections import defaultdict
-from contextlib import closing
-from typing import Tuple, Set, DefaultDict
+from typing import Tuple, Set, DefaultDict, Dict, Optional, Sequence
 
 
 PORTS = DefaultDict[str, Set[int]]
+# the long form source address is bytes 12 to 16 of the IP header,
+# reading it on its own is quicker than parsing the whole header
+SOURCE_ADDRESS = struct.Struct("!12xI")
+
+
+def _read(sock: socket.socket) -> Tuple[bytes, int, float, int]:
+    """
+    Reads a single packet from the readable raw socket sock and returns
+    it along with the long form address which sent it, the time it was
+    recieved (see ip_utils.recv_timestamped) and the offset of the
+    header after the IP header. IPv4 raw sockets hand over the whole
+    IP header but IPv6 ones start at the header after it, so the
+    address of an IPv6 packet comes from recvmsg instead.
+    """
+    packet, address, time_recieved = ip_utils.recv_timestamped(sock, 1024)
+    if sock.family == socket.AF_INET6:
+        source = ip_utils.ipv6_to_long(address[0])
+        return packet, source, time_recieved, 0
+    (source,) = SOURCE_ADDRESS.unpack_from(packet)
+    return packet, source, time_recieved, 20
 
 
 def ping(
+        sock: socket.socket,
         ID: int,
-        timeout: float
-) -> Set[Tuple[str, float, headers.ip]]:
-    """
-    Takes in a process id and a timeout and returns
-    a list of addresses which sent ICMP ECHO REPLY
-    packets with the packed id matching ID in the time given by timeout.
-    """
-    ping_sock = socket.socket(
-        socket.AF_INET,
-        socket.SOCK_RAW,
-        socket.IPPROTO_ICMP)
-    # opens a raw socket for sending ICMP protocol packets
-    time_remaining = timeout
-    addresses = set()
-    recieved_from = set()
-    while True:
-        time_waiting = ip_utils.wait_for_socket(ping_sock, time_remaining)
-        # time_waiting stores the time the socket took to become readable
-    # or returns minus one if it ran out of time
-
-        if time_waiting == -1:
-            break
-        time_recieved = time.time()
-        # store the time the packet was recieved
-        recPacket, addr = ping_sock.recvfrom(1024)
-        # recieve the packet
-        ip = headers.ip(recPacket[:20])
-        # unpack the IP header into its respective components
-        icmp = headers.icmp(recPacket[20:28])
-        # unpack the time from the packet.
-        time_sent = struct.unpack(
-            "d",
-            recPacket[28:28 + struct.calcsize("d")]
-        )[0]
-        # unpack the value for when the packet was sent
-        time_taken: float = time_recieved - time_sent
-        # calculate the round trip time taken for the packet
-        if icmp.id == ID:
-            # if the ping was sent from this machine then add it to the list of
-            # responses
-            ip_address, port = addr
-            # this is to prevent a bug where IPs were being added twice
-            if ip_address not in recieved_from:
-                addresses.add((ip_address, time_taken, ip))
-                recieved_from.add(ip_address)
-        elif time_remaining <= 0:
-            break
-        else:
-            continue
-    # return a list of all the addesses that replied to our ICMP echo request.
-    return addresses
-
-
-def udp(dest_ip: str, timeout: float) -> Set[int]:
-    """
-    This listener detects UDP packets from dest_ip in the given timespan,
-    all ports that send direct replies are marked as being open.
-    Returns a list of open ports.
-    """
-
-    time_remaining = timeout
-    ports: Set[int] = set()
-    with socket.socket(
-            socket.AF_INET,
-            socket.SOCK_RAW,
-            socket.IPPROTO_UDP
-    ) as s:
-        while True:
-            time_taken = ip_utils.wait_for_socket(s, time_remaining)
-            if time_taken == -1:
-                break
-            else:
-                time_remaining -= time_taken
-            packet = s.recv(1024)
-            ip = headers.ip(packet[:20])
-            udp = headers.udp(packet[20:28])
-            if dest_ip == ip.source and ip.protocol == 17:
-                ports.add(udp.src)
-
-    return ports
-
-
-def icmp_unreachable(src_ip: str, timeout: float = 2) -> int:
-    """
-    This listener detects ICMP destination unreachable
-    packets and returns the icmp code.
-    This is later used to mark them as either close, open|filtered, filtered.
-    3 -> closed
-    0|1|2|9|10|13 -> filtered
-    -1 -> error with arguments
-    open|filtered means that they are either open or
-    filtered but return nothing.
-    """
-
-    ping_sock = socket.socket(
-        socket.AF_INET,
-        socket.SOCK_RAW,
-        socket.IPPROTO_ICMP
-    )
-    # open raw socket to listen for ICMP destination unrechable packets
-    time_remaining = timeout
-    code = -1
-    while True:
-        time_waiting = ip_utils.wait_for_socket(ping_sock, time_remaining)
-        # wait for socket to be readable
-        if time_waiting == -1:
-            break
-        else:
-            time_remaining -= time_waiting
-        recPacket, addr = ping_sock.recvfrom(1024)
-        # recieve the packet
-        ip = headers.ip(recPacket[:20])
+        outstanding: Dict[int, int]
+) -> Optional[Tuple[int, float, Optional[headers.ip]]]:
+    """
+    Reads a single packet from the readable ICMP or ICMPv6 socket sock.
+    outstanding maps each long form address still to reply to the
+    sequence number of the latest probe sent to it.
+    If the packet is an ICMP ECHO REPLY or TIMESTAMP REPLY carrying
+    the id ID and a sequence number that was sent to its source
+    it returns the address which sent it, the time it was recieved
+    (see ip_utils.recv_timestamped) and its IP header, which is None
+    over IPv6, otherwise it returns None.
+    """
+    recPacket, ip_address, time_recieved, offset = _read(sock)
+    # raw ICMP sockets also see our own requests when
+    # pinging the local machine so only accept replies
+    if offset == 0:
+        icmp6 = headers.icmp6(recPacket[:8])
+        is_reply = icmp6.type == ip_utils.ICMP6_ECHO_REPLY
+        reply_id, sequence = icmp6.id, icmp6.sequence
+    else:
         icmp = headers.icmp(recPacket[20:28])
-        valid_codes = [0, 1, 2, 3, 9, 10, 13]
-        if (
-                ip.source == src_ip
-                and icmp.type == 3
-                and icmp.code in valid_codes
-        ):
-            code = icmp.code
-            break
-        elif time_remaining <= 0:
-            break
-        else:
-            continue
-    ping_sock.close()
-    return code
-
-
-def tcp(address: Tuple[str, int], timeout: float) -> PORTS:
-    """
-    This function is run asynchronously and listens for
-    TCP ACK responses to the sent TCP SYN msg.
-    """
-    ports: DefaultDict[str, Set[int]] = defaultdict(set)
-    with closing(
-            socket.socket(
-                socket.AF_INET,
-                socket.SOCK_RAW,
-                socket.IPPROTO_TCP
-            )) as s:
-        s.bind(address)
-        # bind the raw socket to the listening address
-        time_remaining = timeout
-        while True:
-            time_taken = ip_utils.wait_for_socket(s, time_remaining)
-            # wait for the socket to become readable
-            if time_taken == -1:
-                break
-            else:
-                time_remaining -= time_taken
-            packet = s.recv(1024)
-            # recieve the packet data
-            tcp = headers.tcp(packet[20:40])
-            if tcp.flags & 2:  # syn flags set
-                ports["OPEN"].add(tcp.source)
-            elif tcp.flags & 4:
-                ports["CLOSED"].add(tcp.source)
-            else:
-                continue
-    return ports
+        is_reply = icmp.type in {0, 14}
+        reply_id, sequence = icmp.id, icmp.sequence
+    if not is_reply or reply_id != ID:
+        return None
+    # a reply to any of the probes sent to the address is good enough
+    # but sequence numbers we never sent to it mean the reply isn't ours
+    if not 0 < sequence <= outstanding.get(ip_address, 0):
+        return None
+    # unpack the IP header into its respective components
+    ip = headers.ip(recPacket[:20]) if offset else None
+    return ip_address, time_recieved, ip
+
+
+def echo(
+        sock: socket.socket,
+        ID: int,
+        sent: Dict[int, int]
+) -> Optional[Tuple[int, int, float]]:
+    """
+    Reads a single packet from the readable ICMP socket sock.
+    sent maps each long form address to the sequence number of
+    the latest echo sent to it.
+    If the packet is an ICMP ECHO REPLY carrying the id ID and a
+    sequence number that was sent to its source it returns the address
+    which sent it, the sequence number and the round trip time worked
+    out from the wall clock timestamp at the start of the data (see
+    ip_utils.recv_timestamped), otherwise it returns None.
+    """
+    packet, _, time_recieved = ip_utils.recv_timestamped(sock, 1024)
+    icmp = headers.icmp(packet[20:28])
+    if icmp.type != 0 or icmp.id != ID:
+        return None
+    (ip_address,) = SOURCE_ADDRESS.unpack_from(packet)
+    if not 0 < icmp.sequence <= sent.get(ip_address, 0):
+        return None
+    (time_sent,) = struct.unpack_from("d", packet, 28)
+    return ip_address, icmp.sequence, max(time_recieved - time_sent, 0.0)
+
+
+def tcp_ping(
+        sock: socket.socket,
+        port: int,
+        outstanding: Dict[int, int]
+) -> Optional[Tuple[int, float, Optional[headers.ip]]]:
+    """
+    Reads a single packet from the readable raw TCP socket sock.
+    If the packet is a SYN/ACK or RST sent to port by an
+    address in outstanding then that address is up, so it returns
+    the address, the time the packet was recieved and its IP header,
+    which is None over IPv6, otherwise it returns None.
+    """
+    packet, ip_address, time_recieved, offset = _read(sock)
+    tcp = headers.tcp(packet[offset:offset + 20])
+    # the raw socket sees all TCP traffic to this machine
+    # so only look at packets sent back to our port
+    if tcp.destination != port or ip_address not in outstanding:
+        return None
+    # SYN/ACK = 18, RST = 4
+    if tcp.flags & 0x12 == 0x12 or tcp.flags & 4:
+        ip = headers.ip(packet[:20]) if offset else None
+        return ip_address, time_recieved, ip
+    else:
+        return None
+
+
+def arp(
+        sock: socket.socket,
+        local_ip: int,
+        outstanding: Dict[int, int]
+) -> Optional[Tuple[int, float, headers.arp]]:
+    """
+    Reads a single frame from the readable ARP packet socket sock.
+    If it is an ARP REPLY to local_ip from an address which was sent
+    a request it returns the address, the time the frame was recieved
+    and the ARP header, otherwise it returns None.
+    """
+    frame, _, time_recieved = ip_utils.recv_timestamped(sock, 1024)
+    # the ARP packet follows the 14 byte ethernet header
+    arp = headers.arp(frame[14:42])
+    if arp.operation != 2 or arp.target_ip != local_ip:
+        return None
+    if outstanding.get(arp.sender_ip, 0) > 0:
+        return arp.sender_ip, time_recieved, arp
+    else:
+        return None
+
+
+def probe_key(address: int, port: int) -> int:
+    """
+    Combines a long form IPv4 or IPv6 address and a port into the
+    single int the port scans use to keep track of each probe.
+    """
+    return (address << 16) | port
+
+
+def syn(
+        sock: socket.socket,
+        port: int,
+        secret: bytes,
+        outstanding: Dict[int, int]
+) -> Optional[Tuple[int, float, str]]:
+    """
+    Reads a single packet from the readable raw TCP socket sock.
+    If the packet was sent to port in answer to one of the SYN probes
+    sent with cookies keyed by secret (see ip_utils.syn_cookie) it
+    returns the probe's key (see probe_key), the time the packet was
+    recieved and the state of the probed port,
+    OPEN for a SYN/ACK and CLOSED for a RST,
+    otherwise it returns None.
+    The cookie is all it takes to tell that the packet answers one of
+    our probes so outstanding isn't looked at, which lets the scan
+    keep no record of the probes it has sent.
+    """
+    packet, address, time_recieved, offset = _read(sock)
+    tcp = headers.tcp(packet[offset:offset + 20])
+    # the raw socket sees all TCP traffic to this machine
+    # so only look at packets sent back to our port
+    if tcp.destination != port:
+        return None
+    # both a SYN/ACK and a RST to a SYN acknowledge its cookie plus 1
+    cookie = ip_utils.syn_cookie(secret, address, tcp.source, port)
+    if tcp.ack != (cookie + 1) & 0xFFFFFFFF:
+        return None
+    key = probe_key(address, tcp.source)
+    # SYN/ACK = 18, RST = 4
+    if tcp.flags & 0x12 == 0x12:
+        return key, time_recieved, "OPEN"
+    elif tcp.flags & 4:
+        return key, time_recieved, "CLOSED"
+    else:
+        return None
+
+
+def udp(
+        sock: socket.socket,
+        port: int,
+        outstanding: Dict[int, int]
+) -> Optional[Tuple[int, float, str]]:
+    """
+    Reads a single packet from the readable raw UDP socket sock.
+    Any UDP reply to port from one of the probes in outstanding
+    (see probe_key) means the probed port is OPEN, so it returns the
+    probe's key, the time the packet was recieved and "OPEN",
+    otherwise it returns None.
+    """
+    packet, address, time_recieved, offset = _read(sock)
+    udp = headers.udp(packet[offset:offset + 8])
+    if udp.dest != port:
+        return None
+    key = probe_key(address, udp.src)
+    if key not in outstanding:
+        return None
+    return key, time_recieved, "OPEN"
+
+
+def icmp_unreachable(
+        sock: socket.socket,
+        port: int,
+        outstanding: Dict[int, int],
+        tags: Optional[Sequence[int]] = None
+) -> Optional[Tuple[int, float, str]]:
+    """
+    Reads a single packet from the readable ICMP or ICMPv6 socket sock.
+    If it is an ICMP DESTINATION UNREACHABLE about one of the UDP
+    probes sent from port in outstanding (see probe_key), it returns
+    the probe's key, the time the packet was recieved and the state
+    of the probed port worked out from the ICMP code:
+    3 -> CLOSED
+    0|1|2|9|10|13 -> FILTERED
+    or for ICMPv6:
+    4 -> CLOSED
+    0|1|2|3|5|6 -> FILTERED
+    otherwise it returns None.
+    If the IPv4 probes were tagged, tags maps the IP identification
+    each one was sent with to its key, so the IP header the error
+    quotes picks out the probe straight away, and errors quoting any
+    other identification for that address and port aren't about one
+    of our probes.
+    """
+    packet, _, time_recieved, offset = _read(sock)
+    # the error carries the IP and UDP headers of the probe it is about,
+    # which end at byte 56 for both versions
+    if len(packet) < 56:
+        return None
+    if offset == 0:
+        icmp6 = headers.icmp6(packet[:8])
+        if icmp6.type != 1 or icmp6.code not in {0, 1, 2, 3, 4, 5, 6}:
+            return None
+        code = icmp6.code
+        probe_ip6 = headers.ip6(packet[8:48])
+        protocol, destination = probe_ip6.next_header, probe_ip6.destination
+        closed = 4
+    else:
+        icmp = headers.icmp(packet[20:28])
+        if icmp.type != 3 or icmp.code not in {0, 1, 2, 3, 9, 10, 13}:
+            return None
+        code = icmp.code
+        probe_ip = headers.ip(packet[28:48])
+        protocol, destination = probe_ip.protocol, probe_ip.destination
+        closed = 3
+    probe_udp = headers.udp(packet[48:56])
+    if protocol != 17 or probe_udp.src != port:
+        return None
+    if tags is not None and offset:
+        key = tags[probe_ip.id]
+        if key != probe_key(destination, probe_udp.dest):
+            return None
+    else:
+        key = probe_key(destination, probe_udp.dest)
+    if key not in outstanding:
+        return None
+    if code == closed:
+        return key, time_recieved, "CLOSED"
+    else:
+        return key, time_recieved, "FILTERED"
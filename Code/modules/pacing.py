@@ -0,0 +1,92 @@
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    A token bucket for pacing the rate at which packets are sent.
+    Tokens are added at rate tokens per second up to a maximum of
+    burst tokens and each packet sent uses up one token.
+    A rate of None means the sender is never held back, the bucket
+    then only keeps count of what was sent.
+    """
+    def __init__(self, rate: Optional[float] = None, burst: int = 1):
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Invalid packet rate: [{rate}]")
+        if burst < 1:
+            raise ValueError(f"Invalid burst size: [{burst}]")
+        self.rate: Optional[float] = rate
+        self.burst: int = burst
+        # start with a full bucket so the first burst goes out immediately
+        self.tokens: float = burst
+        self.last_refill: float = time.monotonic()
+        # used for working out the rate that was actually achieved,
+        # sending_time is the time spent between packets while sending
+        self.sent: int = 0
+        self.last_send: float = 0
+        self.sending_time: float = 0
+        self.gaps: int = 0
+        self.paused: bool = True
+
+    def __repr__(self) -> str:
+        return ", ".join((
+            f"TokenBucket(rate={self.rate}",
+            f"burst={self.burst}",
+            f"sent={self.sent})"
+        ))
+
+    def _refill(self, now: float) -> None:
+        """
+        Adds on the tokens earned since the bucket was last refilled.
+        """
+        if self.rate is not None:
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.last_refill) * self.rate
+            )
+        self.last_refill = now
+
+    def delay(self, queued: int = 0) -> float:
+        """
+        Returns the number of seconds until a packet can be sent,
+        0 means one can be sent right now. queued packets which are
+        waiting to be sent, and to be consumed, are counted as sent.
+        """
+        if self.rate is None:
+            return 0
+        self._refill(time.monotonic())
+        if self.tokens >= queued + 1:
+            return 0
+        else:
+            return (queued + 1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        """
+        Records that a packet has been sent and takes a token from the bucket.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if not self.paused:
+            self.sending_time += now - self.last_send
+            self.gaps += 1
+        self.paused = False
+        self.last_send = now
+        self.sent += 1
+
+    def pause(self) -> None:
+        """
+        Records that the sender has run out of packets for now, so
+        the time until the next one isn't counted in the achieved rate.
+        """
+        self.paused = True
+
+    def achieved_rate(self) -> float:
+        """
+        Returns the average number of packets sent per second
+        while there were packets to send,
+        or 0 if there is not enough to work it out from.
+        """
+        if self.gaps == 0 or self.sending_time <= 0:
+            return float(0)
+        return self.gaps / self.sending_time
@@ -0,0 +1,131 @@
+import hashlib
+from typing import TYPE_CHECKING, Iterator, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from modules.targets import TargetList
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class Permutation:
+    """
+    A seedable pseudo-random permutation of range(size) which,
+    like range, doesn't store its values so uses O(1) memory no matter
+    how large size is and can be indexed as well as iterated over.
+    Indices are shuffled with a balanced Feistel network over the
+    smallest even number of bits that can hold size - 1, and any
+    result which lands outside range(size) is fed back through the
+    network until one lands inside (cycle walking), which keeps
+    it a permutation of exactly range(size).
+    The same size and seed always give the same order.
+    """
+    def __init__(self, size: int, seed: int = 0, rounds: int = 4):
+        if size < 0:
+            raise ValueError(f"Invalid permutation size: [{size}]")
+        if rounds < 1:
+            raise ValueError(f"Invalid number of rounds: [{rounds}]")
+        self.size: int = size
+        self.seed: int = seed
+        bits = max(2, (size - 1).bit_length())
+        self.half_bits: int = (bits + 1) // 2
+        self.half_mask: int = (1 << self.half_bits) - 1
+        # each round gets its own key derived from the seed
+        self.keys: Tuple[int, ...] = tuple(
+            int.from_bytes(
+                hashlib.blake2b(
+                    f"{seed}:{round_number}".encode(),
+                    digest_size=8
+                ).digest(),
+                "big"
+            )
+            for round_number in range(rounds)
+        )
+
+    def __repr__(self) -> str:
+        return f"Permutation(size={self.size}, seed={self.seed})"
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _mix(self, half: int, key: int) -> int:
+        """
+        The Feistel round function, a keyed 64 bit integer hash of half
+        cut down to half_bits, it doesn't need to be invertible.
+        """
+        value = ((half ^ key) * 0x9E3779B97F4A7C15) & MASK64
+        value ^= value >> 32
+        value = (value * 0xD6E8FEB86659FD93) & MASK64
+        value ^= value >> 32
+        return value & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        """
+        Passes value once through the Feistel network.
+        """
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ self._mix(right, key)
+        return (left << self.half_bits) | right
+
+    def _decrypt(self, value: int) -> int:
+        """
+        Undoes one pass of value through the Feistel network.
+        """
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in reversed(self.keys):
+            left, right = right ^ self._mix(left, key), left
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("Permutation index out of range")
+        # the network's domain is less than four times size
+        # so this takes fewer than four passes on average
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def index(self, value: int) -> int:
+        """
+        Returns the position of value in the permutation, the inverse
+        of indexing, by walking the cycle backwards.
+        """
+        if not 0 <= value < self.size:
+            raise ValueError(f"{value} is not in Permutation")
+        index = self._decrypt(value)
+        while index >= self.size:
+            index = self._decrypt(index)
+        return index
+
+    def __iter__(self) -> Iterator[int]:
+        for index in range(self.size):
+            yield self[index]
+
+
+def shuffled_probes(
+        addresses: Union[Sequence[int], "TargetList"],
+        ports: Sequence[int],
+        seed: int = 0,
+        shard: int = 1,
+        shards: int = 1
+) -> Iterator[Tuple[int, int]]:
+    """
+    Generates every (address, port) pair of the long form addresses
+    and ports in a pseudo-random order decided by seed, so that
+    consecutive probes are spread over the whole target network rather
+    than hitting every port of one host back to back. Only addresses
+    and ports have to be held in memory, never the pairs.
+    If shards is more than 1 only every shards'th pair of the order is
+    generated starting from number shard (counting from 1), so machines
+    running with the same seed and each shard between 1 and shards
+    split the pairs evenly between them, each one exactly once.
+    """
+    if not 1 <= shard <= shards:
+        raise ValueError(f"Invalid shard: [{shard}/{shards}]")
+    permutation = Permutation(len(addresses) * len(ports), seed)
+    for index in range(shard - 1, len(permutation), shards):
+        address, port = divmod(permutation[index], len(ports))
+        yield addresses[address], ports[port]
@@ -1,239 +1,961 @@
+import errno
+import selectors
 import socket
 import time
+from modules import batch
 from modules import directives
 from modules import headers
 from modules import ip_utils
 from modules import listeners
-from collections import defaultdict
+from modules import pacing
+from modules import sender
+from modules import stats
 from contextlib import closing
-from itertools import repeat
-from multiprocessing import Pool
-from os import getpid
-from typing import Set, Tuple
+from functools import lru_cache, partial
+from itertools import chain, cycle, islice
+from os import getpid, urandom
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 
-def ping(addresses: Set[str]) -> Set[Tuple[str, float, headers.ip]]:
+# the host discovery techniques and the ports the TCP ones probe
+DISCOVERY_TECHNIQUES = ("echo", "syn", "ack", "timestamp")
+SYN_DISCOVERY_PORT = 443
+ACK_DISCOVERY_PORT = 80
+# how many of the latest echos to each address latency remembers
+# the replies to, replies to older ones are too late to count
+REPLY_WINDOW = 64
+
+# reads one packet from a readable socket and returns the address,
+# time recieved (see ip_utils.recv_timestamped) and header of the
+# packet if it is a positive answer from an address in the table of
+# outstanding addresses.
+RECIEVER = Callable[[Dict[int, int]], Optional[Tuple[int, float, Any]]]
+
+
+@lru_cache(maxsize=1024)
+def _source_address(address: int, family: int = socket.AF_INET) -> int:
+    """
+    Returns the long form local address that packets to the long form
+    address of the given family are sent from, which the TCP checksum
+    and ARP need.
+    Most scans only ever send from one or two so they are cached.
+    Each lookup is a system call so the scans use _sources instead.
+    """
+    return ip_utils.ip_to_long(
+        ip_utils.get_local_ip(ip_utils.long_to_ip(address, family), family)
+    )
+
+
+def _sources(family: int = socket.AF_INET) -> Callable[[int], int]:
+    """
+    Returns a function giving the long form local address packets to a
+    long form address of the given family are sent from, like
+    _source_address. The routing table is read once up front and the
+    local address is only looked up for the first address sent to
+    over each route, so the send loops don't make a system call for
+    every address. Addresses without a route, and our own and loopback
+    addresses which are routed by the local table instead, are looked
+    up on their own.
+    """
+    routes = ip_utils.get_routes(family)
+    # the local address of each route, by its position in routes
+    sources: Dict[int, int] = dict()
+    if family == socket.AF_INET:
+        local = ip_utils.get_local_addresses()
+        loopback, loopback_mask = 0x7F000000, 0xFF000000
+    else:
+        local = set()
+        loopback, loopback_mask = 1, (1 << 128) - 1
+
+    def source(address: int) -> int:
+        if address in local or address & loopback_mask == loopback:
+            return _source_address(address, family)
+        for i, (_, destination, mask, _) in enumerate(routes):
+            if address & mask == destination:
+                if i not in sources:
+                    sources[i] = _source_address(address, family)
+                return sources[i]
+        return _source_address(address, family)
+
+    return source
+
+
+def _factories(
+        src_port: int,
+        family: int,
+        secret: Optional[bytes] = None,
+        ID: int = 0
+) -> Callable[[int], ip_utils.PacketFactory]:
+    """
+    Returns a function giving the ip_utils.PacketFactory to build the
+    packets sent from src_port to a long form address of the given
+    family, there is one factory for each local address sent from.
+    Their SYNs carry cookies keyed with secret if it is given and
+    their ICMP messages have the identifier ID.
+    """
+    factories: Dict[int, ip_utils.PacketFactory] = dict()
+    source_address = _sources(family)
+
+    def factory(address: int) -> ip_utils.PacketFactory:
+        source = source_address(address)
+        if source not in factories:
+            factories[source] = ip_utils.PacketFactory(
+                source,
+                src_port,
+                family,
+                ID,
+                secret
+            )
+        return factories[source]
+
+    return factory
+
+
+def _icmp_protocol(family: int) -> int:
+    """
+    Returns the protocol ICMP raw sockets of the given family are
+    opened with, ICMPv6 for IPv6.
+    """
+    if family == socket.AF_INET6:
+        return socket.IPPROTO_ICMPV6
+    return socket.IPPROTO_ICMP
+
+
+def _sweep(
+        addresses: Iterable[int],
+        probes_per_round: int,
+        send: Callable[[int, int, int], None],
+        recievers: Dict[socket.socket, RECIEVER],
+        timeout: float,
+        pacer: Optional[pacing.TokenBucket],
+        max_retries: int,
+        senders: Iterable[sender.BatchSender] = (),
+        stateless: bool = False
+) -> Iterator[Tuple[int, float, Any]]:
+    """
+    The event loop shared by the host discovery and port scans.
+    addresses are long form, or probe keys for the port scans
+    (see listeners.probe_key), and are only read as they are needed.
+    Every round send is called with (address, probe number, sequence)
+    probes_per_round times for each address which is yet to reply,
+    and whenever one of the sockets in recievers is readable its
+    function is called and any address it returns is yielded along with
+    the round trip time and header as soon as it arrives.
+    The loop stops once every address has replied or nothing has
+    happened for timeout seconds. Addresses which stay silent are
+    probed up to max_retries more times, each with the next sequence
+    number and twice the previous timeout.
+    If pacer is given packets are only sent as fast as it allows
+    and it is left holding the count of packets sent.
+    send may queue its packets on any of senders, which are flushed
+    whenever the loop would otherwise wait, or once as many packets
+    are queued as the smallest of their batch sizes and the pacer's
+    burst. The probes' send times are taken, and the pacer charged for
+    them, when they are flushed rather than queued.
+    If stateless is True nothing is kept about the addresses, so
+    memory use doesn't grow with the scan. Every address is probed
+    once with the sequence number 1, every reply the recievers return
+    is yielded with a round trip time of 0, even if the address has
+    already replied, and the loop stops once nothing has happened for
+    timeout seconds after the last probe is sent. The recievers are
+    passed an empty outstanding so they must recognise replies to
+    our probes without it.
+    """
+    if pacer is None:
+        pacer = pacing.TokenBucket()
+    senders = list(senders)
+    # how many packets can be queued before they have to be sent,
+    # without senders every packet is sent by send itself
+    batch_limit = min((queue.batch_size for queue in senders), default=1)
+    if pacer.rate is not None:
+        batch_limit = min(batch_limit, pacer.burst)
+    # the number of packets queued and the addresses whose first
+    # probe of a round is amongst them
+    queued = 0
+    starting: List[int] = []
+
+    def flush(sent: Optional[float] = None) -> None:
+        """
+        Sends every packet queued on senders, then records when the
+        rounds queued for each address started and charges the pacer.
+        sent is when the packets were sent if send sent them itself.
+        """
+        nonlocal queued
+        # the packets leave during the flush so the time just before it
+        # is as close as we can get, after it replies could be earlier
+        now = time.monotonic() if sent is None else sent
+        try:
+            for queue in senders:
+                queue.flush()
+        except PermissionError:
+            ip_utils.eprint("raw sockets require root priveleges, exiting")
+            exit()
+        for address in starting:
+            # it may have replied to an earlier round in the meantime
+            if address in outstanding:
+                sent_at[address] = now
+        starting.clear()
+        for _ in range(queued):
+            pacer.consume()
+        queued = 0
+
+    # maps every address which has been probed but is yet to reply
+    # to the sequence number of the last round of probes sent to it.
+    outstanding: Dict[int, int] = dict()
+    # the time the last round of probes was sent to each address
+    sent_at: Dict[int, float] = dict()
+
+    def first_probes() -> Iterator[Tuple[int, int]]:
+        """
+        Generates every (address, probe number) pair for the first
+        round of probes, adding each address to outstanding as it goes.
+        An address which is still outstanding when it is repeated is
+        skipped so its sequence numbers carry on from where they were.
+        """
+        for address in addresses:
+            if not stateless:
+                if address in outstanding:
+                    continue
+                outstanding[address] = 0
+            for probe in range(probes_per_round):
+                if stateless or address in outstanding:
+                    yield address, probe
+
+    def probes() -> Iterator[Tuple[int, int]]:
+        """
+        Generates every (address, probe number) pair for a round
+        of retries, skipping addresses as soon as they reply.
+        """
+        for address in list(outstanding):
+            for probe in range(probes_per_round):
+                if address in outstanding:
+                    yield address, probe
+
+    to_send = first_probes()
+    retries = 0
+    with selectors.DefaultSelector() as selector:
+        # while there are packets left to send we want to know
+        # when a socket is writable as well as readable,
+        # raw sockets drop rather than block so the first
+        # socket being writable is good enough for all of them.
+        # Each socket's reciever is carried as its key's data.
+        clock, *others = recievers
+        clock_reciever = recievers[clock]
+        selector.register(
+            clock,
+            selectors.EVENT_READ | selectors.EVENT_WRITE,
+            clock_reciever
+        )
+        for sock in others:
+            selector.register(sock, selectors.EVENT_READ, recievers[sock])
+        # have the kernel timestamp replies as they arrive so the
+        # round trip times don't include time spent in this loop
+        for sock in recievers:
+            ip_utils.enable_timestamps(sock)
+        # the recievers' times are wall clock times
+        offset = ip_utils.wall_clock_offset()
+        sending = True
+        writable = True
+        last_event = time.monotonic()
+        while outstanding or sending or stateless:
+            time_remaining = last_event + timeout - time.monotonic()
+            if not sending and time_remaining <= 0:
+                if retries >= max_retries or stateless:
+                    # nothing has replied in the quiet period so give up
+                    break
+                # resend to only the addresses which are yet to reply
+                # and back off by waiting twice as long for them
+                retries += 1
+                timeout *= 2
+                to_send = probes()
+                sending = writable = True
+                selector.modify(
+                    clock,
+                    selectors.EVENT_READ | selectors.EVENT_WRITE,
+                    clock_reciever
+                )
+            if sending:
+                # only wait to write when the pacer will let us send
+                delay = pacer.delay(queued)
+                if writable != (delay == 0):
+                    writable = delay == 0
+                    selector.modify(
+                        clock,
+                        selectors.EVENT_READ | (
+                            selectors.EVENT_WRITE if writable else 0
+                        ),
+                        clock_reciever
+                    )
+                if not writable:
+                    flush()
+                events = selector.select(None if writable else delay)
+            else:
+                events = selector.select(time_remaining)
+            for key, mask in events:
+                if mask & selectors.EVENT_READ:
+                    reply = key.data(outstanding)
+                    if reply is not None and stateless:
+                        last_event = time.monotonic()
+                        yield reply[0], 0.0, reply[2]
+                    # only the first positive answer from a host counts,
+                    # and only once its probes have gone out, an answer
+                    # before then is to an earlier probe of a repeated
+                    # address which has already been counted
+                    elif reply is not None and reply[0] in sent_at:
+                        address, time_recieved, header = reply
+                        del outstanding[address]
+                        last_event = time.monotonic()
+                        # the wall clock may have been stepped since the
+                        # offset was taken, but never back past the probe
+                        rtt = time_recieved - offset - sent_at.pop(address)
+                        yield address, max(rtt, 0.0), header
+                if mask & selectors.EVENT_WRITE:
+                    try:
+                        address, probe = next(to_send)
+                    except StopIteration:
+                        # everything has been sent so start the quiet period
+                        flush()
+                        sending = False
+                        pacer.pause()
+                        last_event = time.monotonic()
+                        selector.modify(
+                            clock,
+                            selectors.EVENT_READ,
+                            clock_reciever
+                        )
+                        continue
+                    if stateless:
+                        sequence = 1
+                    else:
+                        if probe == 0:
+                            # first probe of a new round for this address
+                            outstanding[address] += 1
+                            starting.append(address)
+                        sequence = outstanding[address]
+                    sent = time.monotonic()
+                    try:
+                        send(address, probe, sequence)
+                    except PermissionError:
+                        ip_utils.eprint(
+                            "raw sockets require root priveleges, exiting"
+                        )
+                        exit()
+                    queued += 1
+                    if queued >= batch_limit:
+                        flush(None if senders else sent)
+
+
+def discover(
+        addresses: Iterable[int],
+        timeout: float = 1,
+        pacer: Optional[pacing.TokenBucket] = None,
+        max_retries: int = 2,
+        techniques: Tuple[str, ...] = DISCOVERY_TECHNIQUES,
+        family: int = socket.AF_INET,
+        send_stats: Optional[sender.SendStats] = None
+) -> Iterator[Tuple[int, float, Optional[headers.ip]]]:
     """
-    Send an ICMP ECHO REQUEST to each address
-    in the set addresses. Then return a set which
-    contains all the addresses which replied and
-    which have the correct ID.
+    Probes each address in addresses with every one of techniques:
+    echo -> ICMP ECHO REQUEST
+    syn -> TCP SYN to port 443
+    ack -> TCP ACK to port 80
+    timestamp -> ICMP TIMESTAMP REQUEST
+    and yields each address as soon as the first positive answer from
+    any technique arrives, along with the round trip time and IP header.
+    All of the probes are sent and recieved over one ICMP and one TCP raw
+    socket in a single event loop, so discovery only ever waits one round
+    no matter how many techniques are used, see _sweep for how timeout,
+    pacer and max_retries are used.
+    If family is socket.AF_INET6 the addresses are IPv6, the echos are
+    ICMPv6, no IP header is yielded and timestamp is skipped since
+    ICMPv6 has no timestamp messages.
+    The probes are sent in batches, see sender.BatchSender, which count
+    what they send in send_stats if it is given.
     """
+    for technique in techniques:
+        if technique not in DISCOVERY_TECHNIQUES:
+            raise ValueError(f"Unknown discovery technique: [{technique}]")
+    if family == socket.AF_INET6:
+        techniques = tuple(t for t in techniques if t != "timestamp")
+        if not techniques:
+            return
     with closing(
             socket.socket(
-                socket.AF_INET,
+                family,
                 socket.SOCK_RAW,
-                socket.IPPROTO_ICMP
+                _icmp_protocol(family)
             )
-    ) as ping_sock:
-        # get the local ip address
-        addresses = {
-            ip
-            for ip in addresses
-            if (
-                not ip.endswith(".0")
-                and not ip.endswith(".255")
+    ) as ping_sock, closing(
+            socket.socket(
+                family,
+                socket.SOCK_RAW,
+                socket.IPPROTO_TCP
             )
-        }
-
-        # initialise a process pool
-        p = Pool(1)
+    ) as tcp_sock:
         # get the local process id for use in creating packets.
         ID = getpid() & 0xFFFF
-        # run the listeners.ping function asynchronously
-        replied = p.apply_async(listeners.ping, (ID, 5))
-        time.sleep(0.01)
-        for address in zip(addresses, repeat(1)):
-            try:
-                packet = ip_utils.make_icmp_packet(ID)
-                ping_sock.sendto(packet, address)
-            except PermissionError:
-                ip_utils.eprint("raw sockets require root priveleges, exiting")
-                exit()
-        p.close()
-        p.join()
-        # close and join the process pool to so that all the values
-        # have been returned and the pool closed
-        return replied.get()
-
-
-def connect(address: str, ports: Set[int]) -> Set[int]:
-    """
-    This is the most basic kind of scan
-    it simply connects to every specififed port
-    and identifies whether they are open.
-    """
-    import socket
-    from contextlib import closing
-    open_ports: Set[int] = set()
-    for port in ports:
-        # loop through each port in the list of ports to scan
-        try:
-            with closing(
-                    socket.socket(
-                        socket.AF_INET,
-                        socket.SOCK_STREAM
-                    )
-            ) as s:
-                # open an IPV4 TCP socket
-                s.connect((address, port))
-                # attempt to connect the newly created socket to the target
-                # address and port
-                open_ports.add(port)
-                # if the connection was successful then add the port to the
-                # list of open ports
-        except (ConnectionRefusedError, OSError) as e:
-            pass
-    return open_ports
-
-
-def tcp(dest_ip: str, portlist: Set[int]) -> listeners.PORTS:
-    src_port = ip_utils.get_free_port()
-    # request a local port to connect from
-    if "127.0.0.1" == dest_ip:
-        local_ip = "127.0.0.1"
-    else:
-        local_ip = ip_utils.get_local_ip()
-    p = Pool(1)
-    listener = p.apply_async(listeners.tcp, ((local_ip, src_port), 5))
-    time.sleep(0.01)
-    # start the TCP ACK listener in the background
-    for port in portlist:
-        # flag = 2 for syn scan
-        packet = ip_utils.make_tcp_packet(
-            src_port,
-            port,
-            local_ip,
-            dest_ip,
-            2
-        )
-        with closing(
-                socket.socket(
-                    socket.AF_INET,
-                    socket.SOCK_RAW,
-                    socket.IPPROTO_TCP
+        # the port the TCP probes are sent from
+        src_port = ip_utils.get_free_port()
+        # the builders for the probes to each address
+        factory = _factories(src_port, family, ID=ID)
+        ping_sender = sender.BatchSender(ping_sock, family, stats=send_stats)
+        tcp_sender = sender.BatchSender(tcp_sock, family, stats=send_stats)
+
+        def send(address: int, probe: int, sequence: int) -> None:
+            """
+            Sends the probe for the technique numbered probe to address.
+            """
+            technique = techniques[probe]
+            build = factory(address)
+            if technique == "echo":
+                ping_sender.pack(
+                    address,
+                    build.echo_into,
+                    sequence,
+                    time.time()
+                )
+            elif technique == "timestamp":
+                ping_sender.pack(
+                    address,
+                    build.timestamp_into,
+                    sequence,
+                    time.time()
+                )
+            elif technique == "syn":
+                tcp_sender.pack(
+                    address,
+                    build.syn_into,
+                    address,
+                    SYN_DISCOVERY_PORT
+                )
+            else:
+                tcp_sender.pack(
+                    address,
+                    build.ack_into,
+                    address,
+                    ACK_DISCOVERY_PORT
                 )
-        ) as s:
-            s.sendto(packet, (dest_ip, port))
-            # send the packet to its destination
-    p.close()
-    p.join()
-    ports = listener.get()
-    ports["FILTERED"] = portlist - ports["OPEN"] - ports["CLOSED"]
-    if local_ip == "127.0.0.1":
-        ports["OPEN"] -= set([src_port])
 
-    return ports
+        recievers: Dict[socket.socket, RECIEVER] = {
+            ping_sock: partial(listeners.ping, ping_sock, ID)
+        }
+        if "syn" in techniques or "ack" in techniques:
+            recievers[tcp_sock] = partial(
+                listeners.tcp_ping,
+                tcp_sock,
+                src_port
+            )
+        yield from _sweep(
+            addresses,
+            len(techniques),
+            send,
+            recievers,
+            timeout,
+            pacer,
+            max_retries,
+            (ping_sender, tcp_sender)
+        )
 
 
-def udp(
-        dest_ip: str,
-        ports_to_scan: Set[int]
-) -> listeners.PORTS:
-    """
-    Takes in a destination IP address in either dot or long form and
-    a list of ports to scan. Sends UDP packets to each port specified
-    in portlist and uses the listeners to mark them as open, open|filtered,
-    filtered, closed they are marked open|filtered if no response is
-    recieved at all.
-    """
-
-    local_port = ip_utils.get_free_port()
-    # get port number
-    ports: listeners.PORTS = defaultdict(set)
-    ports["REMAINING"] = ports_to_scan
-    p = Pool(1)
-    udp_listen = p.apply_async(listeners.udp, (dest_ip, 4))
-    time.sleep(0.01)
-    # start the UDP listener
+def ping(
+        addresses: Iterable[int],
+        timeout: float = 1,
+        pacer: Optional[pacing.TokenBucket] = None,
+        max_retries: int = 2,
+        family: int = socket.AF_INET,
+        send_stats: Optional[sender.SendStats] = None
+) -> Iterator[Tuple[int, float, Optional[headers.ip]]]:
+    """
+    Send an ICMP ECHO REQUEST to each address in addresses
+    and yield every address which replies with the correct ID
+    as soon as its reply arrives, see discover.
+    """
+    return discover(
+        addresses,
+        timeout,
+        pacer,
+        max_retries,
+        ("echo",),
+        family,
+        send_stats
+    )
+
+
+def latency(
+        addresses: Iterable[int],
+        count: int,
+        interval: float = 1,
+        timeout: float = 1,
+        pacer: Optional[pacing.TokenBucket] = None
+) -> Iterator[Tuple[int, stats.RunningStats]]:
+    """
+    Sends count ICMP ECHO REQUESTs to every address in addresses, one
+    round of echos to all of them every interval seconds, and keeps
+    running statistics of each address's round trip times.
+    The echos to every address are interleaved in a single event loop
+    which stops timeout seconds after the last echo is sent.
+    Yields each address along with the statistics of the echos it
+    replied to, the loss is 1 - stats.count / count.
+    If pacer is given packets are only sent as fast as it allows
+    and it is left holding the count of packets sent.
+    """
+    # the sequence numbers are 16 bits and start from 1
+    if not 1 <= count <= 0xFFFF:
+        raise ValueError(f"Invalid number of echos: [{count}]")
+    if pacer is None:
+        pacer = pacing.TokenBucket()
     with closing(
             socket.socket(
                 socket.AF_INET,
                 socket.SOCK_RAW,
-                socket.IPPROTO_UDP
+                socket.IPPROTO_ICMP
             )
-    ) as s:
-        for _ in range(2):
-            # repeat 3 times because UDP scanning comes
-            # with a high chance of packet loss
-            for dest_port in ports["REMAINING"]:
-                try:
-                    packet = ip_utils.make_udp_packet(
-                        local_port,
-                        dest_port
+    ) as ping_sock, selectors.DefaultSelector() as selector:
+        ip_utils.enable_timestamps(ping_sock)
+        # the echos are stamped with the wall clock time, as the replies
+        # are, which is worked out from the monotonic clock
+        offset = ip_utils.wall_clock_offset()
+        results = {ip: stats.RunningStats() for ip in addresses}
+        # the sequence number of the latest echo sent to each address
+        sent = {ip: 0 for ip in results}
+        # the newest sequence number each address has replied to and a
+        # bit for each of the REPLY_WINDOW up to it that has been
+        # replied to, so duplicate replies don't get counted twice
+        replied = {ip: (0, 0) for ip in results}
+        ID = getpid() & 0xFFFF
+        echo = ip_utils.EchoTemplate(ID)
+
+        sequence = 0
+        to_send: Iterator[int] = iter(())
+        sending = False
+        next_round = last_sent = time.monotonic()
+        selector.register(ping_sock, selectors.EVENT_READ)
+        writable = False
+        while results:
+            now = time.monotonic()
+            wait: Optional[float]
+            if not sending:
+                if sequence == count:
+                    # wait out the timeout for the final replies
+                    wait = last_sent + timeout - now
+                    if wait <= 0:
+                        break
+                elif now >= next_round:
+                    # start the next round of echos
+                    sequence += 1
+                    next_round = now + interval
+                    to_send = iter(list(results))
+                    sending = True
+                else:
+                    wait = next_round - now
+            if sending:
+                # only wait to write when the pacer will let us send
+                wait = pacer.delay()
+            if writable != (sending and wait == 0):
+                writable = sending and wait == 0
+                selector.modify(
+                    ping_sock,
+                    selectors.EVENT_READ | (
+                        selectors.EVENT_WRITE if writable else 0
                     )
-                    # create the UDP packet to send
-                    s.sendto(packet, (dest_ip, dest_port))
-                    # send the packet to the currently scanning address
-                except socket.error:
-                    packet_bytes = " ".join(map(hex, packet))
-                    print(
-                        "The socket modules sendto method with the following",
-                        "argument resulting in a socket error.",
-                        f"\npacket: [{packet_bytes}]\n",
-                        "address: [{dest_ip, dest_port}])"
+                )
+            for _, mask in selector.select(None if writable else wait):
+                if mask & selectors.EVENT_READ:
+                    reply = listeners.echo(ping_sock, ID, sent)
+                    if reply is not None:
+                        address, reply_sequence, rtt = reply
+                        newest, window = replied[address]
+                        if reply_sequence > newest:
+                            # slide the window up to the new sequence
+                            window = (
+                                window << (reply_sequence - newest) | 1
+                            ) & ((1 << REPLY_WINDOW) - 1)
+                            replied[address] = reply_sequence, window
+                            results[address].add(rtt)
+                        elif newest - reply_sequence < REPLY_WINDOW:
+                            bit = 1 << (newest - reply_sequence)
+                            if not window & bit:
+                                replied[address] = newest, window | bit
+                                results[address].add(rtt)
+                if mask & selectors.EVENT_WRITE:
+                    try:
+                        address = next(to_send)
+                    except StopIteration:
+                        sending = False
+                        pacer.pause()
+                        last_sent = time.monotonic()
+                        continue
+                    sent[address] = sequence
+                    try:
+                        ping_sock.sendto(
+                            echo.packet(sequence, time.monotonic() + offset),
+                            (ip_utils.long_to_dot(address), 1)
+                        )
+                        pacer.consume()
+                    except PermissionError:
+                        ip_utils.eprint(
+                            "raw sockets require root priveleges, exiting"
+                        )
+                        exit()
+        yield from results.items()
+
+
+def arp(
+        addresses: Iterable[int],
+        interface: str,
+        timeout: float = 0.5,
+        pacer: Optional[pacing.TokenBucket] = None,
+        max_retries: int = 2
+) -> Iterator[Tuple[int, float, headers.arp]]:
+    """
+    Broadcasts an ARP REQUEST for each address in addresses out of
+    interface, which they must all be directly attached to, and yields
+    every address which replies along with the round trip time and the
+    ARP header holding its MAC address as soon as the reply arrives.
+    The requests are sent and the replies recieved on one packet socket
+    in a single event loop, see _sweep for how timeout, pacer and
+    max_retries are used.
+    """
+    ETH_P_ARP = 0x0806
+    with closing(
+            socket.socket(
+                socket.AF_PACKET,
+                socket.SOCK_RAW,
+                socket.htons(ETH_P_ARP)
+            )
+    ) as arp_sock:
+        arp_sock.bind((interface, ETH_P_ARP))
+        # the MAC address of the interface is the last
+        # part of the address the packet socket is bound to
+        src_mac = arp_sock.getsockname()[4]
+        # peek at the first address without losing it
+        to_resolve = iter(addresses)
+        first = next(to_resolve, None)
+        if first is None:
+            return
+        addresses = chain([first], to_resolve)
+        # every address is on the same link so the kernel sends
+        # to all of them from the same local address
+        local_ip = _source_address(first)
+
+        def send(address: int, probe: int, sequence: int) -> None:
+            """
+            Broadcasts the ARP REQUEST for address.
+            """
+            arp_sock.send(ip_utils.make_arp_packet(src_mac, local_ip, address))
+
+        yield from _sweep(
+            addresses,
+            1,
+            send,
+            {arp_sock: partial(listeners.arp, arp_sock, local_ip)},
+            timeout,
+            pacer,
+            max_retries
+        )
+
+
+def connect(
+        probes: Iterable[Tuple[int, int]],
+        timeout: float = 1,
+        max_connections: int = 256,
+        family: int = socket.AF_INET
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    This is the most basic kind of scan, it simply connects to every
+    (long form address, port) pair in probes and yields it along with
+    OPEN if the connection succeeds or CLOSED if it is refused, as soon
+    as it is known. Up to max_connections non blocking connections
+    are made at once in a single event loop and any that haven't
+    finished after timeout seconds are given up on as filtered.
+    The addresses are IPv6 if family is socket.AF_INET6.
+    """
+    to_connect = iter(probes)
+    # the probe each connecting socket is for and when it was started
+    connecting: Dict[socket.socket, Tuple[int, int, float]] = dict()
+    with selectors.DefaultSelector() as selector:
+        try:
+            sending = True
+            while sending or connecting:
+                while sending and len(connecting) < max_connections:
+                    try:
+                        address, port = next(to_connect)
+                    except StopIteration:
+                        sending = False
+                        break
+                    s = socket.socket(family, socket.SOCK_STREAM)
+                    s.setblocking(False)
+                    error = s.connect_ex(
+                        (ip_utils.long_to_ip(address, family), port)
                     )
+                    if error in {0, errno.EINPROGRESS, errno.EAGAIN}:
+                        connecting[s] = (address, port, time.monotonic())
+                        # a connect has finished once the socket is writable
+                        selector.register(s, selectors.EVENT_WRITE)
+                    else:
+                        s.close()
+                        if error == errno.ECONNREFUSED:
+                            yield address, port, "CLOSED"
+                if not connecting:
+                    continue
+                oldest = min(started for _, _, started in connecting.values())
+                events = selector.select(
+                    max(0, oldest + timeout - time.monotonic())
+                )
+                now = time.monotonic()
+                for key, _ in events:
+                    s = key.fileobj  # type: ignore
+                    address, port, _ = connecting.pop(s)
+                    selector.unregister(s)
+                    error = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    s.close()
+                    if error == 0:
+                        yield address, port, "OPEN"
+                    elif error == errno.ECONNREFUSED:
+                        yield address, port, "CLOSED"
+                # give up on the connections which have taken too long
+                for s, (address, port, started) in list(connecting.items()):
+                    if now - started >= timeout:
+                        del connecting[s]
+                        selector.unregister(s)
+                        s.close()
+        finally:
+            for s in connecting:
+                s.close()
 
-    p.close()
-    p.join()
 
-    ports["OPEN"].update(udp_listen.get())
-    # if we are on localhost remove the scanning port
-    if dest_ip == "127.0.0.1":
-        ports["OPEN"] -= set([local_port])
-    ports["REMAINING"] -= ports["OPEN"]
-    # only scan the ports which we know are not open
+def tcp(
+        probes: Iterable[Tuple[int, int]],
+        timeout: float = 1,
+        pacer: Optional[pacing.TokenBucket] = None,
+        max_retries: int = 1,
+        family: int = socket.AF_INET,
+        send_stats: Optional[sender.SendStats] = None,
+        stateless: bool = False
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    SYN scans every (long form address, port) pair in probes and yields
+    each one along with OPEN or CLOSED as soon as its SYN/ACK or RST
+    arrives. Pairs which are never answered are filtered.
+    The SYNs are sent from one raw socket in a single event loop in the
+    order they are generated, so probes from permutation.shuffled_probes
+    spread the load over every target, see _sweep for how timeout,
+    pacer and max_retries are used.
+    The addresses are IPv6 if family is socket.AF_INET6.
+    If NumPy is installed IPv4 SYNs are built in batches ahead of
+    being sent, see batch.syn_packets. They are sent in batches too,
+    counted in send_stats if it is given, see sender.BatchSender.
+    Each SYN's sequence number is a cookie keyed with a secret made for
+    the scan, see ip_utils.syn_cookie, so replies are told apart from
+    any other traffic to the port without looking anything up.
+    That lets the scan be stateless, see _sweep, in which case every
+    SYN is sent once, nothing is kept about them however many there
+    are and a pair can be yielded more than once if its answer is.
+    """
     with closing(
             socket.socket(
-                socket.AF_INET,
+                family,
                 socket.SOCK_RAW,
-                socket.IPPROTO_UDP
+                socket.IPPROTO_TCP
             )
-    ) as s:
-        for dest_port in ports["REMAINING"]:
-            try:
-                packet = ip_utils.make_udp_packet(
-                    local_port,
+    ) as tcp_sock:
+        # request a local port to send from
+        src_port = ip_utils.get_free_port()
+        secret = urandom(16)
+        # the SYNs built in the last batch which are yet to be sent, as
+        # views of the batch's buffer which is freed once they all are
+        ready: Dict[int, memoryview] = dict()
+        factory = _factories(src_port, family, secret)
+        syn_sender = sender.BatchSender(tcp_sock, family, stats=send_stats)
+
+        def batched(keys: Iterator[int]) -> Iterator[int]:
+            """
+            Passes the probe keys through, building the SYNs
+            for each batch of them before it is passed on.
+            """
+            while True:
+                keys_batch = list(islice(keys, batch.BATCH_SIZE))
+                if not keys_batch:
+                    return
+                addresses = [key >> 16 for key in keys_batch]
+                ports = [key & 0xFFFF for key in keys_batch]
+                packets = memoryview(batch.syn_packets(
+                    src_port,
+                    [factory(address).from_address for address in addresses],
+                    addresses,
+                    ports,
+                    [
+                        ip_utils.syn_cookie(secret, address, port, src_port)
+                        for address, port in zip(addresses, ports)
+                    ]
+                ))
+                for i, key in enumerate(keys_batch):
+                    ready[key] = packets[
+                        i * batch.SYN_SIZE:(i + 1) * batch.SYN_SIZE
+                    ]
+                yield from keys_batch
+
+        def send(key: int, probe: int, sequence: int) -> None:
+            """
+            Sends a SYN to the address and port of the probe key.
+            """
+            dest_ip = key >> 16
+            dest_port = key & 0xFFFF
+            # retries aren't batched so their SYNs are made again,
+            # straight into the sender's buffer
+            packet = ready.pop(key, None)
+            if packet is None:
+                syn_sender.pack(
+                    dest_ip,
+                    factory(dest_ip).syn_into,
+                    dest_ip,
                     dest_port
                 )
-                # make a new UDP packet
-                p = Pool(1)
-                icmp_listen = p.apply_async(
-                    listeners.icmp_unreachable,
-                    (dest_ip,),
-                )
-                # start the ICMP listener
-                time.sleep(0.01)
-                s.sendto(packet, (dest_ip, dest_port))
-                # send packet
-                p.close()
-                p.join()
-                icmp_code = icmp_listen.get()
-                # receive ICMP code from the ICMP listener
-                if icmp_code in {0, 1, 2, 9, 10, 13}:
-                    ports["FILTERED"].add(dest_port)
-                elif icmp_code == 3:
-                    ports["CLOSED"].add(dest_port)
-            except socket.error:
-                packet_bytes = " ".join(map("{:02x}".format, packet))
-                ip_utils.eprint(
-                    "The socket modules sendto method with the following",
-                    "argument resulting in a socket error.",
-                    f"\npacket: [{packet_bytes}]\n",
-                    "address: [{dest_ip, dest_port}])"
+            else:
+                syn_sender.send(packet, dest_ip)
+
+        keys: Iterator[int] = (
+            listeners.probe_key(address, port)
+            for address, port in probes
+        )
+        if family == socket.AF_INET and batch.numpy is not None:
+            keys = batched(keys)
+        for key, _, state in _sweep(
+                keys,
+                1,
+                send,
+                {
+                    tcp_sock: partial(
+                        listeners.syn,
+                        tcp_sock,
+                        src_port,
+                        secret
+                    )
+                },
+                timeout,
+                pacer,
+                max_retries,
+                (syn_sender,),
+                stateless
+        ):
+            yield key >> 16, key & 0xFFFF, state
+
+
+def udp(
+        probes: Iterable[Tuple[int, int]],
+        timeout: float = 1,
+        pacer: Optional[pacing.TokenBucket] = None,
+        max_retries: int = 1,
+        family: int = socket.AF_INET,
+        send_stats: Optional[sender.SendStats] = None,
+        tag_probes: bool = True
+) -> Iterator[Tuple[int, int, str]]:
+    """
+    Sends a UDP packet to every (long form address, port) pair in probes
+    and yields each one as soon as its state is known:
+    OPEN -> a UDP reply
+    CLOSED -> an ICMP PORT UNREACHABLE
+    FILTERED -> any other ICMP DESTINATION UNREACHABLE
+    Pairs which are never answered are open|filtered.
+    UDP scanning comes with a high chance of packet loss so unanswered
+    probes are resent max_retries times, see _sweep for how this,
+    timeout and pacer are used.
+    The addresses are IPv6 if family is socket.AF_INET6, in which case
+    the errors are ICMPv6 DESTINATION UNREACHABLEs.
+    The probes are sent in batches, see sender.BatchSender, and any the
+    kernel refuses are counted as failed in send_stats if it is given.
+    If tag_probes is True IPv4 probes are sent with IP_HDRINCL set and
+    the IP header is written here, with an identification tag that is
+    unique among the last 65535 probes, so ICMP errors are matched to
+    the exact probe they quote, see listeners.icmp_unreachable.
+    Errors that come back after the tag has been reused are dropped
+    like a lost reply, so the probe is retried.
+    """
+    with closing(
+            socket.socket(
+                family,
+                socket.SOCK_RAW,
+                socket.IPPROTO_UDP
+            )
+    ) as udp_sock, closing(
+            socket.socket(
+                family,
+                socket.SOCK_RAW,
+                _icmp_protocol(family)
+            )
+    ) as icmp_sock:
+        local_port = ip_utils.get_free_port()
+        # maps each tag to the key of the latest probe sent with it
+        tags: Optional[List[int]] = None
+        if family == socket.AF_INET6:
+            # the UDP checksum is mandatory over IPv6 so have the kernel
+            # fill it in, it is 6 bytes into the header
+            udp_sock.setsockopt(
+                socket.IPPROTO_IPV6,
+                socket.IPV6_CHECKSUM,
+                6
+            )
+        elif tag_probes:
+            udp_sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
+            tags = [-1] * 0x10000
+        # the kernel fills in an identification of 0 so it isn't a tag
+        next_tag = cycle(range(1, 0x10000))
+        factory = _factories(local_port, family)
+        udp_sender = sender.BatchSender(udp_sock, family, stats=send_stats)
+
+        def send(key: int, probe: int, sequence: int) -> None:
+            """
+            Sends a UDP packet to the address and port of the probe key.
+            """
+            dest_ip = key >> 16
+            if tags is None:
+                udp_sender.pack(
+                    dest_ip,
+                    factory(dest_ip).udp_into,
+                    key & 0xFFFF
                 )
-    # this creates a new set which contains all the elements that
-    # are in the list of ports to be scanned but have not yet
-    # been classified
-    ports["OPEN|FILTERED"] = (
-        ports["REMAINING"]
-        - ports["OPEN"]
-        - ports["FILTERED"]
-        - ports["CLOSED"]
-    )
-    del(ports["REMAINING"])
-    # set comprehension to update the list of open filtered ports
-    return ports
+                return
+            tag = next(next_tag)
+            tags[tag] = key
+            udp_sender.pack(
+                dest_ip,
+                factory(dest_ip).udp_ip_into,
+                dest_ip,
+                key & 0xFFFF,
+                tag
+            )
+
+        for key, _, state in _sweep(
+                (
+                    listeners.probe_key(address, port)
+                    for address, port in probes
+                ),
+                1,
+                send,
+                {
+                    udp_sock: partial(listeners.udp, udp_sock, local_port),
+                    icmp_sock: partial(
+                        listeners.icmp_unreachable,
+                        icmp_sock,
+                        local_port,
+                        tags=tags
+                    ),
+                },
+                timeout,
+                pacer,
+                max_retries,
+                (udp_sender,)
+        ):
+            yield key >> 16, key & 0xFFFF, state
 
 
 def version_detect_scan(
@@ -0,0 +1,264 @@
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+from modules import ip_utils
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+class SendStats:
+    """
+    Counts the packets a scan sent, the system calls it took
+    to send them and how many of them the kernel refused.
+    """
+    def __init__(self) -> None:
+        self.packets: int = 0
+        self.calls: int = 0
+        self.failed: int = 0
+
+    def __repr__(self) -> str:
+        return ", ".join((
+            f"SendStats(packets={self.packets}",
+            f"calls={self.calls}",
+            f"failed={self.failed})"
+        ))
+
+    def packets_per_call(self) -> float:
+        """
+        Returns the average number of packets sent by each system call.
+        """
+        if self.calls == 0:
+            return 0
+        return self.packets / self.calls
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", msghdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+def _load_sendmmsg() -> Optional[Callable[..., int]]:
+    """
+    Returns the C library's sendmmsg function, or None if there isn't
+    one, which is the case everywhere but Linux.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.POINTER(mmsghdr),
+        ctypes.c_uint,
+        ctypes.c_int
+    ]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+SENDMMSG = _load_sendmmsg()
+# the size of the socket addresses of each family
+# and how far into them the IP address is
+SOCKADDR_SIZE: Dict[int, int] = {socket.AF_INET: 16, socket.AF_INET6: 28}
+ADDRESS_OFFSET: Dict[int, int] = {socket.AF_INET: 4, socket.AF_INET6: 8}
+# the family is in native byte order and the address in network, the
+# port is always 0 so it is left as it is along with the rest
+SOCKADDR_FAMILY = struct.Struct("=H")
+IPV4_ADDRESS = struct.Struct("!I")
+IPV6_ADDRESS = struct.Struct("!QQ")
+
+
+class BatchSender:
+    """
+    Sends packets from the raw socket sock to long form addresses of
+    the given family, queueing them up and sending batch_size at a time
+    with one sendmmsg system call. If sendmmsg isn't available each
+    packet is sent straight away with sendto instead.
+    The packets are packed or copied into the slots of a ring buffer
+    which is allocated once, as are their addresses, so the steady
+    state makes no new bytes objects. Packets longer than max_size are
+    sent on their own.
+    Nothing is sent until the queue is full or flush is called, so flush
+    must be called before waiting for replies.
+    Every packet and system call is counted in stats.
+    """
+    def __init__(
+            self,
+            sock: socket.socket,
+            family: int = socket.AF_INET,
+            batch_size: int = 64,
+            max_size: int = 256,
+            stats: Optional[SendStats] = None
+    ):
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: [{batch_size}]")
+        self.sock: socket.socket = sock
+        self.family: int = family
+        self.batch_size: int = batch_size
+        self.max_size: int = max_size
+        self.stats: SendStats = SendStats() if stats is None else stats
+        self.queued: int = 0
+        self.ring: bytearray = bytearray(batch_size * max_size)
+        # the view of every slot is made once up front
+        ring_view = memoryview(self.ring)
+        self.slots: List[memoryview] = [
+            ring_view[i * max_size:(i + 1) * max_size]
+            for i in range(batch_size)
+        ]
+        if SENDMMSG is None:
+            return
+        name_size = SOCKADDR_SIZE[family]
+        self.messages = (mmsghdr * batch_size)()
+        self.vectors = (iovec * batch_size)()
+        # shares its memory with the ring
+        self.packets = (ctypes.c_char * len(self.ring)).from_buffer(self.ring)
+        self.names = ctypes.create_string_buffer(batch_size * name_size)
+        self.name_view: memoryview = memoryview(self.names).cast("B")
+        self.name_size: int = name_size
+        # every message points at its own slot of the buffers for good
+        for i in range(batch_size):
+            self.vectors[i].iov_base = (
+                ctypes.addressof(self.packets) + i * max_size
+            )
+            SOCKADDR_FAMILY.pack_into(self.name_view, i * name_size, family)
+            header = self.messages[i].msg_hdr
+            header.msg_name = ctypes.addressof(self.names) + i * name_size
+            header.msg_namelen = name_size
+            header.msg_iov = ctypes.pointer(self.vectors[i])
+            header.msg_iovlen = 1
+        # indexing the array makes a new object each time
+        # so the vectors are looked up once
+        self.iovecs: List[iovec] = list(self.vectors)
+
+    def __repr__(self) -> str:
+        return ", ".join((
+            f"BatchSender(batch_size={self.batch_size}",
+            f"queued={self.queued}",
+            f"{self.stats})"
+        ))
+
+    def _sendto(
+            self,
+            packet: Union[bytes, memoryview],
+            address: int
+    ) -> None:
+        """
+        Sends a single packet with sendto.
+        """
+        self.stats.calls += 1
+        try:
+            self.sock.sendto(
+                packet,
+                (ip_utils.long_to_ip(address, self.family), 0)
+            )
+            self.stats.packets += 1
+        except PermissionError:
+            raise
+        except OSError:
+            self.stats.failed += 1
+
+    def send(self, packet: Union[bytes, memoryview], address: int) -> None:
+        """
+        Queues packet to be sent to the long form address.
+        """
+        if SENDMMSG is None or len(packet) > self.max_size:
+            self._sendto(packet, address)
+            return
+        slot = self.queued
+        self.slots[slot][:len(packet)] = packet
+        self._queue(slot, len(packet), address)
+
+    def pack(
+            self,
+            address: int,
+            build: Callable[..., int],
+            *args: Any
+    ) -> None:
+        """
+        Queues a packet to be sent to the long form address which
+        build packs straight into the next free slot. build is passed
+        the slot, the offset 0 and args and returns the size of the
+        packet it wrote, like the _into builders of
+        ip_utils.PacketFactory. The packet must fit in max_size bytes.
+        """
+        # without sendmmsg nothing is queued so the first slot is reused
+        slot = self.queued
+        size = build(self.slots[slot], 0, *args)
+        if SENDMMSG is None:
+            self._sendto(self.slots[slot][:size], address)
+        else:
+            self._queue(slot, size, address)
+
+    def _queue(self, slot: int, size: int, address: int) -> None:
+        """
+        Queues the size byte packet in slot to be sent to address,
+        sending the whole queue if it is full.
+        """
+        self.iovecs[slot].iov_len = size
+        start = slot * self.name_size + ADDRESS_OFFSET[self.family]
+        if self.family == socket.AF_INET6:
+            IPV6_ADDRESS.pack_into(
+                self.name_view,
+                start,
+                address >> 64,
+                address & 0xFFFFFFFFFFFFFFFF
+            )
+        else:
+            IPV4_ADDRESS.pack_into(self.name_view, start, address)
+        self.queued += 1
+        if self.queued == self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Sends every queued packet, as few system calls as the kernel
+        allows. Packets the kernel refuses are counted as failed
+        and skipped, like a lost probe, unless sending them
+        wasn't permitted at all.
+        """
+        sent = 0
+        while sent < self.queued:
+            self.stats.calls += 1
+            result = SENDMMSG(  # type: ignore
+                self.sock.fileno(),
+                ctypes.byref(self.messages[sent]),
+                self.queued - sent,
+                0
+            )
+            if result < 0:
+                error = ctypes.get_errno()
+                if error in {errno.EPERM, errno.EACCES}:
+                    self.queued = 0
+                    raise PermissionError(error, "sendmmsg not permitted")
+                if error == errno.EINTR:
+                    continue
+                # the first packet left couldn't be sent so skip it
+                self.stats.failed += 1
+                sent += 1
+            else:
+                self.stats.packets += result
+                sent += result
+        self.queued = 0
@@ -0,0 +1,54 @@
+from math import inf, sqrt
+
+
+class RunningStats:
+    """
+    Keeps the minimum, maximum, mean and variance of a stream of
+    values in constant memory by updating them as each value is added
+    using Welford's algorithm, rather than storing every value.
+    """
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.mean: float = 0
+        # the sum of the squared differences from the mean
+        self.m2: float = 0
+        self.min: float = inf
+        self.max: float = -inf
+
+    def __repr__(self) -> str:
+        return ", ".join((
+            f"RunningStats(count={self.count}",
+            f"min={self.min}",
+            f"mean={self.mean}",
+            f"max={self.max}",
+            f"stddev={self.stddev})"
+        ))
+
+    def add(self, value: float) -> None:
+        """
+        Updates the statistics with value.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        # this uses both the old and the new mean which
+        # avoids the rounding errors of summing the squares
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self) -> float:
+        """
+        The population variance of the values added so far.
+        """
+        if self.count == 0:
+            return float(0)
+        return self.m2 / self.count
+
+    @property
+    def stddev(self) -> float:
+        """
+        The population standard deviation of the values added so far.
+        """
+        return sqrt(self.variance)
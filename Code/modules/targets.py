@@ -0,0 +1,459 @@
+import re
+import socket
+import sys
+from bisect import bisect_right
+from itertools import accumulate, chain, product
+from modules import ip_utils
+from typing import (
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+
+class OctetRange:
+    """
+    The addresses specified by an nmap style octet range such as
+    10.0-3.*.1-254, where each octet can be a number, a range of
+    numbers, a comma separated list of both or * for all of 0-255.
+    Like IPRange it is lazy, ordered and supports len, in, indexing
+    and iteration over long form addresses without expanding them.
+    """
+    def __init__(self, octets: Tuple[Tuple[int, ...], ...]):
+        if len(octets) != 4:
+            raise ValueError(f"Invalid number of octets: [{len(octets)}]")
+        for octet in octets:
+            if not octet or not all(0 <= value <= 255 for value in octet):
+                raise ValueError(f"Invalid octet values: [{octet}]")
+        # each octet's values are kept sorted and unique
+        # so that the addresses are generated in order
+        self.octets: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(sorted(set(octet)))
+            for octet in octets
+        )
+        self.octet_sets: Tuple[FrozenSet[int], ...] = tuple(
+            frozenset(octet)
+            for octet in self.octets
+        )
+
+    def __repr__(self) -> str:
+        return "OctetRange(" + ".".join(
+            ",".join(map(str, octet))
+            for octet in self.octets
+        ) + ")"
+
+    def __len__(self) -> int:
+        length = 1
+        for octet in self.octets:
+            length *= len(octet)
+        return length
+
+    def __iter__(self) -> Iterator[int]:
+        for a, b, c, d in product(*self.octets):
+            yield (a << 24) | (b << 16) | (c << 8) | d
+
+    def __contains__(self, ip: object) -> bool:
+        if isinstance(ip, str):
+            try:
+                ip = ip_utils.dot_to_long(ip)
+            except ValueError:
+                return False
+        if not isinstance(ip, int) or not 0 <= ip <= 0xFFFFFFFF:
+            return False
+        return all(
+            (ip >> (8*(3-i))) & 0xFF in octet
+            for i, octet in enumerate(self.octet_sets)
+        )
+
+    def index(self, ip: int) -> int:
+        """
+        Returns the position of the long form address ip in the range.
+        """
+        if ip not in self:
+            raise ValueError(f"{ip} is not in OctetRange")
+        index = 0
+        for i, octet in enumerate(self.octets):
+            index = index * len(octet) + octet.index((ip >> (8*(3-i))) & 0xFF)
+        return index
+
+    def __getitem__(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("OctetRange index out of range")
+        # the index is a mixed radix number where the
+        # base of each digit is the number of values of an octet
+        address = 0
+        for i in reversed(range(4)):
+            index, digit = divmod(index, len(self.octets[i]))
+            address |= self.octets[i][digit] << (8*(3-i))
+        return address
+
+
+class Strided:
+    """
+    A lazy view of every step'th address of spec starting from the
+    one at index start, which like the specs themselves supports len,
+    in, indexing and ordered iteration without expanding anything.
+    """
+    def __init__(
+            self,
+            spec: Union[ip_utils.IPSet, OctetRange],
+            start: int,
+            step: int
+    ):
+        if step < 1:
+            raise ValueError(f"Invalid step: [{step}]")
+        self.spec: Union[ip_utils.IPSet, OctetRange] = spec
+        self.indices: range = range(start, size(spec), step)
+
+    def __repr__(self) -> str:
+        return (
+            f"Strided({self.spec}, start={self.indices.start}, "
+            f"step={self.indices.step})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __iter__(self) -> Iterator[int]:
+        for index in self.indices:
+            yield self.spec[index]
+
+    def __contains__(self, ip: object) -> bool:
+        if isinstance(ip, str):
+            if ip_utils.ip_family(ip) != family(self.spec):
+                return False
+            try:
+                ip = ip_utils.ip_to_long(ip)
+            except ValueError:
+                return False
+        if not isinstance(ip, int) or ip not in self.spec:
+            return False
+        return self.spec.index(ip) in self.indices
+
+    def index(self, ip: int) -> int:
+        """
+        Returns the position of the long form address ip in the view.
+        """
+        if ip not in self:
+            raise ValueError(f"{ip} is not in Strided")
+        return self.indices.index(self.spec.index(ip))
+
+    def __getitem__(self, index: int) -> int:
+        return self.spec[self.indices[index]]
+
+
+# a single parsed target specification
+TargetSpec = Union[ip_utils.IPRange, OctetRange, ip_utils.IPSet, Strided]
+# the specs are all sorted and can check membership without expanding
+SPEC_TYPES = (ip_utils.IPRange, OctetRange, ip_utils.IPSet, Strided)
+
+
+def family(spec: TargetSpec) -> int:
+    """
+    Returns the address family of spec, octet ranges are always IPv4.
+    """
+    if isinstance(spec, Strided):
+        return family(spec.spec)
+    if isinstance(spec, OctetRange):
+        return socket.AF_INET
+    return spec.family
+
+
+def size(spec: TargetSpec) -> int:
+    """
+    Returns the number of addresses in spec, which unlike len
+    also works for IPv6 specs of more than 2**63 addresses.
+    """
+    if isinstance(spec, ip_utils.IPRange):
+        addresses = spec.addresses
+    elif isinstance(spec, Strided):
+        addresses = spec.indices
+    elif isinstance(spec, ip_utils.IPSet):
+        return spec.offsets[-1]
+    else:
+        return len(spec)
+    if not addresses:
+        return 0
+    return (addresses[-1] - addresses[0]) // addresses.step + 1
+
+
+def parse_octet(octet: str) -> Tuple[int, ...]:
+    """
+    Parses one octet of an octet range i.e. "1-3,7" -> (1, 2, 3, 7).
+    Ranges with a missing start or end run from 0 or to 255.
+    """
+    if octet == "*":
+        return tuple(range(256))
+    values: List[int] = []
+    for part in octet.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            values.extend(range(
+                int(start) if start else 0,
+                (int(end) if end else 255) + 1
+            ))
+        else:
+            values.append(int(part))
+    return tuple(values)
+
+
+def parse_target(spec: str, hosts_only: bool = True) -> TargetSpec:
+    """
+    Parses a single nmap style target specification, any of:
+    a dot form IP address: 192.168.1.1
+    a CIDR subnet: 192.168.1.0/24
+    an octet range: 192.168.0-3.*
+    a hostname, optionally with a subnet: example.com/28
+    a colon form IPv6 address: fd00::1
+    an IPv6 prefix: fd00::/64
+    The network and broadcast addresses of IPv4 subnets are left out
+    unless hosts_only is False, which is what excluding them needs.
+    IPv6 prefixes are never expanded so even a /64 is fine to scan
+    as long as its addresses are generated as they are needed.
+    If the specification isn't valid it raises a ValueError.
+    """
+    subnet = ip_utils.ip_range if hosts_only else ip_utils.ip_network
+    CIDR_regex = re.compile(r"([^/]+)/(\d{1,3})")
+    octet_regex = re.compile(r"[\d*,-]+(\.[\d*,-]+){3}")
+    address, network_bits = spec, None
+    search = CIDR_regex.fullmatch(spec)
+    if search:
+        address, network_bits = search.group(1), int(search.group(2))
+    if ip_utils.is_valid_ip(address):
+        if network_bits is None:
+            # a lone address is a subnet of just itself
+            network_bits = (
+                128 if ip_utils.ip_family(address) == socket.AF_INET6
+                else 32
+            )
+        return subnet(address, network_bits)
+    if octet_regex.fullmatch(spec):
+        try:
+            return OctetRange(tuple(
+                parse_octet(octet)
+                for octet in spec.split(".")
+            ))
+        except ValueError:
+            raise ValueError(f"Invalid octet range: [{spec}]")
+    # as a last resort treat it as a hostname, but not if it looks
+    # like an address as the resolver accepts shorthands like 1.2.3
+    if re.fullmatch(r"[\d*,.-]+", address) or ":" in address:
+        raise ValueError(f"Invalid target specification: [{spec}]")
+    try:
+        return subnet(
+            socket.gethostbyname(address),
+            32 if network_bits is None else network_bits
+        )
+    except (socket.error, UnicodeError):
+        raise ValueError(f"Invalid target specification: [{spec}]")
+
+
+def read_targets(path: str, hosts_only: bool = True) -> Iterator[TargetSpec]:
+    """
+    Reads target specifications from the file at path,
+    or standard input if path is -, and parses them one at a time
+    so that even huge lists never have to be held in memory.
+    Specifications are seperated by whitespace and anything after
+    a # on a line is a comment, see parse_target for hosts_only.
+    """
+    target_file = sys.stdin if path == "-" else open(path)
+    try:
+        for line in target_file:
+            for spec in line.split("#", 1)[0].split():
+                yield parse_target(spec, hosts_only)
+    finally:
+        if target_file is not sys.stdin:
+            target_file.close()
+
+
+def intervals(spec: TargetSpec) -> Iterator[Tuple[int, int]]:
+    """
+    Generates the sorted [start, stop) intervals of the
+    consecutive addresses in spec, without expanding it.
+    """
+    if isinstance(spec, ip_utils.IPSet):
+        yield from spec.intervals
+    elif isinstance(spec, ip_utils.IPRange):
+        if spec.addresses.step == 1:
+            if spec:
+                yield spec.addresses.start, spec.addresses.stop
+        else:
+            for address in spec:
+                yield address, address + 1
+    elif isinstance(spec, Strided):
+        # a shard's addresses are every step'th one of its spec so
+        # only the ones next to each other in it could be merged
+        for address in spec:
+            yield address, address + 1
+    else:
+        # the octets after the last one which isn't 0-255 are full, so
+        # each run of its values covers one interval for every
+        # combination of the octets before it
+        full = tuple(range(256))
+        last = max(
+            (i for i, octet in enumerate(spec.octets) if octet != full),
+            default=-1
+        )
+        if last == -1:
+            yield 0, 0x100000000
+            return
+        runs: List[Tuple[int, int]] = []
+        for value in spec.octets[last]:
+            if runs and runs[-1][1] == value:
+                runs[-1] = (runs[-1][0], value + 1)
+            else:
+                runs.append((value, value + 1))
+        shift = 8*(3-last)
+        for prefix in product(*spec.octets[:last]):
+            base = sum(
+                value << (8*(3-i))
+                for i, value in enumerate(prefix)
+            )
+            for start, stop in runs:
+                yield base + (start << shift), base + (stop << shift)
+
+
+def ip_set(
+        specs: Iterable[TargetSpec],
+        address_family: int = socket.AF_INET
+) -> ip_utils.IPSet:
+    """
+    Returns the union of the addresses of every one of specs of the
+    family address_family as an IPSet, built in one go rather than
+    one union per spec. Specs of the other family are left out.
+    """
+    return ip_utils.IPSet(
+        chain.from_iterable(
+            intervals(spec)
+            for spec in specs
+            if family(spec) == address_family
+        ),
+        address_family
+    )
+
+
+def exclude(
+        specs: Iterable[TargetSpec],
+        excluded: ip_utils.IPSet
+) -> Iterator[TargetSpec]:
+    """
+    Generates specs with the addresses in excluded taken out of them.
+    Only the specs of the same family which overlap excluded
+    are turned into IPSets.
+    """
+    for spec in specs:
+        if (
+                family(spec) == excluded.family
+                and spec
+                and excluded.overlaps(spec[0], spec[-1] + 1)
+        ):
+            yield ip_set([spec], excluded.family) - excluded
+        else:
+            yield spec
+
+
+def shard(
+        specs: Iterable[TargetSpec],
+        shard_number: int,
+        shards: int
+) -> Iterator[TargetSpec]:
+    """
+    Generates the part of specs which is shard number shard_number
+    (counting from 1) of shards, which is every shards'th address
+    counting across all of the specs. Every shard is the same size give
+    or take one address, no address is in two shards and together they
+    hold every address, so one scan can be split between machines.
+    """
+    if not 1 <= shard_number <= shards:
+        raise ValueError(f"Invalid shard: [{shard_number}/{shards}]")
+    # the index across every spec of the first address of this one
+    offset = 0
+    for spec in specs:
+        start = (shard_number - 1 - offset) % shards
+        offset += size(spec)
+        if isinstance(spec, ip_utils.IPRange):
+            yield spec[start::shards]
+        elif isinstance(spec, Strided):
+            yield Strided(
+                spec.spec,
+                spec.indices.start + start * spec.indices.step,
+                spec.indices.step * shards
+            )
+        else:
+            yield Strided(spec, start, shards)
+
+
+class TargetList:
+    """
+    Joins the addresses of several specs into one lazy sequence
+    supporting len, in, indexing and iteration like a single spec,
+    so that scans can pick addresses from anywhere in the targets
+    (see permutation.shuffled_probes) without expanding them.
+    """
+    def __init__(self, specs: Iterable[TargetSpec]):
+        self.specs: List[TargetSpec] = list(specs)
+        # the index of the first address of each spec
+        self.starts: List[int] = [0] + list(accumulate(
+            size(spec) for spec in self.specs[:-1]
+        ))
+        self.length: int = sum(size(spec) for spec in self.specs)
+
+    def __repr__(self) -> str:
+        return f"TargetList({self.specs})"
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[int]:
+        return iter_addresses(self.specs)
+
+    def __contains__(self, ip: object) -> bool:
+        return any(ip in spec for spec in self.specs)
+
+    def index(self, ip: int) -> int:
+        """
+        Returns the position of the first time the long form
+        address ip appears in the list.
+        """
+        for start, spec in zip(self.starts, self.specs):
+            if ip in spec:
+                return start + spec.index(ip)
+        raise ValueError(f"{ip} is not in TargetList")
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("TargetList index out of range")
+        spec = bisect_right(self.starts, index) - 1
+        return self.specs[spec][index - self.starts[spec]]
+
+
+def iter_addresses(specs: Iterable[TargetSpec]) -> Iterator[int]:
+    """
+    Generates every long form address of every one of specs in order.
+    """
+    for spec in specs:
+        yield from spec
+
+
+def onlink_interface(spec: TargetSpec) -> Optional[str]:
+    """
+    Returns the name of the interface which the addresses in spec
+    are directly attached to, or None if they aren't all on one link.
+    The addresses of a spec all lie between its first and last so
+    every route for part of that span is checked, see
+    ip_utils.get_range_interface.
+    IPv6 neighbours are found with NDP rather than ARP so IPv6 specs
+    always give None.
+    """
+    if family(spec) != socket.AF_INET or not spec:
+        return None
+    return ip_utils.get_range_interface(spec[0], spec[-1])
@@ -1,16 +1,34 @@
 #!/usr/bin/env python
 import re
+import socket
+import sys
 from argparse import ArgumentParser
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import chain
 from math import floor, log10
+from os import urandom
 from modules import (
     scanners,
     ip_utils,
     directives,
+    pacing,
+    permutation,
+    sender,
+    targets,
 )
+from modules.cache import Liveness, LivenessCache
 from typing import (
     DefaultDict,
+    Deque,
     Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
 )
 
 top_ports = directives.parse_ports(open("top_ports").read())
@@ -25,7 +43,27 @@ for match in re.finditer(
 parser = ArgumentParser()
 parser.add_argument(
     "target_spec",
-    help="specify what to scan, i.e. 192.168.1.0/24"
+    help=(
+        "specify what to scan, i.e. 192.168.1.0/24 10.0-3.*.1-254 "
+        "example.com fd00::/120"
+    ),
+    nargs="*"
+)
+parser.add_argument(
+    "-iL",
+    help="read target specifications from a file, - for standard input",
+    default=None
+)
+parser.add_argument(
+    "--exclude",
+    help="whitespace separated target specifications not to scan",
+    action="append",
+    default=[]
+)
+parser.add_argument(
+    "--excludefile",
+    help="file of target specifications not to scan",
+    default=None
 )
 parser.add_argument(
     "-Pn",
@@ -47,6 +85,14 @@ parser.add_argument(
     help="TCP SYN scan",
     action="store_true"
 )
+parser.add_argument(
+    "--stateless",
+    help=(
+        "send every SYN of the SYN scan once and keep nothing about it, "
+        "so memory doesn't grow with the scan"
+    ),
+    action="store_true"
+)
 parser.add_argument(
     "-sT",
     help="TCP connect scan",
@@ -69,6 +115,88 @@ parser.add_argument(
     required=False,
     default=top_ports
 )
+parser.add_argument(
+    "--count",
+    help="with -sn send this many pings to each host and show RTT statistics",
+    type=int,
+    default=None
+)
+parser.add_argument(
+    "--interval",
+    help="seconds between each round of pings sent with --count",
+    type=float,
+    default=1
+)
+parser.add_argument(
+    "--discovery",
+    help=(
+        "comma separated host discovery techniques to use together, "
+        "any of: echo,syn,ack,timestamp"
+    ),
+    default=",".join(scanners.DISCOVERY_TECHNIQUES)
+)
+parser.add_argument(
+    "--disable-arp-ping",
+    help="don't use ARP for discovering hosts on directly attached networks",
+    action="store_true"
+)
+parser.add_argument(
+    "--ping-timeout",
+    help="seconds to wait for more ping replies once every probe is sent",
+    type=float,
+    default=1
+)
+parser.add_argument(
+    "--max-retries",
+    help="number of times to resend pings to hosts that haven't replied",
+    type=int,
+    default=2
+)
+parser.add_argument(
+    "--cache",
+    help="file to remember hosts found to be up in, between scans",
+    default=None
+)
+parser.add_argument(
+    "--cache-age",
+    help="seconds a host in the cache is assumed to still be up for",
+    type=float,
+    default=3600
+)
+parser.add_argument(
+    "--cache-size",
+    help="maximum number of hosts to keep in the cache",
+    type=int,
+    default=1000000
+)
+parser.add_argument(
+    "--rate",
+    "--max-rate",
+    help="send no more than this many packets per second",
+    dest="max_rate",
+    type=float,
+    default=None
+)
+parser.add_argument(
+    "--burst",
+    help="number of packets that can be sent at once under --max-rate",
+    type=int,
+    default=10
+)
+parser.add_argument(
+    "--seed",
+    help="seed for the order ports are scanned in, random by default",
+    type=int,
+    default=None
+)
+parser.add_argument(
+    "--shard",
+    help=(
+        "scan only part k of n of the targets, i.e. 2/4, so a scan can be "
+        "split between machines running the same command and --seed"
+    ),
+    default="1/1"
+)
 parser.add_argument(
     "--exclude_ports",
     help="ports to exclude from the scan",
@@ -78,20 +206,249 @@ parser.add_argument(
 
 args = parser.parse_args()
 
-# check whether the address spec is in CIDR form
-CIDR_regex = re.compile(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})/(\d{1,2})")
-search = CIDR_regex.search(args.target_spec)
-if search:
-    base_addr, network_bits = search.groups()
-    addresses = ip_utils.ip_range(
-        base_addr,
-        int(network_bits)
+if not args.target_spec and args.iL is None:
+    parser.error("no targets were specified")
+
+# what to call the targets in error messages
+scanning = " ".join(
+    args.target_spec +
+    ([f"-iL {args.iL}"] if args.iL is not None else [])
+)
+
+
+# the address families that can be scanned
+FAMILIES = (socket.AF_INET, socket.AF_INET6)
+
+# the addresses which must never be scanned, whole subnets are excluded
+excluded_specs = list(chain(
+    (
+        targets.parse_target(spec, hosts_only=False)
+        for specs in args.exclude
+        for spec in specs.split()
+    ),
+    (
+        targets.read_targets(args.excludefile, hosts_only=False)
+        if args.excludefile is not None else ()
     )
-else:
-    base_addr = args.target_spec
-    if not ip_utils.is_valid_ip(base_addr):
-        raise ValueError(f"invalid dot form IP address: [{base_addr}]")
-    addresses = {base_addr}
+))
+# one set for each family as they can't be mixed
+excluded = [
+    targets.ip_set(excluded_specs, family)
+    for family in FAMILIES
+]
+
+
+# which part of the scan this machine does
+search = re.fullmatch(r"(\d+)/(\d+)", args.shard)
+if search is None:
+    parser.error(f"invalid shard: [{args.shard}]")
+shard, shards = int(search.group(1)), int(search.group(2))
+if not 1 <= shard <= shards:
+    parser.error(f"invalid shard: [{args.shard}]")
+if shards > 1 and args.seed is None:
+    parser.error("--shard needs a --seed shared by every machine")
+
+
+def target_specs(sharded: bool = True) -> Iterator[targets.TargetSpec]:
+    """
+    Generates the parsed target specifications, first those given
+    on the command line and then those read from the -iL file,
+    without any of the excluded addresses and, if sharded is True,
+    only this machine's shard of the addresses.
+    """
+    specs: Iterator[targets.TargetSpec] = (
+        targets.parse_target(spec) for spec in args.target_spec
+    )
+    if args.iL is not None:
+        specs = chain(specs, targets.read_targets(args.iL))
+    for excluded_set in excluded:
+        specs = targets.exclude(specs, excluded_set)
+    if sharded and shards > 1:
+        specs = targets.shard(specs, shard, shards)
+    return specs
+
+
+# the host discovery techniques to use
+discovery = tuple(args.discovery.split(","))
+for technique in discovery:
+    if technique not in scanners.DISCOVERY_TECHNIQUES:
+        parser.error(f"invalid host discovery technique: [{technique}]")
+if args.max_retries < 0:
+    parser.error(f"invalid number of retries: [{args.max_retries}]")
+# the echos' sequence numbers are 16 bits and start from 1
+if args.count is not None and not 1 <= args.count <= 0xFFFF:
+    parser.error(f"invalid number of pings: [{args.count}]")
+if args.max_rate is not None and not args.max_rate > 0:
+    parser.error(f"invalid rate: [{args.max_rate}]")
+if args.burst < 1:
+    parser.error(f"invalid burst: [{args.burst}]")
+if not args.cache_age > 0:
+    parser.error(f"invalid cache age: [{args.cache_age}]")
+if args.cache_size < 0:
+    parser.error(f"invalid cache size: [{args.cache_size}]")
+
+# limits the rate at which the scans send packets
+pacer = pacing.TokenBucket(args.max_rate, args.burst)
+# counts the system calls the raw scans send their packets with
+send_stats = sender.SendStats()
+
+# the same seed always scans in the same order
+seed: int = args.seed
+if seed is None:
+    seed = int.from_bytes(urandom(8), "big")
+
+
+def report_rate(
+        pacer: pacing.TokenBucket,
+        send_stats: sender.SendStats,
+        show_rate: bool = True
+) -> None:
+    """
+    Prints how many packets the pacer let through, the send rate
+    that was actually achieved if show_rate is True and it could be
+    worked out, how many packets each system call sent and how many
+    the kernel refused.
+    """
+    rate = pacer.achieved_rate()
+    if show_rate and rate > 0:
+        ip_utils.eprint(f"sent {pacer.sent} packets at {rate:.1f} packets/s")
+    else:
+        ip_utils.eprint(f"sent {pacer.sent} packets")
+    if send_stats.calls:
+        ip_utils.eprint(
+            f"{send_stats.packets_per_call():.1f} packets per system call"
+        )
+    if send_stats.failed:
+        ip_utils.eprint(f"{send_stats.failed} packets failed to send")
+
+
+# remembers which hosts were up between scans
+cache: Optional[LivenessCache] = None
+if args.cache is not None:
+    cache = LivenessCache(args.cache, args.cache_age, args.cache_size)
+
+
+def discover_hosts(
+        specs: Iterable[targets.TargetSpec],
+        skip: Set[int] = set()
+) -> Iterator[Tuple[int, int, float, str]]:
+    """
+    Runs host discovery over the addresses of specs apart from the IPv4
+    ones in skip. Specs which are directly attached to one of our
+    interfaces are set aside and discovered with ARP once the IP
+    techniques have been used on the rest, and IPv6 specs are set aside
+    and discovered after that. Yields the family of each host and the
+    host as soon as it is found to be up along with the time it took
+    to reply and a description of the reply. IPv4 hosts which are in
+    the cache are yielded without being probed, as soon as their spec
+    is reached, the cache only holds IPv4 addresses. Our own addresses
+    never answer our ARP requests so they are yielded without being
+    probed too.
+    """
+    # hosts found in the cache waiting to be yielded
+    found: Deque[Tuple[int, int, float, str]] = deque()
+    # the specs to use ARP on for each interface
+    onlink: DefaultDict[str, List[targets.TargetSpec]] = defaultdict(list)
+    # the IPv6 specs, which need their own sockets
+    ipv6: List[targets.TargetSpec] = []
+
+    def to_probe(
+            specs: Iterable[targets.TargetSpec],
+            local: Set[int] = set()
+    ) -> Iterator[int]:
+        """
+        Generates the addresses of specs we don't already know about,
+        the addresses in local are known to be up as they are ours.
+        """
+        for spec in specs:
+            if targets.family(spec) == socket.AF_INET6:
+                yield from spec
+                continue
+            cached: Dict[int, Liveness] = dict()
+            if cache is not None:
+                cached = cache.lookup(spec)
+                for host, liveness in cached.items():
+                    if host in skip:
+                        continue
+                    # hosts found with ARP have no IP time to live
+                    if liveness.ttl is None:
+                        reply = "(cached)"
+                    else:
+                        reply = f"ttl: [{liveness.ttl}] (cached)"
+                    found.append(
+                        (socket.AF_INET, host, liveness.rtt, reply)
+                    )
+            for address in spec:
+                if address in cached or address in skip:
+                    continue
+                if address in local:
+                    found.append(
+                        (socket.AF_INET, address, 0.0, "(local address)")
+                    )
+                else:
+                    yield address
+
+    def offlink() -> Iterator[targets.TargetSpec]:
+        """
+        Generates the IPv4 specs that aren't directly attached,
+        setting the others aside for ARP and IPv6 discovery.
+        """
+        for spec in specs:
+            if targets.family(spec) == socket.AF_INET6:
+                ipv6.append(spec)
+                continue
+            interface = None
+            if not args.disable_arp_ping:
+                interface = targets.onlink_interface(spec)
+            if interface is None:
+                yield spec
+            else:
+                onlink[interface].append(spec)
+
+    for host, taken, ip_head in scanners.discover(
+            to_probe(offlink()),
+            args.ping_timeout,
+            pacer,
+            args.max_retries,
+            discovery,
+            send_stats=send_stats
+    ):
+        # IPv4 replies always come with their IP header
+        ttl = ip_head.time_to_live if ip_head is not None else None
+        if cache is not None:
+            cache.record(host, taken, ttl)
+        yield socket.AF_INET, host, taken, f"ttl: [{ttl}]"
+        while found:
+            yield found.popleft()
+    while found:
+        yield found.popleft()
+    local_addresses = ip_utils.get_local_addresses()
+    for interface, interface_specs in onlink.items():
+        for host, taken, arp_head in scanners.arp(
+                to_probe(interface_specs, local_addresses),
+                interface,
+                args.ping_timeout,
+                pacer,
+                args.max_retries
+        ):
+            if cache is not None:
+                cache.record(host, taken, None)
+            yield socket.AF_INET, host, taken, f"mac: [{arp_head.sender_mac}]"
+            while found:
+                yield found.popleft()
+        while found:
+            yield found.popleft()
+    # IPv6 replies come without their IP header so there's no hop limit
+    for host, taken, _ in scanners.discover(
+            to_probe(ipv6),
+            args.ping_timeout,
+            pacer,
+            args.max_retries,
+            discovery,
+            socket.AF_INET6,
+            send_stats
+    ):
+        yield socket.AF_INET6, host, taken, ""
 
 
 def error_exit(error_type: str, scan_type: str, scanning: str) -> bool:
@@ -111,7 +468,11 @@ def error_exit(error_type: str, scan_type: str, scanning: str) -> bool:
 
 if args.sL:
     print("Targets:")
-    print("\n".join(sorted(addresses, key=ip_utils.dot_to_long)))
+    # print each address as it is generated
+    for spec in target_specs():
+        family = targets.family(spec)
+        for address in spec:
+            print(ip_utils.long_to_ip(address, family))
 else:
     if args.sn:
         def sig_figs(x: float, n: int) -> float:
@@ -119,41 +480,141 @@ else:
             rounds x to n significant figures.
             sig_figs(1234, 2) = 1200.0
             """
+            if x == 0:
+                return 0.0
             return round(x, n - (1 + int(floor(log10(abs(x))))))
 
         try:
-            print("\n".join(
-                f"host: [{host}]\t" +
-                "responded to an ICMP ECHO REQUEST in " +
-                f"{str(sig_figs(taken, 2))+'s':<10s} " +
-                f"ttl: [{ip_head.time_to_live}]"
-                for host, taken, ip_head in scanners.ping(addresses)
-            ))
+            if args.count is not None:
+                def ipv4_specs() -> Iterator[targets.TargetSpec]:
+                    """
+                    Generates the IPv4 specs, latency is only
+                    measured with ICMP so IPv6 ones are skipped.
+                    """
+                    for spec in target_specs():
+                        if targets.family(spec) == socket.AF_INET:
+                            yield spec
+                        else:
+                            ip_utils.eprint(
+                                f"skipping {spec}, --count is IPv4 only"
+                            )
+
+                for host, rtts in scanners.latency(
+                        targets.iter_addresses(ipv4_specs()),
+                        args.count,
+                        args.interval,
+                        args.ping_timeout,
+                        pacer
+                ):
+                    # only show the hosts that are up
+                    if rtts.count == 0:
+                        continue
+                    loss = 1 - rtts.count / args.count
+                    print(
+                        f"host: [{ip_utils.long_to_dot(host)}]\t" +
+                        "rtt min/avg/max/stddev = " +
+                        "/".join(
+                            f"{value*1000:.3f}"
+                            for value in (
+                                rtts.min,
+                                rtts.mean,
+                                rtts.max,
+                                rtts.stddev
+                            )
+                        ) +
+                        f" ms loss: [{loss:.0%}]"
+                    )
+            else:
+                # print each host as soon as it replies
+                for family, host, taken, reply in discover_hosts(
+                        target_specs()
+                ):
+                    print(
+                        f"host: [{ip_utils.long_to_ip(host, family)}]\t" +
+                        "responded to host discovery in " +
+                        f"{str(sig_figs(taken, 2))+'s':<10s} " +
+                        reply
+                    )
         except PermissionError:
-            error_exit("permission", "ping scan", str(addresses))
+            error_exit("permission", "ping scan", scanning)
+        finally:
+            # keep the hosts found even if the scan is cut short
+            if cache is not None:
+                cache.close()
+        # --count spreads its rounds of echos out over time on purpose
+        report_rate(pacer, send_stats, show_rate=args.count is None)
 
     else:
         if args.Pn:
-            targets = [
-                directives.Target(
-                    addr,
-                    defaultdict(set),
-                    defaultdict(set)
-                )
-                for addr in addresses
-            ]
+            # every address is assumed to be up and is reported.
+            # The shards split the (address, port) pairs rather than
+            # just the addresses so they stay even however few there are
+            family_specs: Dict[int, List[targets.TargetSpec]] = {
+                family: [] for family in FAMILIES
+            }
+            for spec in target_specs(sharded=False):
+                family_specs[targets.family(spec)].append(spec)
+            addresses: Dict[
+                int,
+                Union[Sequence[int], targets.TargetList]
+            ] = dict()
+            for family, specs in family_specs.items():
+                target_list = targets.TargetList(specs)
+                # the probes are shuffled by index which needs the length
+                if target_list.length > sys.maxsize:
+                    parser.error(
+                        "too many addresses to scan without host discovery, "
+                        "use a smaller IPv6 prefix or a list of hosts"
+                    )
+                addresses[family] = target_list
+            probe_shard, probe_shards = shard, shards
         else:
+            # hosts the kernel's neighbour table already knows are
+            # reachable are up so they can skip host discovery
+            neighbours = ip_utils.get_neighbours()
+            reachable: Set[int] = set()
+
+            def check_neighbours(
+                    specs: Iterable[targets.TargetSpec]
+            ) -> Iterator[targets.TargetSpec]:
+                """
+                Passes specs through, noting the neighbours they contain.
+                """
+                for spec in specs:
+                    # the neighbour table only holds IPv4 addresses
+                    if targets.family(spec) == socket.AF_INET:
+                        reachable.update(
+                            addr for addr in neighbours if addr in spec
+                        )
+                    yield spec
+
+            discovered: Dict[int, List[int]] = {
+                family: [] for family in FAMILIES
+            }
             try:
-                targets = [
-                    directives.Target(
-                        addr,
-                        defaultdict(set),
-                        defaultdict(set),
-                    )
-                    for addr, _, _ in scanners.ping(addresses)
-                ]
+                for family, addr, *_ in discover_hosts(
+                        check_neighbours(target_specs()),
+                        neighbours
+                ):
+                    discovered[family].append(addr)
             except PermissionError:
-                error_exit("permission", "ping_scan", str(addresses))
+                error_exit("permission", "ping_scan", scanning)
+            finally:
+                if cache is not None:
+                    cache.close()
+            # the neighbours skip discovery, sorted so are the reports
+            addresses = {
+                socket.AF_INET: sorted(
+                    chain(reachable, discovered[socket.AF_INET])
+                ),
+                socket.AF_INET6: sorted(discovered[socket.AF_INET6]),
+            }
+            # discovery only found the hosts in this machine's shard
+            probe_shard, probe_shards = 1, 1
+        # the results of the addresses which answered any probe, the
+        # rest are only made when their reports are printed so -Pn
+        # scans of huge ranges don't hold a Target for every address
+        to_scan: Dict[Tuple[int, int], directives.Target] = dict()
         # define the ports to scan
         if args.ports == "-":
             # case they have specified all ports
@@ -174,6 +635,8 @@ else:
         ports["TCP"] -= to_exclude["ANY"]
         ports["UDP"] -= to_exclude["UDP"]
         ports["UDP"] -= to_exclude["ANY"]
+        tcp_ports = sorted(ports["TCP"] | ports["ANY"])
+        udp_ports = sorted(ports["UDP"] | ports["ANY"])
 
         # if version scanning is desired
         if args.sV:
@@ -181,49 +644,167 @@ else:
                 "./version_detection/nmap-service-probes"
             )
 
-        for target in targets:
+        # the ports which were found to be closed on each
+        # (family, address) pair
+        closed: DefaultDict[
+            Tuple[int, int],
+            DefaultDict[str, Set[int]]
+        ] = defaultdict(lambda: defaultdict(set))
+
+        def record(
+                family: int,
+                addr: int,
+                proto: str,
+                port: int,
+                state: str
+        ) -> None:
+            """
+            Stores the state of port on addr.
+            """
+            if (family, addr) not in to_scan:
+                to_scan[family, addr] = directives.Target(
+                    addr,
+                    defaultdict(set),
+                    defaultdict(set),
+                    family=family
+                )
+            if state == "OPEN":
+                to_scan[family, addr].open_ports[proto].add(port)
+            elif state == "CLOSED":
+                closed[family, addr][proto].add(port)
+
+        # every engine probes the whole (address, port) space of each
+        # family at once in a shuffled order so no host gets all its
+        # ports hit together
+        for family, family_addresses in addresses.items():
+            if not family_addresses:
+                continue
             if not args.sU and not args.sT or args.sS:
                 try:
-                    tcp_ports = scanners.tcp(
-                        target.address,
-                        ports["TCP"] | ports["ANY"]
-                    )
+                    for addr, port, state in scanners.tcp(
+                            permutation.shuffled_probes(
+                                family_addresses,
+                                tcp_ports,
+                                seed,
+                                probe_shard,
+                                probe_shards
+                            ),
+                            pacer=pacer,
+                            family=family,
+                            send_stats=send_stats,
+                            stateless=args.stateless
+                    ):
+                        record(family, addr, "TCP", port, state)
                 except PermissionError:
-                    error_exit("permission", "tcp_scan", target.address)
-                target.open_ports["TCP"].update(tcp_ports["OPEN"])
-                target.open_filtered_ports["TCP"].update(
-                    tcp_ports["FILTERED"]
-                )
+                    error_exit("permission", "tcp_scan", scanning)
             if args.sT:
-                target.open_ports["TCP"].update(
-                    scanners.connect(
-                        target.address,
-                        ports["TCP"] | ports["ANY"]
-                    )
-                )
+                for addr, port, state in scanners.connect(
+                        permutation.shuffled_probes(
+                            family_addresses,
+                            tcp_ports,
+                            seed,
+                            probe_shard,
+                            probe_shards
+                        ),
+                        family=family
+                ):
+                    if state == "OPEN":
+                        record(family, addr, "TCP", port, state)
             if args.sU:
                 try:
-                    udp_ports = scanners.udp(
-                        target.address,
-                        ports["UDP"] | ports["ANY"]
-                    )
+                    for addr, port, state in scanners.udp(
+                            permutation.shuffled_probes(
+                                family_addresses,
+                                udp_ports,
+                                seed,
+                                probe_shard,
+                                probe_shards
+                            ),
+                            pacer=pacer,
+                            family=family,
+                            send_stats=send_stats
+                    ):
+                        record(family, addr, "UDP", port, state)
                 except PermissionError:
-                    error_exit("permission", "udp_scan", target.address)
+                    error_exit("permission", "udp_scan", scanning)
+        report_rate(pacer, send_stats)
+
+        # the orders the probes of each family were shuffled into,
+        # by how many ports each address was probed on
+        orders: Dict[Tuple[int, int], permutation.Permutation] = dict()
 
-                target.open_ports["UDP"].update(
-                    udp_ports["OPEN"]
+        def probed(family: int, index: int, ports: List[int]) -> Set[int]:
+            """
+            Returns which of ports this machine's shard probed on the
+            address at index in addresses[family], worked out from the
+            shuffled order rather than remembered as the probes went out.
+            """
+            if probe_shards == 1:
+                return set(ports)
+            if (family, len(ports)) not in orders:
+                orders[family, len(ports)] = permutation.Permutation(
+                    len(addresses[family]) * len(ports),
+                    seed
                 )
-                target.open_filtered_ports["UDP"].update(
-                    udp_ports["FILTERED"]
+            order = orders[family, len(ports)]
+            first = index * len(ports)
+            return {
+                port
+                for i, port in enumerate(ports)
+                if order.index(first + i) % probe_shards == probe_shard - 1
+            }
+
+        def reported() -> Iterator[Tuple[int, int, int]]:
+            """
+            Generates the family, index and address of every address to
+            report, walking addresses lazily.
+            """
+            for family in FAMILIES:
+                for index, addr in enumerate(addresses[family]):
+                    yield family, index, addr
+
+        syn_scan = not args.sU and not args.sT or args.sS
+        for family, index, addr in reported():
+            tcp_probed: Set[int] = set()
+            if syn_scan or args.sT:
+                tcp_probed = probed(family, index, tcp_ports)
+            udp_probed: Set[int] = set()
+            if args.sU:
+                udp_probed = probed(family, index, udp_ports)
+            # the other machines report the addresses this one's
+            # shard had no probes for
+            if probe_shards > 1 and not tcp_probed and not udp_probed:
+                continue
+            target = to_scan.get((family, addr)) or directives.Target(
+                addr,
+                defaultdict(set),
+                defaultdict(set),
+                family=family
+            )
+            # looked up without adding every address to closed
+            closed_ports = closed.get((family, addr), defaultdict(set))
+            # the ports which didn't answer are filtered, or
+            # open|filtered for UDP, which could be open but silent
+            if syn_scan:
+                target.open_filtered_ports["TCP"].update(
+                    tcp_probed
+                    - target.open_ports["TCP"]
+                    - closed_ports["TCP"]
                 )
+            if args.sU:
                 target.open_filtered_ports["UDP"].update(
-                    udp_ports["OPEN|FILTERED"]
+                    udp_probed
+                    - target.open_ports["UDP"]
+                    - closed_ports["UDP"]
                 )
             if args.sV:
                 target = scanners.version_detect_scan(target, probes)
             # display scan info
             print()
-            print(f"Scan report for: {target.address}")
+            print(
+                "Scan report for: "
+                f"{ip_utils.long_to_ip(target.address, target.family)}"
+            )
             #  print(target)
             print("Open ports:")
             for proto, open_ports in target.open_ports.items():
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 import re
-from modules.ip_utils import ip_range, dot_to_long
+from modules.ip_utils import ip_range, long_to_dot
 
 
 if __name__ == '__main__':
@@ -16,9 +16,6 @@ if __name__ == '__main__':
     search = CIDR_regex.search(args.ip_subnet)
     if search:
         ip, network_bits = search.group(1).split("/")
-        print("\n".join(
-            sorted(
-                ip_range(ip, int(network_bits)),
-                key=dot_to_long
-            )
-        ))
+        # the range is already sorted so print it as it is generated
+        for address in ip_range(ip, int(network_bits)):
+            print(long_to_dot(address))
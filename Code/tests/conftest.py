@@ -0,0 +1,16 @@
+import socket
+from contextlib import closing
+from typing import Iterator, Tuple
+from pytest import fixture
+
+
+@fixture
+def pair() -> Iterator[Tuple[socket.socket, socket.socket]]:
+    """
+    A connected pair of datagram sockets standing in for a raw socket,
+    the packets written to the first are read from the second whole,
+    just as a raw socket would hand them over.
+    """
+    first, second = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    with closing(first), closing(second):
+        yield first, second
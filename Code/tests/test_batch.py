@@ -0,0 +1,63 @@
+import os
+from modules import batch
+from modules.ip_utils import make_tcp_packet
+from pytest import MonkeyPatch, mark, raises
+from typing import List, Tuple
+
+
+def random_syns(count: int) -> Tuple[List[int], List[int], List[int]]:
+    sources = [0xC0A8012D] * (count - 1) + [0x0A000001]
+    addresses = [
+        int.from_bytes(os.urandom(4), "big") for _ in range(count)
+    ]
+    ports = [int.from_bytes(os.urandom(2), "big") for _ in range(count)]
+    return sources, addresses, ports
+
+
+def test_syn_packets_match_make_tcp_packet() -> None:
+    sources, addresses, ports = random_syns(300)
+    packets = batch.syn_packets(58695, sources, addresses, ports)
+    assert len(packets) == 300 * batch.SYN_SIZE
+    for i, (source, address, port) in enumerate(
+            zip(sources, addresses, ports)
+    ):
+        assert packets[
+            i * batch.SYN_SIZE:(i + 1) * batch.SYN_SIZE
+        ] == make_tcp_packet(58695, port, source, address, 2)
+
+
+def test_syn_packets_without_numpy(monkeypatch: MonkeyPatch) -> None:
+    sources, addresses, ports = random_syns(50)
+    expected = batch.syn_packets(1234, sources, addresses, ports)
+    monkeypatch.setattr(batch, "numpy", None)
+    assert batch.syn_packets(1234, sources, addresses, ports) == expected
+    assert batch.syn_packets(1234, [], [], []) == b""
+
+
+@mark.parametrize("with_numpy", [True, False])
+def test_syn_packets_sequences(
+        monkeypatch: MonkeyPatch,
+        with_numpy: bool
+) -> None:
+    if not with_numpy:
+        monkeypatch.setattr(batch, "numpy", None)
+    sources, addresses, ports = random_syns(100)
+    sequences = [
+        int.from_bytes(os.urandom(4), "big") for _ in range(100)
+    ]
+    packets = batch.syn_packets(58695, sources, addresses, ports, sequences)
+    for i, (source, address, port, seq) in enumerate(
+            zip(sources, addresses, ports, sequences)
+    ):
+        assert packets[
+            i * batch.SYN_SIZE:(i + 1) * batch.SYN_SIZE
+        ] == make_tcp_packet(58695, port, source, address, 2, seq=seq)
+    with raises(ValueError):
+        batch.syn_packets(1234, [1], [2], [80], [2**32])
+
+
+def test_syn_packets_invalid() -> None:
+    with raises(ValueError):
+        batch.syn_packets(1234, [1], [2, 3], [80])
+    with raises(ValueError):
+        batch.syn_packets(1234, [1], [2], [65536])
@@ -0,0 +1,66 @@
+from modules.cache import LivenessCache
+from modules.ip_utils import dot_to_long, ip_range
+from pathlib import Path
+from contextlib import closing
+import sqlite3
+
+
+def test_liveness_cache_lookup(tmp_path: Path) -> None:
+    cache = LivenessCache(str(tmp_path / "cache.db"), 60, 10)
+    cache.record(dot_to_long("192.168.1.1"), 0.5, 64)
+    cache.record(dot_to_long("192.168.1.9"), 0.25, None)
+    cache.record(dot_to_long("192.168.2.1"), 0.25, None)
+    found = cache.lookup(ip_range("192.168.1.0", 24))
+    assert found.keys() == {
+        dot_to_long("192.168.1.1"),
+        dot_to_long("192.168.1.9")
+    }
+    assert found[dot_to_long("192.168.1.1")].ttl == 64
+    assert found[dot_to_long("192.168.1.9")].rtt == 0.25
+
+
+def test_liveness_cache_persists(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.db")
+    cache = LivenessCache(path, 60, 10)
+    cache.record(0x0A000001, 0.5, 64)
+    cache.close()
+    assert LivenessCache(path, 60, 10).lookup({0x0A000001}).keys() == {
+        0x0A000001
+    }
+
+
+def test_liveness_cache_evict_by_size(tmp_path: Path) -> None:
+    cache = LivenessCache(str(tmp_path / "cache.db"), 60, 2)
+    for address in range(0x0A000001, 0x0A000005):
+        cache.record(address, 0.5, 64)
+    cache.evict()
+    assert len(cache.lookup(range(0x0A000001, 0x0A000005))) == 2
+
+
+def test_liveness_cache_evict_by_age(tmp_path: Path) -> None:
+    cache = LivenessCache(str(tmp_path / "cache.db"), 0, 10)
+    cache.record(0x0A000001, 0.5, 64)
+    cache.evict()
+    assert cache.lookup({0x0A000001}) == {}
+
+
+def test_liveness_cache_commits_as_it_goes(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.db")
+    cache = LivenessCache(path, 60, 10, commit_every=2)
+    for address in range(0x0A000001, 0x0A000004):
+        cache.record(address, 0.5, 64)
+    # the first two are on disk before the cache is closed
+    with closing(sqlite3.connect(path)) as reader:
+        assert reader.execute("SELECT address FROM hosts").fetchall() == [
+            (0x0A000001,),
+            (0x0A000002,)
+        ]
+    cache.close()
+
+
+def test_liveness_cache_context_manager(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.db")
+    with LivenessCache(path, 60, 10) as cache:
+        cache.record(0x0A000001, 0.5, 64)
+    with LivenessCache(path, 60, 10) as cache:
+        assert cache.lookup({0x0A000001}).keys() == {0x0A000001}
@@ -8,8 +8,34 @@ from modules.ip_utils import (
     make_tcp_packet,
     make_udp_packet,
     make_icmp_packet,
+    make_icmp_timestamp_packet,
+    make_arp_packet,
+    enable_timestamps,
+    recv_timestamped,
+    wall_clock_offset,
+    checksum_update,
+    get_local_addresses,
+    get_neighbours,
+    get_routes,
+    is_ethernet,
+    syn_cookie,
+    EchoTemplate,
+    SynTemplate,
+    PacketFactory,
+    IPSet,
+    ip_network,
+    ipv6_to_long,
+    long_to_ipv6,
+    ip_to_long,
 )
+from modules import headers
 from binascii import unhexlify
+from contextlib import closing
+import os
+import socket
+import struct
+import time
+from pytest import MonkeyPatch, raises
 
 
 def test_dot_to_long_private_ip() -> None:
@@ -62,7 +88,7 @@ def test_is_not_valid_port_number_65536() -> None:
 
 def test_ip_range() -> None:
     assert(
-        ip_range("192.168.1.0", 28) == {
+        {long_to_dot(ip) for ip in ip_range("192.168.1.0", 28)} == {
             "192.168.1.1",
             "192.168.1.2",
             "192.168.1.3",
@@ -81,6 +107,75 @@ def test_ip_range() -> None:
     )
 
 
+def test_ip_range_is_lazy() -> None:
+    addresses = ip_range("10.0.0.0", 8)
+    assert len(addresses) == 2**24 - 2
+    assert addresses[0] == dot_to_long("10.0.0.1")
+    assert addresses[-1] == dot_to_long("10.255.255.254")
+    assert "10.1.2.3" in addresses
+    assert dot_to_long("11.0.0.0") not in addresses
+    assert "not an ip" not in addresses
+
+
+def test_ip_range_slice() -> None:
+    addresses = ip_range("192.168.1.0", 24)[10:13]
+    assert list(addresses) == [
+        dot_to_long("192.168.1.11"),
+        dot_to_long("192.168.1.12"),
+        dot_to_long("192.168.1.13"),
+    ]
+
+
+def test_ip_network() -> None:
+    network = ip_network("192.168.1.77", 24)
+    assert network[0] == dot_to_long("192.168.1.0")
+    assert network[-1] == dot_to_long("192.168.1.255")
+    assert len(network) == 256
+
+
+def test_ip_set_merges_intervals() -> None:
+    ips = IPSet([(10, 20), (0, 5), (5, 8), (15, 25), (30, 30)])
+    assert ips.intervals == [(0, 8), (10, 25)]
+    assert len(ips) == 23
+    assert list(ips) == list(range(0, 8)) + list(range(10, 25))
+    assert [ips[i] for i in range(-len(ips), 0)] == list(ips)
+    assert 7 in ips and 10 in ips
+    assert 8 not in ips and 25 not in ips
+    assert "0.0.0.24" in ips
+
+
+def test_ip_set_algebra() -> None:
+    a = IPSet([(0, 10), (20, 30)])
+    b = IPSet([(5, 22), (28, 40)])
+    assert (a | b).intervals == [(0, 40)]
+    assert (a & b).intervals == [(5, 10), (20, 22), (28, 30)]
+    assert (a - b).intervals == [(0, 5), (22, 28)]
+    assert (b - a).intervals == [(10, 20), (30, 40)]
+    assert set(a - b) == set(a) - set(b)
+
+
+def test_ip_set_large_difference() -> None:
+    # a /8 minus every other /24 never expands the addresses
+    network = ip_network("10.0.0.0", 8)
+    everything = IPSet([(network[0], network[-1] + 1)])
+    holes = IPSet(
+        (start, start + 256)
+        for start in range(network[0], network[-1], 512)
+    )
+    remaining = everything - holes
+    assert len(remaining.intervals) == 32768
+    assert len(remaining) == 2**23
+    assert "10.0.0.1" not in remaining
+    assert "10.0.1.1" in remaining
+    hole_start, hole_end = dot_to_long("10.0.0.0"), dot_to_long("10.0.1.0")
+    assert remaining.overlaps(hole_start, hole_end + 1)
+    assert not remaining.overlaps(hole_start, hole_end)
+
+
+def test_ip_range_single() -> None:
+    assert list(ip_range("192.168.1.7", 32)) == [dot_to_long("192.168.1.7")]
+
+
 def test_ip_checksum_verify() -> None:
     packet = unhexlify(
         "45000073000040004011b861c0a80001c0a800c7"
@@ -99,7 +194,7 @@ def test_make_tcp_packet() -> None:
     correct = unhexlify(
         "e54700500000000000000000600204002af50000020405b4"
     )
-    info = 58695, 80, "192.168.1.45", "192.168.1.28", 2
+    info = 58695, 80, 0xC0A8012D, 0xC0A8011C, 2
     assert correct == make_tcp_packet(*info)
 
 
@@ -110,3 +205,355 @@ def test_make_udp_packet() -> None:
     info = 58695, 80
     # clipping the packet at 8 simply removes the data section
     assert correct == make_udp_packet(*info)[:8]
+
+
+def test_make_icmp_packet_sequence() -> None:
+    packet = make_icmp_packet(0x1234, 7)
+    icmp = headers.icmp(packet[:8])
+    assert (icmp.type, icmp.id, icmp.sequence) == (8, 0x1234, 7)
+    # a packet containing its own checksum sums to 0
+    assert ip_checksum(packet) == 0
+
+
+def test_make_icmp_timestamp_packet() -> None:
+    packet = make_icmp_timestamp_packet(0x1234, 3)
+    icmp = headers.icmp(packet[:8])
+    assert len(packet) == 20
+    assert (icmp.type, icmp.id, icmp.sequence) == (13, 0x1234, 3)
+    assert ip_checksum(packet) == 0
+
+
+def test_ip_header_addresses() -> None:
+    header = headers.ip(unhexlify(
+        "450000730000400040110000c0a80001c0a800c7"
+    ))
+    assert header.source == 0xC0A80001
+    assert header.destination == 0xC0A800C7
+    assert "192.168.0.199" in repr(header)
+
+
+def test_make_tcp_packet_ack() -> None:
+    info = 58695, 80, 0xC0A8012D, 0xC0A8011C, 16
+    packet = make_tcp_packet(*info)
+    assert headers.tcp(packet[:20]).flags == 16
+
+
+def test_make_arp_packet() -> None:
+    mac = unhexlify("0242ac110002")
+    packet = make_arp_packet(mac, 0xC0A8012D, 0xC0A8011C)
+    ethernet = headers.ethernet(packet[:14])
+    arp = headers.arp(packet[14:])
+    assert ethernet.destination == "ff:ff:ff:ff:ff:ff"
+    assert ethernet.ethertype == 0x0806
+    assert arp.operation == 1
+    assert arp.sender_mac == "02:42:ac:11:00:02"
+    assert (arp.sender_ip, arp.target_ip) == (0xC0A8012D, 0xC0A8011C)
+
+
+def test_recv_timestamped() -> None:
+    with closing(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ) as recv_sock, closing(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ) as send_sock:
+        recv_sock.bind(("127.0.0.1", 0))
+        assert enable_timestamps(recv_sock)
+        sent = time.time()
+        send_sock.sendto(b"hello", recv_sock.getsockname())
+        data, address, recieved = recv_timestamped(recv_sock, 1024)
+        assert data == b"hello"
+        assert address[1] == send_sock.getsockname()[1]
+        assert sent - 0.001 < recieved < time.time()
+
+
+def test_recv_timestamped_uses_the_kernel_timestamp(
+        monkeypatch: MonkeyPatch
+) -> None:
+    with closing(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ) as recv_sock, closing(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ) as send_sock:
+        recv_sock.bind(("127.0.0.1", 0))
+        assert enable_timestamps(recv_sock)
+        sent = time.time()
+        send_sock.sendto(b"early", recv_sock.getsockname())
+        time.sleep(0.05)
+        read = time.time()
+
+        def no_clock() -> float:
+            raise AssertionError("the clock was read")
+
+        # the time spent waiting to be read is left out
+        # without reading either clock
+        monkeypatch.setattr(time, "time", no_clock)
+        monkeypatch.setattr(time, "monotonic", no_clock)
+        _, _, recieved = recv_timestamped(recv_sock, 1024)
+        monkeypatch.undo()
+        assert sent - 0.001 < recieved < read - 0.04
+        # which turns into a monotonic time with the offset
+        assert recieved - wall_clock_offset() < time.monotonic() - 0.04
+
+
+def test_checksum_update() -> None:
+    packet = unhexlify(
+        "450000730000400040110000c0a80001c0a800c7"
+    )
+    changed = unhexlify(
+        "450000730000400040110000c0a80001c0a801c8"
+    )
+    # only the last word changed from 0x00c7 to 0x01c8
+    assert checksum_update(
+        ip_checksum(packet), 0x00c7, 0x01c8
+    ) == ip_checksum(changed)
+
+
+def test_echo_template_matches_make_icmp_packet() -> None:
+    template = EchoTemplate(0x1234)
+    for sequence, timestamp in [(0, 0), (1, 1.5), (65535, 1e9), (77, -3.25)]:
+        assert (
+            template.packet(sequence, timestamp)
+            == make_icmp_packet(0x1234, sequence, timestamp)
+        )
+
+
+def test_ipv6_conversions() -> None:
+    assert ipv6_to_long("::1") == 1
+    assert long_to_ipv6(ipv6_to_long("fd00::1:2")) == "fd00::1:2"
+    assert ip_to_long("fd00::") == 0xFD << 120
+    assert ip_to_long("10.0.0.1") == 0x0A000001
+    assert is_valid_ip("fd00::1") and not is_valid_ip("fd00:::1")
+
+
+def test_ip_network_ipv6() -> None:
+    network = ip_network("fd00::1234", 120)
+    assert network[0] == ipv6_to_long("fd00::1200")
+    assert network[-1] == ipv6_to_long("fd00::12ff")
+    # IPv6 has no broadcast so nothing is left out
+    assert ip_range("fd00::1234", 120) == network
+    assert "fd00::12ab" in network and "0.0.18.171" not in network
+
+
+def test_make_tcp_packet_ipv6() -> None:
+    src, dst = ipv6_to_long("fd00::1"), ipv6_to_long("fd00::2")
+    packet = make_tcp_packet(58695, 80, src, dst, 2, socket.AF_INET6)
+    pseudo_header = (
+        src.to_bytes(16, "big") + dst.to_bytes(16, "big")
+        + len(packet).to_bytes(4, "big") + bytes((0, 0, 0, 6))
+    )
+    # a segment containing its own checksum sums to 0
+    assert ip_checksum(pseudo_header + packet) == 0
+
+
+def test_ip6_header() -> None:
+    header = headers.ip6(unhexlify(
+        "6000000000203a40"
+        "fd000000000000000000000000000001"
+        "fd000000000000000000000000000002"
+    ))
+    assert (header.version, header.payload_length) == (6, 32)
+    assert (header.next_header, header.hop_limit) == (58, 64)
+    assert header.source == ipv6_to_long("fd00::1")
+    assert header.destination == ipv6_to_long("fd00::2")
+    assert "fd00::2" in repr(header)
+
+
+def test_ip_checksum_matches_word_sum() -> None:
+    def word_sum(packet: bytes) -> int:
+        if len(packet) % 2 == 1:
+            packet += b"\0"
+        total = sum(
+            (packet[i] << 8) + packet[i + 1]
+            for i in range(0, len(packet), 2)
+        )
+        while total > 0xFFFF:
+            total = (total & 0xFFFF) + (total >> 16)
+        return ~total & 0xFFFF
+
+    for size in (0, 1, 2, 19, 20, 21, 64, 1499, 1500):
+        for packet in (
+                os.urandom(size),
+                bytes(size),
+                b"\xff" * size,
+                b"\x00\x01" * (size // 2)
+        ):
+            assert ip_checksum(packet) == word_sum(packet)
+
+
+def test_syn_template_matches_make_tcp_packet() -> None:
+    for family, bits in ((socket.AF_INET, 32), (socket.AF_INET6, 128)):
+        for source in (0, 0xC0A8012D, (1 << bits) - 1):
+            template = SynTemplate(58695, source, family)
+            for address in (0, 0xC0A8011C, (1 << bits) - 1):
+                for port in (0, 80, 65535):
+                    assert template.packet(address, port) == (
+                        make_tcp_packet(
+                            58695,
+                            port,
+                            source,
+                            address,
+                            2,
+                            family
+                        )
+                    )
+
+
+def test_syn_template_sequence() -> None:
+    template = SynTemplate(58695, 0xC0A8012D)
+    for seq in (1, 0xFFFF, 0x10000, 0xDEADBEEF, 0xFFFFFFFF):
+        assert template.packet(0xC0A8011C, 80, seq) == make_tcp_packet(
+            58695, 80, 0xC0A8012D, 0xC0A8011C, 2, seq=seq
+        )
+    with raises(ValueError):
+        make_tcp_packet(58695, 80, 0xC0A8012D, 0xC0A8011C, 2, seq=2**32)
+
+
+def test_syn_cookie() -> None:
+    cookie = syn_cookie(b"secret", 0xC0A8011C, 80, 58695)
+    assert 0 <= cookie <= 0xFFFFFFFF
+    assert cookie == syn_cookie(b"secret", 0xC0A8011C, 80, 58695)
+    assert cookie not in {
+        syn_cookie(b"other secret", 0xC0A8011C, 80, 58695),
+        syn_cookie(b"secret", 0xC0A8011D, 80, 58695),
+        syn_cookie(b"secret", 0xC0A8011C, 81, 58695),
+        syn_cookie(b"secret", 0xC0A8011C, 80, 58696),
+    }
+    factory = PacketFactory(0xC0A8012D, 58695, secret=b"secret")
+    assert factory.syn(0xC0A8011C, 80) == make_tcp_packet(
+        58695, 80, 0xC0A8012D, 0xC0A8011C, 2, seq=cookie
+    )
+    assert headers.tcp(factory.syn(0xC0A8011C, 80)[:20]).seq == cookie
+    with raises(ValueError):
+        PacketFactory(0xC0A8012D, 58695, secret=bytes(65))
+
+
+def test_packet_factory() -> None:
+    factory = PacketFactory(0xC0A8012D, 58695, ID=0x1234)
+    assert factory.syn(0xC0A8011C, 80) == make_tcp_packet(
+        58695, 80, 0xC0A8012D, 0xC0A8011C, 2
+    )
+    assert factory.udp(53) == make_udp_packet(58695, 53)
+    assert factory.echo(7, 1.5) == make_icmp_packet(0x1234, 7, 1.5)
+    assert factory.ack(0xC0A8011C, 80) == make_tcp_packet(
+        58695, 80, 0xC0A8012D, 0xC0A8011C, 16
+    )
+    assert factory.timestamp(7, 1.5) == make_icmp_timestamp_packet(
+        0x1234, 7, 1.5
+    )
+    ipv6 = PacketFactory(1, 58695, socket.AF_INET6)
+    assert ipv6.syn(2, 443) == make_tcp_packet(
+        58695, 443, 1, 2, 2, socket.AF_INET6
+    )
+    for invalid in ((-1, 80), (0x100000000, 80), (1, 65536)):
+        with raises(ValueError):
+            PacketFactory(*invalid)
+
+
+def test_packet_factory_into() -> None:
+    factory = PacketFactory(0xC0A8012D, 58695, ID=0x1234)
+    ipv6 = PacketFactory(1, 58695, socket.AF_INET6)
+    # the buffer is dirty to check every byte is written
+    buffer = bytearray(b"\xff" * 128)
+    # smallest first, as each packet only overwrites those before it
+    for packet, build, args in (
+            (factory.timestamp(7, 1.5), factory.timestamp_into, (7, 1.5)),
+            (factory.syn(0xC0A8011C, 80), factory.syn_into, (0xC0A8011C, 80)),
+            (ipv6.syn(2, 443), ipv6.syn_into, (2, 443)),
+            (factory.ack(0xC0A8011C, 80), factory.ack_into, (0xC0A8011C, 80)),
+            (ipv6.ack(2, 80), ipv6.ack_into, (2, 80)),
+            (factory.udp(53), factory.udp_into, (53,)),
+            (factory.echo(7, 1.5), factory.echo_into, (7, 1.5)),
+    ):
+        size = build(buffer, 10, *args)
+        assert size == len(packet)
+        assert buffer[10:10 + size] == packet
+        assert buffer[:10] == b"\xff" * 10
+        assert buffer[10 + size:] == b"\xff" * (118 - size)
+
+
+def test_packet_factory_ip_into() -> None:
+    for source, address in ((0xC0A8012D, 0xC0A8011C), (0xFFFFFFFF, 0)):
+        factory = PacketFactory(source, 58695)
+        buffer = bytearray(128)
+        size = factory.udp_ip_into(buffer, 0, address, 53, 0xBEEF)
+        assert size == 20 + len(factory.udp(53))
+        assert ip_checksum(bytes(buffer[:20])) == 0
+        ip = headers.ip(bytes(buffer[:20]))
+        assert (ip.version, ip.header_length, ip.len) == (4, 5, size)
+        assert (ip.id, ip.protocol, ip.time_to_live) == (0xBEEF, 17, 64)
+        assert (ip.source, ip.destination) == (source, address)
+        assert buffer[20:size] == factory.udp(53)
+
+
+def test_get_local_addresses() -> None:
+    if not os.path.exists("/proc/net/fib_trie"):
+        assert get_local_addresses() == set()
+        return
+    assert dot_to_long("127.0.0.1") in get_local_addresses()
+
+
+def test_get_routes() -> None:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        routes = get_routes(family)
+        # most specific first so the first match is the one used
+        masks = [mask for _, _, mask, _ in routes]
+        assert masks == sorted(masks, reverse=True)
+        for _, destination, mask, _ in routes:
+            assert destination & mask == destination
+
+
+def test_get_neighbours(monkeypatch: MonkeyPatch) -> None:
+    def neighbour(address: str, state: int) -> bytes:
+        # an RTM_NEWNEIGH holding an ndmsg and its NDA_DST attribute
+        ndmsg = struct.pack("=BBHiHBB", socket.AF_INET, 0, 0, 2, state, 0, 0)
+        attribute = struct.pack("=HH", 8, 1) + socket.inet_aton(address)
+        return struct.pack(
+            "=IHHII",
+            16 + len(ndmsg) + len(attribute),
+            28,
+            2,
+            1,
+            0
+        ) + ndmsg + attribute
+
+    class Netlink:
+        """
+        Answers the neighbour table dump in two parts.
+        """
+        def __init__(self, *args: object):
+            self.replies = [
+                neighbour("10.0.0.2", 0x02) + neighbour("10.0.0.3", 0x04),
+                neighbour("10.0.0.4", 0x02)
+                + struct.pack("=IHHII", 16, 3, 2, 1, 0),
+            ]
+
+        def send(self, data: bytes) -> int:
+            return len(data)
+
+        def recv(self, size: int) -> bytes:
+            return self.replies.pop(0)
+
+        def close(self) -> None:
+            pass
+
+    monkeypatch.setattr(socket, "socket", Netlink)
+    # only the REACHABLE entries, the STALE one may be down
+    assert get_neighbours() == {
+        dot_to_long("10.0.0.2"),
+        dot_to_long("10.0.0.4")
+    }
+
+
+def test_get_neighbours_without_netlink(monkeypatch: MonkeyPatch) -> None:
+    def no_netlink(*args: object) -> socket.socket:
+        raise OSError("no netlink")
+
+    # the ARP cache isn't used as it can't tell stale entries apart
+    monkeypatch.setattr(socket, "socket", no_netlink)
+    assert get_neighbours() == set()
+
+
+def test_is_ethernet() -> None:
+    # loopback has its own link type and nothing answers ARP on it
+    assert not is_ethernet("lo")
+    assert not is_ethernet("no such interface")
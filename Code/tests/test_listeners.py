@@ -0,0 +1,159 @@
+import socket
+import struct
+from modules import listeners
+from modules.ip_utils import (
+    IP_HEADER,
+    dot_to_long,
+    make_tcp_packet,
+    syn_cookie,
+)
+from typing import Tuple
+
+LOCAL = dot_to_long("10.0.0.1")
+REMOTE = dot_to_long("10.0.0.2")
+SECRET = b"0123456789abcdef"
+PORT = 40000
+
+
+def ip_packet(protocol: int, payload: bytes, ID: int = 0) -> bytes:
+    """
+    Returns payload behind an IPv4 header from REMOTE to LOCAL.
+    """
+    return IP_HEADER.pack(
+        0x45,
+        0,
+        IP_HEADER.size + len(payload),
+        ID,
+        0,
+        64,
+        protocol,
+        0,
+        REMOTE,
+        LOCAL
+    ) + payload
+
+
+def tcp_reply(
+        src_port: int,
+        flags: int,
+        ack: int,
+        dst_port: int = PORT
+) -> bytes:
+    """
+    Returns a TCP packet from src_port on REMOTE to dst_port on LOCAL
+    with the given flags acknowledging ack, inside its IP header.
+    """
+    tcp = bytearray(
+        make_tcp_packet(src_port, dst_port, REMOTE, LOCAL, flags)
+    )
+    tcp[8:12] = (ack & 0xFFFFFFFF).to_bytes(4, "big")
+    return ip_packet(socket.IPPROTO_TCP, bytes(tcp))
+
+
+def test_syn_accepts_cookies(
+        pair: Tuple[socket.socket, socket.socket]
+) -> None:
+    writer, reader = pair
+    cookie = syn_cookie(SECRET, REMOTE, 80, PORT)
+    for flags, state in ((18, "OPEN"), (4, "CLOSED")):
+        writer.send(tcp_reply(80, flags, cookie + 1))
+        reply = listeners.syn(reader, PORT, SECRET, dict())
+        assert reply is not None
+        key, _, found = reply
+        assert key == listeners.probe_key(REMOTE, 80)
+        assert found == state
+
+
+def test_syn_rejects_bad_cookies(
+        pair: Tuple[socket.socket, socket.socket]
+) -> None:
+    writer, reader = pair
+    cookie = syn_cookie(SECRET, REMOTE, 80, PORT)
+    for packet in (
+            # not acknowledging the cookie
+            tcp_reply(80, 18, cookie),
+            # the cookie of another port
+            tcp_reply(81, 18, cookie + 1),
+            # the cookie of another secret
+            tcp_reply(
+                80,
+                18,
+                syn_cookie(b"another secret", REMOTE, 80, PORT) + 1
+            ),
+            # an answer to a SYN sent from another port
+            tcp_reply(80, 18, cookie + 1, PORT + 1),
+    ):
+        writer.send(packet)
+        assert listeners.syn(reader, PORT, SECRET, dict()) is None
+
+
+def unreachable(code: int, ID: int, dst_port: int) -> bytes:
+    """
+    Returns an ICMP DESTINATION UNREACHABLE from REMOTE with the given
+    code quoting a UDP probe from PORT on LOCAL to dst_port on REMOTE
+    which had the IP identification ID.
+    """
+    probe = IP_HEADER.pack(
+        0x45,
+        0,
+        IP_HEADER.size + 8,
+        ID,
+        0,
+        64,
+        socket.IPPROTO_UDP,
+        0,
+        LOCAL,
+        REMOTE
+    ) + struct.pack("!HHHH", PORT, dst_port, 8, 0)
+    return ip_packet(
+        socket.IPPROTO_ICMP,
+        struct.pack("!BBHI", 3, code, 0, 0) + probe
+    )
+
+
+def test_icmp_unreachable_tags(
+        pair: Tuple[socket.socket, socket.socket]
+) -> None:
+    writer, reader = pair
+    key = listeners.probe_key(REMOTE, 53)
+    outstanding = {key: 1}
+    tags = [-1] * 0x10000
+    tags[7] = key
+    writer.send(unreachable(3, 7, 53))
+    reply = listeners.icmp_unreachable(reader, PORT, outstanding, tags)
+    assert reply is not None
+    assert (reply[0], reply[2]) == (key, "CLOSED")
+    writer.send(unreachable(13, 7, 53))
+    reply = listeners.icmp_unreachable(reader, PORT, outstanding, tags)
+    assert reply is not None
+    assert (reply[0], reply[2]) == (key, "FILTERED")
+    # the tag has since been used for a probe to another port
+    tags[7] = listeners.probe_key(REMOTE, 54)
+    writer.send(unreachable(3, 7, 53))
+    assert listeners.icmp_unreachable(
+        reader,
+        PORT,
+        outstanding,
+        tags
+    ) is None
+    # a tag that was never sent
+    writer.send(unreachable(3, 8, 53))
+    assert listeners.icmp_unreachable(
+        reader,
+        PORT,
+        outstanding,
+        tags
+    ) is None
+    # the tag matches but its probe isn't waiting for an answer
+    writer.send(unreachable(3, 7, 54))
+    assert listeners.icmp_unreachable(
+        reader,
+        PORT,
+        outstanding,
+        tags
+    ) is None
+    # without tags the quoted address and port are enough
+    writer.send(unreachable(3, 8, 53))
+    reply = listeners.icmp_unreachable(reader, PORT, outstanding)
+    assert reply is not None
+    assert (reply[0], reply[2]) == (key, "CLOSED")
@@ -0,0 +1,30 @@
+from modules.pacing import TokenBucket
+import pytest
+
+
+def test_token_bucket_unlimited_never_delays() -> None:
+    bucket = TokenBucket()
+    for _ in range(100):
+        bucket.consume()
+    assert bucket.delay() == 0
+    assert bucket.sent == 100
+
+
+def test_token_bucket_burst_then_delay() -> None:
+    bucket = TokenBucket(10, 2)
+    bucket.consume()
+    assert bucket.delay() == 0
+    bucket.consume()
+    assert 0 < bucket.delay() <= 0.1
+
+
+def test_token_bucket_invalid_rate() -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_token_bucket_counts_queued_packets() -> None:
+    bucket = TokenBucket(10, 3)
+    assert bucket.delay(2) == 0
+    assert 0 < bucket.delay(3) <= 0.1
+    assert 0.1 < bucket.delay(4) <= 0.2
@@ -0,0 +1,54 @@
+from modules.permutation import Permutation, shuffled_probes
+
+
+def test_permutation_is_a_permutation() -> None:
+    for size in (0, 1, 2, 3, 17, 256, 1000, 4097):
+        assert sorted(Permutation(size, 5)) == list(range(size))
+
+
+def test_permutation_is_seeded() -> None:
+    assert list(Permutation(1000, 1)) == list(Permutation(1000, 1))
+    assert list(Permutation(1000, 1)) != list(Permutation(1000, 2))
+    assert list(Permutation(1000, 1)) != list(range(1000))
+
+
+def test_permutation_indexing() -> None:
+    permutation = Permutation(300, 9)
+    assert [permutation[i] for i in range(300)] == list(permutation)
+    assert permutation[-1] == permutation[299]
+
+
+def test_shuffled_probes() -> None:
+    addresses = range(0x0A000000, 0x0A000010)
+    ports = [22, 80, 443]
+    probes = list(shuffled_probes(addresses, ports, 4))
+    assert sorted(probes) == [
+        (address, port)
+        for address in addresses
+        for port in ports
+    ]
+    # the ports of one host aren't all probed back to back
+    assert any(a[0] != b[0] for a, b in zip(probes, probes[1:3]))
+
+
+def test_permutation_index() -> None:
+    permutation = Permutation(1000, 3)
+    assert all(permutation.index(permutation[i]) == i for i in range(1000))
+
+
+def test_shuffled_probes_shards() -> None:
+    addresses = range(100, 137)
+    ports = [1, 2, 3, 4, 5]
+    shards = [
+        list(shuffled_probes(addresses, ports, 8, shard, 3))
+        for shard in (1, 2, 3)
+    ]
+    # the shards are even, disjoint and cover every pair
+    assert sorted(map(len, shards)) == [61, 62, 62]
+    assert sorted(sum(shards, [])) == [
+        (address, port)
+        for address in addresses
+        for port in ports
+    ]
+    # the same seed always gives the same shards
+    assert shards[0] == list(shuffled_probes(addresses, ports, 8, 1, 3))
@@ -0,0 +1,114 @@
+import socket
+import struct
+import time
+from modules import scanners
+from typing import Any, Dict, List, Optional, Tuple
+
+# the address and sequence number a fake reply is for
+REPLY = struct.Struct("=II")
+
+
+def test_sweep_retries_with_backoff(
+        pair: Tuple[socket.socket, socket.socket]
+) -> None:
+    writer, reader = pair
+    # address 1 answers straight away, 2 only its second round
+    # of probes and 3 never does
+    answers = {1: 1, 2: 2}
+    sent: List[Tuple[int, int, float]] = []
+
+    def send(address: int, probe: int, sequence: int) -> None:
+        sent.append((address, sequence, time.monotonic()))
+        if answers.get(address) == sequence:
+            writer.send(REPLY.pack(address, sequence))
+
+    def recieve(
+            outstanding: Dict[int, int]
+    ) -> Optional[Tuple[int, float, Any]]:
+        address, sequence = REPLY.unpack(reader.recv(REPLY.size))
+        if outstanding.get(address) != sequence:
+            return None
+        return address, time.time(), sequence
+
+    found = {
+        address: sequence
+        for address, _, sequence in scanners._sweep(
+            [1, 2, 3],
+            1,
+            send,
+            {reader: recieve},
+            0.05,
+            None,
+            2
+        )
+    }
+    assert found == {1: 1, 2: 2}
+    # each silent address is probed again with the next sequence number
+    assert [(a, s) for a, s, _ in sent] == [
+        (1, 1), (2, 1), (3, 1), (2, 2), (3, 2), (3, 3)
+    ]
+    # and waited on twice as long each time
+    times = [at for address, _, at in sent if address == 3]
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1
+
+
+def test_sweep_stateless(pair: Tuple[socket.socket, socket.socket]) -> None:
+    writer, reader = pair
+    sent: List[Tuple[int, int]] = []
+
+    def send(address: int, probe: int, sequence: int) -> None:
+        sent.append((address, sequence))
+        # address 1 answers twice and 3 never does
+        for _ in range({1: 2, 2: 1}.get(address, 0)):
+            writer.send(REPLY.pack(address, sequence))
+
+    def recieve(
+            outstanding: Dict[int, int]
+    ) -> Optional[Tuple[int, float, Any]]:
+        # nothing is kept about the probes so every reply is passed on
+        assert not outstanding
+        address, sequence = REPLY.unpack(reader.recv(REPLY.size))
+        return address, time.time(), sequence
+
+    found = list(scanners._sweep(
+        [1, 2, 3],
+        1,
+        send,
+        {reader: recieve},
+        0.05,
+        None,
+        2,
+        stateless=True
+    ))
+    # everything is probed once, with no retries
+    assert sent == [(1, 1), (2, 1), (3, 1)]
+    assert sorted(found) == [(1, 0.0, 1), (1, 0.0, 1), (2, 0.0, 1)]
+
+
+def test_sweep_repeated_and_negative_retries(
+        pair: Tuple[socket.socket, socket.socket]
+) -> None:
+    writer, reader = pair
+    sent: List[Tuple[int, int]] = []
+
+    def send(address: int, probe: int, sequence: int) -> None:
+        sent.append((address, sequence))
+
+    def recieve(
+            outstanding: Dict[int, int]
+    ) -> Optional[Tuple[int, float, Any]]:
+        return None
+
+    # nothing answers, a repeat of an outstanding address isn't probed
+    # again and no retries are made rather than retrying forever
+    assert list(scanners._sweep(
+        [1, 2, 1],
+        1,
+        send,
+        {reader: recieve},
+        0.01,
+        None,
+        -1
+    )) == []
+    assert sent == [(1, 1), (2, 1)]
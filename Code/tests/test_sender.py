@@ -0,0 +1,84 @@
+import os
+import socket
+import struct
+from contextlib import closing
+from modules import sender
+from modules.ip_utils import BUFFER, dot_to_long
+from pytest import MonkeyPatch, mark, raises
+
+LOCALHOST = dot_to_long("127.0.0.1")
+
+
+def test_send_stats() -> None:
+    stats = sender.SendStats()
+    assert stats.packets_per_call() == 0
+    stats.packets, stats.calls = 10, 4
+    assert stats.packets_per_call() == 2.5
+
+
+def test_invalid_batch_size() -> None:
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as sock:
+        with raises(ValueError):
+            sender.BatchSender(sock, batch_size=0)
+
+
+@mark.parametrize("sendmmsg", [True, False])
+def test_refused_packets_fail(
+        monkeypatch: MonkeyPatch,
+        sendmmsg: bool
+) -> None:
+    if not sendmmsg:
+        monkeypatch.setattr(sender, "SENDMMSG", None)
+    # UDP sockets won't send to port 0, which is the port the packets
+    # are always sent to, so every one of them is refused
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as sock:
+        queue = sender.BatchSender(sock, batch_size=4)
+        for _ in range(6):
+            queue.send(b"data", LOCALHOST)
+        queue.flush()
+        assert queue.queued == 0
+        assert queue.stats.failed == 6
+        assert queue.stats.packets == 0
+
+
+@mark.skipif(
+    os.name != "posix" or os.geteuid() != 0,
+    reason="raw sockets require root"
+)
+@mark.parametrize("sendmmsg", [True, False])
+def test_batches_are_sent(monkeypatch: MonkeyPatch, sendmmsg: bool) -> None:
+    if not sendmmsg:
+        monkeypatch.setattr(sender, "SENDMMSG", None)
+    elif sender.SENDMMSG is None:
+        return
+    with closing(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ) as listener, closing(
+            socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_UDP)
+    ) as sock:
+        listener.bind(("127.0.0.1", 0))
+        listener.settimeout(1)
+        port = listener.getsockname()[1]
+        # a zero checksum means there isn't one over IPv4
+        udp = struct.Struct("!HHHHB")
+
+        def build(buffer: BUFFER, offset: int, data: int) -> int:
+            udp.pack_into(buffer, offset, 12345, port, udp.size, 0, data)
+            return udp.size
+
+        stats = sender.SendStats()
+        queue = sender.BatchSender(sock, batch_size=8, stats=stats)
+        for i in range(20):
+            if i % 2:
+                queue.pack(LOCALHOST, build, i)
+            else:
+                queue.send(udp.pack(12345, port, udp.size, 0, i), LOCALHOST)
+        queue.flush()
+        assert [listener.recv(16) for _ in range(20)] == [
+            bytes([i]) for i in range(20)
+        ]
+        assert stats.packets == 20 and stats.failed == 0
+        if sendmmsg:
+            assert stats.calls == 3
+        else:
+            assert stats.calls == 20
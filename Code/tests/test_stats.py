@@ -0,0 +1,20 @@
+from modules.stats import RunningStats
+from math import isclose
+from statistics import mean, pstdev
+
+
+def test_running_stats_matches_statistics() -> None:
+    values = [0.25, 1.5, 0.125, 3.0, 2.75, 0.5]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    assert stats.count == len(values)
+    assert (stats.min, stats.max) == (min(values), max(values))
+    assert isclose(stats.mean, mean(values))
+    assert isclose(stats.stddev, pstdev(values))
+
+
+def test_running_stats_empty() -> None:
+    stats = RunningStats()
+    assert stats.count == 0
+    assert stats.variance == 0
@@ -0,0 +1,244 @@
+import io
+import socket
+import struct
+from itertools import chain
+from modules import ip_utils
+from modules.cache import LivenessCache
+from modules.ip_utils import dot_to_long, ip_range, ipv6_to_long
+from modules.targets import (
+    OctetRange,
+    TargetList,
+    exclude,
+    family,
+    intervals,
+    ip_set,
+    shard,
+    size,
+    iter_addresses,
+    onlink_interface,
+    parse_target,
+    read_targets,
+)
+from pathlib import Path
+from pytest import MonkeyPatch, raises
+
+
+def test_octet_range() -> None:
+    spec = parse_target("10.0-1.*.1,3-4")
+    assert isinstance(spec, OctetRange)
+    assert len(spec) == 2 * 256 * 3
+    assert spec[0] == dot_to_long("10.0.0.1")
+    assert spec[4] == dot_to_long("10.0.1.3")
+    assert spec[-1] == dot_to_long("10.1.255.4")
+    assert list(spec) == [spec[i] for i in range(len(spec))]
+    assert "10.1.7.3" in spec
+    assert dot_to_long("10.1.7.2") not in spec
+    assert "10.2.7.3" not in spec
+
+
+def test_octet_range_open_ends() -> None:
+    spec = parse_target("192.168.1.-2")
+    assert list(spec) == [dot_to_long(f"192.168.1.{i}") for i in range(3)]
+    assert len(parse_target("192.168.1.250-")) == 6
+
+
+def test_parse_target() -> None:
+    assert parse_target("192.168.1.0/24") == ip_range("192.168.1.0", 24)
+    assert parse_target("192.168.1.7") == ip_range("192.168.1.7", 32)
+    assert parse_target("localhost") == ip_range("127.0.0.1", 32)
+    for invalid in ("1.2.3.256", "1.2.3", "1.2.3-1.4", "1.2.3.4/33"):
+        with raises(ValueError):
+            parse_target(invalid)
+
+
+def test_read_targets(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    path = tmp_path / "targets"
+    path.write_text("# a comment\n10.0.0.1 10.0.0.2  # another\n\n1.1.1.1-2\n")
+    expected = ["10.0.0.1", "10.0.0.2", "1.1.1.1", "1.1.1.2"]
+    assert list(iter_addresses(read_targets(str(path)))) == [
+        dot_to_long(ip) for ip in expected
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO(path.read_text()))
+    assert list(iter_addresses(read_targets("-"))) == [
+        dot_to_long(ip) for ip in expected
+    ]
+
+
+def test_read_targets_is_lazy(tmp_path: Path) -> None:
+    path = tmp_path / "targets"
+    path.write_text("10.0.0.1\nnot..valid\n")
+    specs = read_targets(str(path))
+    assert list(next(specs)) == [dot_to_long("10.0.0.1")]
+    with raises(ValueError):
+        next(specs)
+
+
+def test_cache_lookup_octet_range(tmp_path: Path) -> None:
+    cache = LivenessCache(str(tmp_path / "cache.db"), 60, 10)
+    cache.record(dot_to_long("10.0.5.1"), 0.5, 64)
+    cache.record(dot_to_long("10.0.5.2"), 0.5, 64)
+    assert cache.lookup(parse_target("10.*.*.1")).keys() == {
+        dot_to_long("10.0.5.1")
+    }
+
+
+def test_target_list() -> None:
+    target_list = TargetList([
+        parse_target("10.0.0.9"),
+        parse_target("192.168.1.0/30"),
+        parse_target("10.1-2.0.1")
+    ])
+    expected = [
+        "10.0.0.9", "192.168.1.1", "192.168.1.2", "10.1.0.1", "10.2.0.1"
+    ]
+    assert len(target_list) == 5
+    assert list(target_list) == [dot_to_long(ip) for ip in expected]
+    assert [target_list[i] for i in range(-5, 0)] == list(target_list)
+    assert "192.168.1.2" in target_list
+    assert "192.168.1.3" not in target_list
+
+
+def test_octet_range_intervals() -> None:
+    spec = parse_target("10.1-2,4.*.*")
+    assert list(intervals(spec)) == [
+        (dot_to_long("10.1.0.0"), dot_to_long("10.3.0.0")),
+        (dot_to_long("10.4.0.0"), dot_to_long("10.5.0.0")),
+    ]
+    spec = parse_target("10.0-3.7.1-9,200")
+    assert set(ip_set([spec])) == set(spec)
+
+
+def test_exclude() -> None:
+    excluded = ip_set([
+        parse_target("192.168.1.0/30", hosts_only=False),
+        parse_target("192.168.1.250-"),
+    ])
+    specs = list(exclude(
+        [parse_target("192.168.1.0/24"), parse_target("10.0.0.1")],
+        excluded
+    ))
+    assert list(iter_addresses(specs)) == [
+        dot_to_long(f"192.168.1.{i}") for i in range(4, 250)
+    ] + [dot_to_long("10.0.0.1")]
+    # specs which don't overlap are left as they are
+    assert specs[1] == parse_target("10.0.0.1")
+
+
+def test_shard() -> None:
+    specs = [
+        parse_target("10.0.0.0/29"),
+        parse_target("10.1.1-2.1,5"),
+        ip_set([parse_target("192.168.0.0/30")]),
+    ]
+    everything = list(iter_addresses(specs))
+    shards = [list(shard(specs, k, 4)) for k in (1, 2, 3, 4)]
+    addresses = [list(iter_addresses(part)) for part in shards]
+    assert sorted(map(len, addresses)) == [3, 3, 3, 3]
+    assert sorted(sum(addresses, [])) == sorted(everything)
+    # each shard takes every 4th address counting across the specs
+    assert addresses[0] == everything[0::4]
+    for part, shard_addresses in zip(shards, addresses):
+        for spec in part:
+            assert [spec[i] for i in range(len(spec))] == list(spec)
+            for address in spec:
+                assert address in spec
+                assert spec[spec.index(address)] == address
+        for address in everything:
+            assert (address in shard_addresses) == any(
+                address in spec for spec in part
+            )
+    # the shards can be excluded from or joined back together
+    assert list(ip_set(chain.from_iterable(shards))) == sorted(everything)
+    assert list(iter_addresses(exclude(shards[0], ip_set(shards[1])))) == (
+        addresses[0]
+    )
+
+
+def test_target_list_index() -> None:
+    target_list = TargetList([
+        parse_target("10.0.0.9"),
+        parse_target("10.1-2.0.1"),
+        ip_set([parse_target("192.168.1.0/30")]),
+    ])
+    for i, address in enumerate(target_list):
+        assert target_list.index(address) == i
+    with raises(ValueError):
+        target_list.index(dot_to_long("10.3.0.1"))
+
+
+def test_parse_target_ipv6() -> None:
+    single = parse_target("fd00::1")
+    assert family(single) == socket.AF_INET6
+    assert list(single) == [ipv6_to_long("fd00::1")]
+    prefix = parse_target("fd00::/64")
+    # far too many addresses for len, but still lazy
+    assert size(prefix) == 2**64
+    assert prefix[0] == ipv6_to_long("fd00::")
+    assert prefix[-1] == ipv6_to_long("fd00::ffff:ffff:ffff:ffff")
+    assert "fd00::abcd" in prefix and "fd01::" not in prefix
+    # IPv4 addresses are never in IPv6 specs
+    assert "0.0.0.1" not in parse_target("::/96")
+    with raises(ValueError):
+        parse_target("fd00::/129")
+
+
+def test_exclude_ipv6() -> None:
+    excluded = ip_set([parse_target("fd00::/126")], socket.AF_INET6)
+    specs = [parse_target("fd00::/125"), parse_target("10.0.0.0/30")]
+    remaining = list(exclude(specs, excluded))
+    assert list(remaining[0]) == [
+        ipv6_to_long(f"fd00::{i}") for i in range(4, 8)
+    ]
+    assert remaining[1] is specs[1]
+    # sharding never needs the length of a huge prefix
+    first, second = shard([parse_target("fd00::/64")], 1, 2), shard(
+        [parse_target("fd00::/64")], 2, 2
+    )
+    assert next(iter(next(first))) == ipv6_to_long("fd00::")
+    assert next(iter(next(second))) == ipv6_to_long("fd00::1")
+
+
+def test_onlink_interface_checks_every_route(
+        monkeypatch: MonkeyPatch
+) -> None:
+    def route(
+            interface: str,
+            destination: str,
+            gateway: str,
+            mask: str
+    ) -> str:
+        # the addresses are the hex of the network order bytes
+        fields = [
+            "{:08X}".format(struct.unpack("=I", struct.pack(
+                "!I",
+                dot_to_long(address)
+            ))[0])
+            for address in (destination, gateway, mask)
+        ]
+        return "\t".join(
+            [interface, fields[0], fields[1], "0001", "0", "0", "0"]
+            + [fields[2], "0", "0", "0"]
+        )
+
+    table = "\n".join([
+        "Iface\tDestination\tGateway\tFlags\tRefCnt\tUse\tMetric\tMask",
+        route("eth0", "0.0.0.0", "10.0.0.1", "0.0.0.0"),
+        route("eth0", "10.0.0.0", "0.0.0.0", "255.255.255.0"),
+        route("eth0", "10.0.0.64", "10.0.0.1", "255.255.255.192"),
+        route("eth1", "10.0.1.0", "0.0.0.0", "255.255.255.0"),
+    ]) + "\n"
+    monkeypatch.setattr(
+        ip_utils,
+        "open",
+        lambda path: io.StringIO(table),
+        raising=False
+    )
+    monkeypatch.setattr(ip_utils, "is_ethernet", lambda interface: True)
+    assert onlink_interface(parse_target("10.0.0.0/26")) == "eth0"
+    assert onlink_interface(parse_target("10.0.1.0/24")) == "eth1"
+    # the ends are on link but the middle needs the gateway
+    assert onlink_interface(parse_target("10.0.0.0/24")) is None
+    assert onlink_interface(parse_target("10.0.0.1-200")) is None
+    # spans both links
+    assert onlink_interface(parse_target("10.0.0-1.1")) is None
+    assert onlink_interface(parse_target("192.168.0.0/24")) is None